@@ -39,6 +39,9 @@ from masakari.i18n import _
 REST_API_VERSION_HISTORY = """REST API Version History:
 
     * 1.0 - Initial version.
+    * 1.1 - Add the 'next' link of full pages of segments, hosts and
+            notifications to ``segments_links``, ``hosts_links`` and
+            ``notifications_links`` of the list responses.
 """
 
 # The minimum and maximum versions of the API supported
@@ -47,7 +50,7 @@ REST_API_VERSION_HISTORY = """REST API Version History:
 # Note: This only applies for the v1 API once microversions
 # support is fully merged.
 _MIN_API_VERSION = "1.0"
-_MAX_API_VERSION = "1.0"
+_MAX_API_VERSION = "1.1"
 DEFAULT_API_VERSION = _MIN_API_VERSION
 
 
@@ -127,13 +127,17 @@ class ViewBuilder(object):
                               request,
                               items,
                               collection_name,
-                              id_key="uuid"):
+                              id_key="uuid",
+                              sort_keys=None):
         """Retrieve 'next' link, if applicable. This is included if:
         1) 'limit' param is specified and equals the number of items.
         2) 'limit' param is specified but it exceeds CONF.osapi_max_limit,
         in this case the number of items is CONF.osapi_max_limit.
         3) 'limit' param is NOT specified but the number of items is
         CONF.osapi_max_limit.
+
+        If sort_keys are given, the marker of the link is a cursor holding
+        the sort key values of the last item instead of its id.
         """
         links = []
         max_items = min(
@@ -141,7 +145,9 @@ class ViewBuilder(object):
             CONF.osapi_max_limit)
         if max_items and max_items == len(items):
             last_item = items[-1]
-            if id_key in last_item:
+            if sort_keys is not None:
+                last_item_id = get_pagination_cursor(last_item, sort_keys)
+            elif id_key in last_item:
                 last_item_id = last_item[id_key]
             elif 'id' in last_item:
                 last_item_id = last_item["id"]
@@ -189,7 +195,8 @@ def get_pagination_params(request):
 
     :param request: `wsgi.Request` possibly containing 'marker' and 'limit'
                     GET variables. 'marker' is the id of the last element
-                    the client has seen, and 'limit' is the maximum number
+                    the client has seen, or the cursor of the 'next' link
+                    of the previous page, and 'limit' is the maximum number
                     of items to return. If 'limit' is not specified, 0, or
                     > max_limit, we default to max_limit. Negative values
                     for either marker or limit will cause
@@ -206,6 +213,21 @@ def get_pagination_params(request):
     return params
 
 
+def get_pagination_cursor(item, sort_keys):
+    """Return the cursor of the page starting after item.
+
+    The cursor holds the values of the sort keys of item and of
+    'created_at' and 'id', which the database layer adds to the sort keys
+    so that the order is unique.
+    """
+    keys = list(sort_keys)
+    for key in ('created_at', 'id'):
+        if key not in keys:
+            keys.append(key)
+    return utils.encode_pagination_cursor(
+        dict((key, item[key]) for key in keys))
+
+
 def get_limit_and_marker(request, max_limit=CONF.osapi_max_limit):
     """get limited parameter from request."""
     params = get_pagination_params(request)
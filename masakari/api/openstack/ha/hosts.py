@@ -20,6 +20,7 @@ from oslo_utils import strutils
 from six.moves import http_client as http
 from webob import exc
 
+from masakari.api import api_version_request
 from masakari.api.openstack import common
 from masakari.api.openstack import extensions
 from masakari.api.openstack.ha.schemas import hosts as schema
@@ -37,7 +38,10 @@ authorize = extensions.os_masakari_authorizer(ALIAS)
 class HostsController(wsgi.Controller):
     """The Host API controller for the OpenStack API."""
 
+    _view_builder_class = common.ViewBuilder
+
     def __init__(self):
+        super(HostsController, self).__init__()
         self.api = host_api.HostAPI()
 
     @extensions.expected_errors((http.BAD_REQUEST, http.FORBIDDEN,
@@ -94,7 +98,14 @@ class HostsController(wsgi.Controller):
         except exception.FailoverSegmentNotFound as ex:
             raise exc.HTTPNotFound(explanation=ex.format_message())
 
-        return {'hosts': hosts}
+        result = {'hosts': hosts}
+        if api_version_request.is_supported(req, min_version='1.1'):
+            links = self._view_builder._get_collection_links(
+                req, hosts, 'segments/%s/hosts' % segment_id,
+                sort_keys=sort_keys)
+            if links:
+                result['hosts_links'] = links
+        return result
 
     @wsgi.response(http.CREATED)
     @extensions.expected_errors((http.FORBIDDEN, http.NOT_FOUND,
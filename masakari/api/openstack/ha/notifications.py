@@ -17,6 +17,7 @@ from oslo_utils import timeutils
 from six.moves import http_client as http
 from webob import exc
 
+from masakari.api import api_version_request
 from masakari.api.openstack import common
 from masakari.api.openstack import extensions
 from masakari.api.openstack.ha.schemas import notifications as schema
@@ -33,7 +34,10 @@ authorize = extensions.os_masakari_authorizer(ALIAS)
 class NotificationsController(wsgi.Controller):
     """Notifications controller for the OpenStack API."""
 
+    _view_builder_class = common.ViewBuilder
+
     def __init__(self):
+        super(NotificationsController, self).__init__()
         self.api = notification_api.NotificationAPI()
 
     @wsgi.response(http.ACCEPTED)
@@ -89,7 +93,13 @@ class NotificationsController(wsgi.Controller):
         except exception.Invalid as err:
             raise exc.HTTPBadRequest(explanation=err.format_message())
 
-        return {'notifications': notifications}
+        result = {'notifications': notifications}
+        if api_version_request.is_supported(req, min_version='1.1'):
+            links = self._view_builder._get_collection_links(
+                req, notifications, 'notifications', sort_keys=sort_keys)
+            if links:
+                result['notifications_links'] = links
+        return result
 
     @extensions.expected_errors((http.FORBIDDEN, http.NOT_FOUND))
     def show(self, req, id):
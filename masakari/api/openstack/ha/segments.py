@@ -16,6 +16,7 @@
 from six.moves import http_client as http
 from webob import exc
 
+from masakari.api import api_version_request
 from masakari.api.openstack import common
 from masakari.api.openstack import extensions
 from masakari.api.openstack.ha.schemas import segments as schema
@@ -32,7 +33,10 @@ authorize = extensions.os_masakari_authorizer(ALIAS)
 class SegmentsController(wsgi.Controller):
     """Segments controller for the OpenStack API."""
 
+    _view_builder_class = common.ViewBuilder
+
     def __init__(self):
+        super(SegmentsController, self).__init__()
         self.api = segment_api.FailoverSegmentAPI()
 
     @extensions.expected_errors((http.BAD_REQUEST, http.FORBIDDEN))
@@ -60,7 +64,13 @@ class SegmentsController(wsgi.Controller):
         except exception.Invalid as e:
             raise exc.HTTPBadRequest(explanation=e.format_message())
 
-        return {'segments': segments}
+        result = {'segments': segments}
+        if api_version_request.is_supported(req, min_version='1.1'):
+            links = self._view_builder._get_collection_links(
+                req, segments, 'segments', sort_keys=sort_keys)
+            if links:
+                result['segments_links'] = links
+        return result
 
     @extensions.expected_errors((http.FORBIDDEN, http.NOT_FOUND))
     def show(self, req, id):
@@ -21,12 +21,15 @@
 
 import logging as python_logging
 import sys
+import time
 
 from oslo_config import cfg
 from oslo_db.sqlalchemy import migration
 from oslo_log import log as logging
+from oslo_utils import timeutils
 
 import masakari.conf
+from masakari import context
 from masakari.db import api as db_api
 from masakari.db.sqlalchemy import migration as db_migration
 from masakari import exception
@@ -76,6 +79,76 @@ class DbCommands(object):
                                    db_migration.MIGRATE_REPO_PATH,
                                    db_migration.INIT_VERSION))
 
+    @staticmethod
+    def _parse_before(before):
+        if before is None:
+            return None
+        try:
+            return timeutils.normalize_time(timeutils.parse_isotime(before))
+        except ValueError as ex:
+            print(_("Invalid value for --before: %s") % ex)
+            sys.exit(1)
+
+    @staticmethod
+    def _remove_rows(db_func, before, batch_size, batch_interval):
+        if batch_size < 1:
+            print(_("Invalid value for --batch_size: must be at least 1."))
+            sys.exit(1)
+
+        # Rows are removed in small transactions, sleeping in between, so
+        # that the commands can be run while masakari is in use.
+        ctxt = context.get_admin_context()
+        totals = {}
+        while True:
+            result = db_func(ctxt, before, batch_size)
+            if not result:
+                break
+            for table_name, count in result.items():
+                totals[table_name] = totals.get(table_name, 0) + count
+            if batch_interval:
+                time.sleep(batch_interval)
+
+        return totals
+
+    @args('--before', metavar='<date>', required=True,
+          help='Delete rows last updated or deleted before this date, '
+               'e.g. 2017-01-01T00:00:00Z')
+    @args('--batch_size', type=int, default=1000, metavar='<number>',
+          help='Maximum number of rows deleted per transaction')
+    @args('--batch_interval', type=float, default=0.5, metavar='<seconds>',
+          help='Number of seconds to sleep between transactions')
+    def purge(self, before, batch_size=1000, batch_interval=0.5):
+        """Delete processed notifications and soft-deleted rows.
+
+        Finished, ignored and failed notifications with their evacuations,
+        soft-deleted hosts and soft-deleted failover segments are deleted.
+        """
+        totals = self._remove_rows(db_api.purge_rows,
+                                   self._parse_before(before), batch_size,
+                                   batch_interval)
+        for table_name in sorted(totals):
+            print(_("Deleted %(count)d rows from %(table)s.") %
+                  {'count': totals[table_name], 'table': table_name})
+
+    @args('--before', metavar='<date>', default=None,
+          help='Archive rows last updated or deleted before this date, '
+               'e.g. 2017-01-01T00:00:00Z, all of them if not given')
+    @args('--batch_size', type=int, default=1000, metavar='<number>',
+          help='Maximum number of rows moved per transaction')
+    @args('--batch_interval', type=float, default=0.5, metavar='<seconds>',
+          help='Number of seconds to sleep between transactions')
+    def archive(self, before=None, batch_size=1000, batch_interval=0.5):
+        """Move processed notifications and soft-deleted rows to shadow tables.
+
+        The same rows as by purge are moved to the shadow_* tables.
+        """
+        totals = self._remove_rows(db_api.archive_rows,
+                                   self._parse_before(before), batch_size,
+                                   batch_interval)
+        for table_name in sorted(totals):
+            print(_("Archived %(count)d rows from %(table)s.") %
+                  {'count': totals[table_name], 'table': table_name})
+
 
 CATEGORIES = {
     'db': DbCommands,
@@ -16,8 +16,11 @@
 Handles all requests to Nova.
 """
 
+import collections
 import functools
+import hashlib
 import sys
+import threading
 
 from keystoneauth1 import exceptions as keystone_exception
 import keystoneauth1.loading
@@ -27,6 +30,9 @@ from novaclient import client as nova_client
 from novaclient import exceptions as nova_exception
 from oslo_log import log as logging
 from oslo_utils import encodeutils
+from oslo_utils import timeutils
+import requests
+from requests import adapters as request_adapters
 from requests import exceptions as request_exceptions
 import six
 
@@ -41,6 +47,9 @@ LOG = logging.getLogger(__name__)
 
 NOVA_API_VERSION = "2.1"
 
+# Microversion which introduced the force-down services API.
+NOVA_FORCE_DOWN_API_VERSION = "2.11"
+
 nova_extensions = [ext for ext in
                    nova_client.discover_extensions(NOVA_API_VERSION)
                    if ext.name in ("list_extensions",)]
@@ -58,6 +67,7 @@ def translate_nova_exception(method):
             res = method(self, ctx, *args, **kwargs)
         except (request_exceptions.Timeout,
                 nova_exception.CommandError,
+                nova_exception.UnsupportedVersion,
                 keystone_exception.ConnectionError) as exc:
             err_msg = encodeutils.exception_to_unicode(exc)
             _reraise(exception.MasakariException(reason=err_msg))
@@ -80,25 +90,174 @@ def translate_nova_exception(method):
     return wrapper
 
 
-def novaclient(context, timeout=None):
-    """Returns a Nova client
+class _ClientCache(object):
+    """Process-wide cache of authenticated nova clients.
 
-    @param timeout: Number of seconds to wait for an answer before raising a
-        Timeout exception (None to disable)
+    Clients are keyed by a hash of the privileged credentials, region and
+    endpoint they are built for, so that the credentials aren't kept in the
+    cache. Reusing a client reuses its keystone auth plugin, which keeps the
+    issued token until it is about to expire, and its session, which keeps
+    the HTTP connections to nova open.
     """
-    nova_catalog_info = CONF.nova_catalog_admin_info
-    service_type, service_name, endpoint_type = nova_catalog_info.split(':')
 
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _make_key(key_values):
+        return hashlib.sha256(
+            repr(key_values).encode('utf-8')).hexdigest()
+
+    def get_or_create(self, key_values, create):
+        """Returns the client built for key_values.
+
+        :param create: Callable building the client when there isn't a
+            client for key_values yet. It's called outside of the lock, so
+            that building a client doesn't hold up the callers of other
+            clients. When concurrent callers build a client for the same
+            key_values, the first one cached is returned to all of them.
+        """
+        key = self._make_key(key_values)
+        with self._lock:
+            client_obj = self._clients.get(key)
+            if client_obj is not None:
+                self.hits += 1
+                return client_obj
+            self.misses += 1
+
+        client_obj = create()
+        with self._lock:
+            return self._clients.setdefault(key, client_obj)
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            'size': len(self._clients),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+_CLIENT_CACHE = _ClientCache()
+
+
+def get_client_cache_stats():
+    """Returns the hit and miss counters of the nova client cache."""
+    return _CLIENT_CACHE.stats()
+
+
+class _AggregateCache(object):
+    """Index of the nova aggregates by the hosts they contain.
+
+    The aggregate list is fetched from nova at most once per
+    'nova_aggregate_cache_ttl' seconds, after which finding the aggregates
+    of a host doesn't need to scan all the aggregates of the cloud.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._refreshed_at = None
+        self.hits = 0
+        self.misses = 0
+
+    def _expired(self):
+        return (self._index is None or CONF.nova_aggregate_cache_ttl <= 0 or
+                timeutils.is_older_than(self._refreshed_at,
+                                        CONF.nova_aggregate_cache_ttl))
+
+    def get(self, host_name, list_aggregates):
+        """Returns the aggregates of host_name.
+
+        :param list_aggregates: Callable returning all the aggregates, called
+            when the index is missing or expired.
+        """
+        with self._lock:
+            if self._expired():
+                self.misses += 1
+                index = collections.defaultdict(list)
+                for aggregate in list_aggregates():
+                    for aggregate_host in aggregate.hosts or []:
+                        index[aggregate_host].append(aggregate)
+                self._index = index
+                self._refreshed_at = timeutils.utcnow()
+            else:
+                self.hits += 1
+            return list(self._index.get(host_name, []))
+
+    def add_host(self, aggregate, host_name):
+        """Records host_name as added to aggregate.
+
+        :param aggregate: Aggregate returned by nova once host_name was added
+            to it, which replaces the cached one for all its hosts.
+        """
+        with self._lock:
+            if self._index is None:
+                return
+            for aggregate_host in set(aggregate.hosts or []) | {host_name}:
+                aggregates = self._index[aggregate_host]
+                aggregates[:] = [agg for agg in aggregates
+                                 if agg.id != aggregate.id]
+                aggregates.append(aggregate)
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+            self._refreshed_at = None
+
+    def clear(self):
+        self.invalidate()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {
+            'hosts': len(self._index) if self._index is not None else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+_AGGREGATE_CACHE = _AggregateCache()
+
+
+def invalidate_aggregate_cache():
+    """Drops the host to aggregate index, it's rebuilt on the next lookup."""
+    _AGGREGATE_CACHE.invalidate()
+
+
+def get_aggregate_cache_stats():
+    """Returns the hit and miss counters of the aggregate cache."""
+    return _AGGREGATE_CACHE.stats()
+
+
+def _make_http_session():
+    # keystoneauth uses a single requests session for all the calls made
+    # through it, so size its connection pool for concurrent recoveries.
+    http_session = requests.Session()
+    adapter = request_adapters.HTTPAdapter(
+        pool_connections=CONF.nova_api_pool_size,
+        pool_maxsize=CONF.nova_api_pool_size)
+    http_session.mount('http://', adapter)
+    http_session.mount('https://', adapter)
+    return http_session
+
+
+def _create_client(context, url, endpoint_type, timeout, api_version):
     context = ctx.RequestContext(
         CONF.os_privileged_user_name, None,
         auth_token=CONF.os_privileged_user_password,
         project_name=CONF.os_privileged_user_tenant,
         service_catalog=context.service_catalog)
 
-    # User needs to authenticate to Keystone before querying Nova, so we set
-    # auth_url to the identity service endpoint
-    url = CONF.os_privileged_user_auth_url
-
     LOG.debug('Creating a Nova client using "%s" user',
               CONF.os_privileged_user_name)
 
@@ -110,9 +269,10 @@ def novaclient(context, timeout=None):
                                     username=context.user_id,
                                     password=context.auth_token,
                                     project_name=context.project_name)
-    keystone_session = keystoneauth1.session.Session(auth=auth)
+    keystone_session = keystoneauth1.session.Session(
+        auth=auth, session=_make_http_session())
 
-    client_obj = nova_client.Client(api_versions.APIVersion(NOVA_API_VERSION),
+    client_obj = nova_client.Client(api_versions.APIVersion(api_version),
                                     session=keystone_session,
                                     insecure=CONF.nova_api_insecure,
                                     timeout=timeout,
@@ -121,9 +281,41 @@ def novaclient(context, timeout=None):
                                     cacert=CONF.nova_ca_certificates_file,
                                     extensions=nova_extensions)
 
+    if api_version != NOVA_API_VERSION:
+        # Make sure nova supports the requested microversion before the
+        # client is handed out and cached.
+        api_versions.discover_version(client_obj,
+                                      api_versions.APIVersion(api_version))
+
     return client_obj
 
 
+def novaclient(context, timeout=None, api_version=NOVA_API_VERSION):
+    """Returns a Nova client
+
+    @param timeout: Number of seconds to wait for an answer before raising a
+        Timeout exception (None to disable)
+    @param api_version: Compute API microversion the client should use. Any
+        microversion other than the default one is negotiated with nova and
+        UnsupportedVersion is raised if nova doesn't support it.
+    """
+    nova_catalog_info = CONF.nova_catalog_admin_info
+    service_type, service_name, endpoint_type = nova_catalog_info.split(':')
+
+    # User needs to authenticate to Keystone before querying Nova, so we set
+    # auth_url to the identity service endpoint
+    url = CONF.os_privileged_user_auth_url
+
+    cache_key = (url, CONF.keystone_authtoken.auth_type,
+                 CONF.os_privileged_user_name,
+                 CONF.os_privileged_user_password,
+                 CONF.os_privileged_user_tenant, CONF.os_region_name,
+                 endpoint_type, timeout, api_version)
+    return _CLIENT_CACHE.get_or_create(
+        cache_key, functools.partial(_create_client, context, url,
+                                     endpoint_type, timeout, api_version))
+
+
 class API(object):
     """API for interacting with novaclient."""
 
@@ -138,6 +330,31 @@ class API(object):
         LOG.info('Fetch Server list on %s', host)
         return nova.servers.list(detailed=True, search_opts=opts)
 
+    @translate_nova_exception
+    def get_servers_by_uuids(self, context, uuids, changes_since=None):
+        """Get the servers with the given uuids.
+
+        The servers are listed one by one as nova only filters the server
+        list by a single uuid.
+
+        :param changes_since: ISO 8601 time, only the servers changed since
+            then are returned if it's given.
+        """
+        nova = novaclient(context)
+        LOG.info('Fetch servers %(uuids)s changed since %(changes_since)s',
+                 {'uuids': uuids, 'changes_since': changes_since})
+        servers = []
+        for uuid in uuids:
+            opts = {
+                'all_tenants': True,
+                'uuid': uuid
+            }
+            if changes_since:
+                opts['changes-since'] = changes_since
+            servers.extend(nova.servers.list(detailed=True,
+                                             search_opts=opts))
+        return servers
+
     @translate_nova_exception
     def enable_disable_service(self, context, host_name, enable=False,
                                reason=None):
@@ -162,6 +379,22 @@ class API(object):
         service = nova.services.list(host=host_name, binary=binary)[0]
         return service.status == 'disabled'
 
+    @translate_nova_exception
+    def get_service(self, context, host_name, binary='nova-compute'):
+        """Get the service running on given host."""
+        nova = novaclient(context)
+        return nova.services.list(host=host_name, binary=binary)[0]
+
+    @translate_nova_exception
+    def force_down_service(self, context, host_name, binary='nova-compute',
+                           force_down=True):
+        """Mark the service on given host as forced down or clear it."""
+        nova = novaclient(context, api_version=NOVA_FORCE_DOWN_API_VERSION)
+        LOG.info('Set forced_down of %(binary)s on %(host_name)s to '
+                 '%(force_down)s', {'binary': binary, 'host_name': host_name,
+                                    'force_down': force_down})
+        nova.services.force_down(host_name, binary, force_down=force_down)
+
     @translate_nova_exception
     def evacuate_instance(self, context, uuid, target=None,
                           on_shared_storage=True):
@@ -206,6 +439,21 @@ class API(object):
         LOG.info(msg, {'uuid': uuid})
         return nova.servers.start(uuid)
 
+    @translate_nova_exception
+    def get_flavor(self, context, flavor_id):
+        """Get a flavor."""
+        nova = novaclient(context)
+        LOG.info('Call get flavor command for flavor %s', flavor_id)
+        return nova.flavors.get(flavor_id)
+
+    @translate_nova_exception
+    def get_hypervisors(self, context):
+        """Get all hypervisors with their resource usage."""
+        nova = novaclient(context)
+        LOG.info('Call hypervisor-list command to get list of all '
+                 'hypervisors.')
+        return nova.hypervisors.list(detailed=True)
+
     @translate_nova_exception
     def get_aggregate_list(self, context):
         """Get all aggregate list."""
@@ -213,6 +461,19 @@ class API(object):
         LOG.info('Call aggregate-list command to get list of all aggregates.')
         return nova.aggregates.list()
 
+    @translate_nova_exception
+    def get_aggregates_for_host(self, context, host_name):
+        """Get the aggregates to which the given host belongs."""
+        nova = novaclient(context)
+        LOG.info('Get aggregates of host %s.', host_name)
+
+        def _list_aggregates():
+            LOG.info('Call aggregate-list command to refresh the host '
+                     'aggregate index.')
+            return nova.aggregates.list()
+
+        return _AGGREGATE_CACHE.get(host_name, _list_aggregates)
+
     @translate_nova_exception
     def add_host_to_aggregate(self, context, host, aggregate):
         """Add host to given aggregate."""
@@ -220,4 +481,6 @@ class API(object):
         msg = ("Call add_host command to add host '%(host_name)s' to "
                "aggregate '%(aggregate_name)s'.")
         LOG.info(msg, {'host_name': host, 'aggregate_name': aggregate.name})
-        return nova.aggregates.add_host(aggregate.id, host)
+        result = nova.aggregates.add_host(aggregate.id, host)
+        _AGGREGATE_CACHE.add_host(result, host)
+        return result
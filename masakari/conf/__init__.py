@@ -21,6 +21,7 @@ from masakari.conf import database
 from masakari.conf import engine
 from masakari.conf import engine_driver
 from masakari.conf import exceptions
+from masakari.conf import locks
 from masakari.conf import nova
 from masakari.conf import osapi_v1
 from masakari.conf import paths
@@ -36,6 +37,7 @@ database.register_opts(CONF)
 engine.register_opts(CONF)
 engine_driver.register_opts(CONF)
 exceptions.register_opts(CONF)
+locks.register_opts(CONF)
 nova.register_opts(CONF)
 osapi_v1.register_opts(CONF)
 paths.register_opts(CONF)
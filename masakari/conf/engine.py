@@ -14,6 +14,7 @@
 #    under the License.
 
 from oslo_config import cfg
+from oslo_config import types
 
 
 rpcapi_opts = [
@@ -72,6 +73,26 @@ notification_opts = [
     cfg.IntOpt('verify_interval',
                default=1,
                help='The monitoring interval for looping'),
+    cfg.IntOpt('verify_max_interval',
+               default=10,
+               min=1,
+               help='Maximum monitoring interval for looping when the '
+                    'interval is increased by \'verify_backoff_factor\'.'),
+    cfg.FloatOpt('verify_backoff_factor',
+                 default=1.0,
+                 min=1.0,
+                 help='Factor by which the monitoring interval for looping '
+                      'is multiplied after every poll, starting from '
+                      '\'verify_interval\' up to \'verify_max_interval\'. '
+                      'When set to 1.0, the interval is fixed.'),
+    cfg.FloatOpt('verify_jitter',
+                 default=0.0,
+                 min=0.0,
+                 max=1.0,
+                 help='Fraction of the monitoring interval for looping by '
+                      'which every interval is randomly increased or '
+                      'decreased, so that waits started at the same time '
+                      'do not poll nova at the same time.'),
     cfg.IntOpt('wait_period_after_power_off',
                default=60,
                help='Number of seconds to wait for instance to shut down'),
@@ -90,6 +111,73 @@ notification_opts = [
                     "generated_time, then it is considered that notification "
                     "is ignored by the messaging queue and will be processed "
                     "by 'process_unfinished_notifications' periodic task."),
+    cfg.IntOpt('notification_lease_duration',
+               default=300,
+               min=3,
+               help="Number of seconds for which an engine owns a "
+                    "notification it has started to process. The lease is "
+                    "renewed every third of this duration while the "
+                    "notification is processed. Notifications whose lease "
+                    "has expired, because the engine processing them has "
+                    "stopped, are processed again by "
+                    "'process_unfinished_notifications' periodic task of "
+                    "any engine."),
+    cfg.IntOpt('process_unfinished_notifications_batch_size',
+               default=100,
+               min=1,
+               help="Number of notifications in error or new state loaded "
+                    "from the database at a time by "
+                    "'process_unfinished_notifications' periodic task."),
+    cfg.IntOpt('process_unfinished_notifications_workers',
+               default=10,
+               min=1,
+               help="Maximum number of notifications processed concurrently "
+                    "by 'process_unfinished_notifications' periodic task."),
+    cfg.IntOpt('process_unfinished_notifications_time_budget',
+               default=0,
+               min=0,
+               help="Number of seconds after which "
+                    "'process_unfinished_notifications' periodic task stops "
+                    "dispatching notifications and waiting for them. "
+                    "Notifications which are already being processed are "
+                    "not interrupted and the remaining ones are processed "
+                    "by the next run of the periodic task. Set to 0 to "
+                    "process all the notifications in every run."),
+]
+
+
+notification_scheduler_group = cfg.OptGroup(
+    'notification_scheduler',
+    title='Notification scheduler options',
+    help="Configuration options for scheduling notifications in "
+         "masakari-engine")
+
+notification_scheduler_opts = [
+    cfg.BoolOpt('enabled',
+                default=False,
+                help="""
+Operators can decide whether notifications received by masakari-engine should
+be queued and processed in the order of their priority. When set to True,
+notifications are processed by priority of their type and in the order they
+are received within a priority, while the number of notifications processed
+concurrently is limited per notification type and per failover segment. When
+set to False, every notification is processed as soon as it is received."""),
+    cfg.Opt('type_priority',
+            type=types.Dict(value_type=types.Integer(min=0)),
+            default={'COMPUTE_HOST': 0, 'PROCESS': 1, 'VM': 2},
+            help="Priority of every notification type. Notifications of a "
+                 "type with lower value are processed first."),
+    cfg.Opt('type_concurrency',
+            type=types.Dict(value_type=types.Integer(min=1)),
+            default={'COMPUTE_HOST': 10, 'PROCESS': 10, 'VM': 20},
+            help="Maximum number of notifications of every type which are "
+                 "processed concurrently."),
+    cfg.IntOpt('segment_concurrency',
+               default=0,
+               min=0,
+               help="Maximum number of notifications of hosts of the same "
+                    "failover segment which are processed concurrently. "
+                    "0 means unlimited."),
 ]
 
 
@@ -98,7 +186,13 @@ ALL_OPTS = (rpcapi_opts + notification_opts + driver_opts)
 
 def register_opts(conf):
     conf.register_opts(ALL_OPTS)
+    conf.register_group(notification_scheduler_group)
+    conf.register_opts(notification_scheduler_opts,
+                       group=notification_scheduler_group)
 
 
 def list_opts():
-    return {'DEFAULT': ALL_OPTS}
+    return {
+        'DEFAULT': ALL_OPTS,
+        notification_scheduler_group.name: notification_scheduler_opts
+    }
@@ -26,6 +26,11 @@ host_recovery_group = cfg.OptGroup(
     title='Host failure recovery options',
     help="Configuration options for host failure recovery")
 
+taskflow_group = cfg.OptGroup(
+    'taskflow',
+    title='Taskflow driver options',
+    help="Configuration options for taskflow driver")
+
 
 host_failure_opts = [
     cfg.BoolOpt('evacuate_all_instances',
@@ -46,6 +51,74 @@ Operators can decide whether reserved_host should be added to aggregate group
 of failed compute host. When set to True, reserved host will be added to the
 aggregate group of failed compute host. When set to False, the reserved_host
 will not be added to the aggregate group of failed compute host."""),
+
+    cfg.BoolOpt("reserved_host_placement",
+                default=False,
+                help="""
+Operators can decide whether reserved hosts should be tried in the order of
+their free capacity when evacuating instances using reserved_host. When set to
+True, the free vCPU, RAM and disk of the reserved hosts reported by nova are
+compared with the flavors of the instances to evacuate, and the reserved
+hosts which can take all the instances are tried first. When set to False,
+reserved hosts are tried in the order they are stored in the database."""),
+
+    cfg.FloatOpt("reserved_host_cpu_allocation_ratio",
+                 default=1.0,
+                 min=0.0,
+                 help="""
+Virtual CPU to physical CPU allocation ratio of the reserved hosts used to
+compute their free vCPUs when 'reserved_host_placement' is set to True."""),
+
+    cfg.IntOpt("reserved_host_max_targets",
+               default=1,
+               min=1,
+               help="""
+Maximum number of reserved hosts the instances of a failed compute host are
+evacuated to in a single recovery using reserved_host. When set to 1, all the
+instances are evacuated to one reserved host and the next reserved host is
+only tried if the evacuation fails. When set to a greater value, the reserved
+hosts are split into groups of this size and the instances are shared between
+the reserved hosts of a group, according to their free capacity if nova
+reports it, and evacuated to the different reserved hosts in parallel. Each
+reserved host of the group is enabled and locked for the recovery, reserved
+hosts already locked by another recovery are skipped. The next group is tried
+if the evacuation fails."""),
+
+    cfg.BoolOpt("force_down_failed_host",
+                default=False,
+                help="""
+Operators can decide whether the nova-compute service of a failed compute
+host should be marked as forced down in nova using the force-down services
+API (compute API microversion 2.11 or later). When set to True, nova treats
+the service as down immediately, so instances are evacuated without waiting
+for nova to notice the missed service heartbeats. If nova doesn't support the
+required microversion, masakari waits for the service update as usual. Only
+enable it when the failed host is reliably fenced, and note that the forced
+down flag needs to be cleared by the operator once the host is recovered."""),
+
+    cfg.StrOpt("service_update_wait_mode",
+               default="fixed",
+               choices=["fixed", "poll"],
+               help="""
+Defines how masakari waits for nova to recognize the nova-compute service
+of the failed compute host as disabled and down, and the nova-compute service
+of a reserved host as enabled and up, before evacuating instances.
+
+* fixed: Always sleep for 'wait_period_after_service_update' seconds.
+* poll: Poll the state of the nova-compute service every 'verify_interval'
+  seconds and continue as soon as nova reports the expected state. The
+  recovery continues anyway after 'wait_period_after_service_update'
+  seconds."""),
+
+    cfg.IntOpt("evacuation_pool_size",
+               default=1,
+               min=1,
+               help="""
+Maximum number of instances which are evacuated concurrently from a failed
+compute host. Evacuate requests are dispatched in the order in which the
+instances are prepared for evacuation, so instances which contain
+'HA_Enabled=True' metadata key are always dispatched first. When set to 1,
+instances are evacuated one at a time."""),
 ]
 
 instance_failure_options = [
@@ -62,15 +135,33 @@ for an instance which contain metadata key 'HA_Enabled=True'."""),
 ]
 
 
+taskflow_options = [
+    cfg.StrOpt('connection',
+               secret=True,
+               help="""
+The SQLAlchemy connection string of the database in which the state of the
+recovery workflows is persisted, for example the masakari database or a local
+SQLite file like 'sqlite:////var/lib/masakari/taskflow.sqlite'. When set, the
+progress of every recovery workflow is saved per notification, and a
+workflow interrupted by a restart of masakari-engine is resumed from its
+first unfinished task the next time the notification is processed, instead
+of being executed again from the beginning. The tables are created on first
+use. When not set, the workflow state is only kept in memory."""),
+]
+
+
 def register_opts(conf):
     conf.register_group(instance_recovery_group)
     conf.register_group(host_recovery_group)
     conf.register_opts(instance_failure_options, group=instance_recovery_group)
     conf.register_opts(host_failure_opts, group=host_recovery_group)
+    conf.register_group(taskflow_group)
+    conf.register_opts(taskflow_options, group=taskflow_group)
 
 
 def list_opts():
     return {
         instance_recovery_group.name: instance_failure_options,
-        host_recovery_group.name: host_failure_opts
+        host_recovery_group.name: host_failure_opts,
+        taskflow_group.name: taskflow_options
     }
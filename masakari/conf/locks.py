@@ -0,0 +1,63 @@
+# Copyright 2017 NTT DATA
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo_config import cfg
+
+
+locks_group = cfg.OptGroup(
+    'locks',
+    title='Lock options',
+    help="Configuration options for the locks serializing the recovery of "
+         "hosts and the use of reserved hosts")
+
+locks_opts = [
+    cfg.StrOpt('backend',
+               default='local',
+               choices=('local', 'file', 'db'),
+               help="""
+Backend of the locks serializing the recovery of a host and the use of a
+reserved host.
+
+* local: Locks are only held within a single masakari-engine process.
+* file: Locks are files in the '[oslo_concurrency] lock_path' directory,
+  which serialize all the masakari-engine processes of a node.
+* db: Locks are rows of the 'locks' table of the masakari database, which
+  serialize all the masakari-engine processes sharing the database. A lock
+  is leased for 'lease_duration' seconds and renewed while it is held, so
+  that the locks of a stopped engine are released automatically."""),
+    cfg.IntOpt('lease_duration',
+               default=60,
+               min=3,
+               help="""
+Number of seconds for which a lock of the 'db' backend is leased. The lease
+is renewed every third of this duration while the lock is held."""),
+    cfg.FloatOpt('poll_interval',
+                 default=1.0,
+                 min=0.0,
+                 help="""
+Number of seconds to wait before trying again to acquire a lock of the 'db'
+backend which is held by another engine."""),
+]
+
+
+def register_opts(conf):
+    conf.register_group(locks_group)
+    conf.register_opts(locks_opts, group=locks_group)
+
+
+def list_opts():
+    return {
+        locks_group.name: locks_opts
+    }
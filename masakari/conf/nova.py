@@ -31,6 +31,18 @@ nova_opts = [
     cfg.BoolOpt('nova_api_insecure',
                 default=False,
                 help='Allow to perform insecure SSL requests to nova'),
+    cfg.IntOpt('nova_api_pool_size',
+               default=10,
+               min=1,
+               help='Maximum number of HTTP connections to nova which are '
+                    'kept open and reused by the shared nova client.'),
+    cfg.IntOpt('nova_aggregate_cache_ttl',
+               default=60,
+               min=0,
+               help='Number of seconds the host to aggregate index built '
+                    'from the nova aggregate list is reused before it is '
+                    'fetched again. Set to 0 to fetch the aggregate list '
+                    'on every lookup.'),
     cfg.StrOpt('os_privileged_user_name',
                help='OpenStack privileged account username. Used for requests '
                     'to other services (such as Nova) that require an account '
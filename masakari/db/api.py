@@ -296,6 +296,17 @@ def notifications_get_all_by_filters(
                                                  marker=marker)
 
 
+def notifications_count_by_filters(context, filters=None):
+    """Count the notifications that match all filters.
+
+    :param context: context to query under
+    :param filters: filters for the query in the form of key/value
+
+    :returns: number of notifications
+    """
+    return IMPL.notifications_count_by_filters(context, filters=filters)
+
+
 def notification_get_by_uuid(context, notification_uuid):
     """Get notification information by uuid.
 
@@ -335,6 +346,26 @@ def notification_create(context, values):
     return IMPL.notification_create(context, values)
 
 
+def notification_duplicate_exists(context, source_host_uuid,
+                                  notification_type, payload_hash,
+                                  generated_since):
+    """Check whether a notification is a duplicate.
+
+    :param context: context to query under
+    :param source_host_uuid: uuid of the host the notification came from
+    :param notification_type: type of the notification
+    :param payload_hash: fingerprint of the notification payload
+    :param generated_since: time from which notifications are considered
+
+    :returns: True if a new or running notification of the same type and
+              with the same payload was generated by the host since
+              generated_since, False otherwise
+    """
+    return IMPL.notification_duplicate_exists(
+        context, source_host_uuid, notification_type, payload_hash,
+        generated_since)
+
+
 def notification_update(context, notification_uuid, values):
     """Update notification information in the database.
 
@@ -350,6 +381,80 @@ def notification_update(context, notification_uuid, values):
     return IMPL.notification_update(context, notification_uuid, values)
 
 
+def notifications_expire_leases(context, owner):
+    """Expire the leases of the running notifications of a stopped engine.
+
+    The leases of the running notifications owned by owner, and of the
+    running notifications which were claimed without a lease, are expired
+    so that the notifications can be claimed again.
+
+    :param context: context to query under
+    :param owner: name of the engine which has stopped
+
+    :returns: number of notifications whose lease is expired
+    """
+    return IMPL.notifications_expire_leases(context, owner)
+
+
+def notification_claim(context, notification_uuid, owner, lease_duration):
+    """Atomically claim a notification for processing.
+
+    The notification is claimed if it is in new or error status, or if it is
+    in running status and the lease of the engine processing it has expired.
+    Its status is set to running and it is owned by the given owner for
+    lease_duration seconds.
+
+    :param context: context to query under
+    :param notification_uuid: uuid of notification to be claimed
+    :param owner: name of the engine claiming the notification
+    :param lease_duration: number of seconds the claim is valid for
+
+    :returns: dictionary-like object containing claimed notification
+
+    :raises: exception.NotificationNotFound if notification with given
+             'notification_uuid' doesn't exist
+    :raises: exception.NotificationAlreadyClaimed if the notification is
+             owned by another engine or its status can't be processed
+    """
+    return IMPL.notification_claim(context, notification_uuid, owner,
+                                   lease_duration)
+
+
+def notification_renew_lease(context, notification_uuid, owner,
+                             lease_duration):
+    """Extend the lease of a claimed notification.
+
+    :param context: context to query under
+    :param notification_uuid: uuid of notification
+    :param owner: name of the engine owning the notification
+    :param lease_duration: number of seconds the lease is extended for
+
+    :raises: exception.NotificationAlreadyClaimed if the notification isn't
+             owned by owner anymore
+    """
+    return IMPL.notification_renew_lease(context, notification_uuid, owner,
+                                         lease_duration)
+
+
+def notification_release(context, notification_uuid, owner, values):
+    """Update and release a claimed notification.
+
+    :param context: context to query under
+    :param notification_uuid: uuid of notification
+    :param owner: name of the engine owning the notification
+    :param values: dictionary of notification attributes to be updated
+
+    :returns: dictionary-like object containing updated notification
+
+    :raises: exception.NotificationNotFound if notification with given
+             'notification_uuid' doesn't exist
+    :raises: exception.NotificationAlreadyClaimed if the notification isn't
+             owned by owner anymore
+    """
+    return IMPL.notification_release(context, notification_uuid, owner,
+                                     values)
+
+
 def notification_delete(context, notification_uuid):
     """Delete the notification.
 
@@ -360,3 +465,125 @@ def notification_delete(context, notification_uuid):
              'notification_uuid' doesn't exist
     """
     return IMPL.notification_delete(context, notification_uuid)
+
+
+# evacuation related db apis
+
+
+def evacuations_get_all_by_notification(context, notification_uuid):
+    """Get the evacuations of instances recorded for a notification.
+
+    :param context: context to query under
+    :param notification_uuid: uuid of the notification
+
+    :returns: list of dictionary-like objects containing evacuations
+    """
+    return IMPL.evacuations_get_all_by_notification(context,
+                                                    notification_uuid)
+
+
+def evacuation_create(context, values):
+    """Create an evacuation.
+
+    :param context: context to query under
+    :param values: dictionary of evacuation attributes to create
+
+    :returns: dictionary-like object containing created evacuation
+    """
+    return IMPL.evacuation_create(context, values)
+
+
+def evacuation_update(context, notification_uuid, instance_uuid, values):
+    """Update evacuation information in the database.
+
+    :param context: context to query under
+    :param notification_uuid: uuid of the notification of the evacuation
+    :param instance_uuid: uuid of the evacuated instance
+    :param values: dictionary of evacuation attributes to be updated
+
+    :returns: dictionary-like object containing updated evacuation
+
+    :raises: exception.EvacuationNotFound if evacuation of given
+             'instance_uuid' doesn't exist for 'notification_uuid'
+    """
+    return IMPL.evacuation_update(context, notification_uuid, instance_uuid,
+                                  values)
+
+
+# db apis for purging and archiving rows
+
+
+def purge_rows(context, before, max_rows):
+    """Delete a batch of processed notifications and soft-deleted rows.
+
+    The evacuations of the notifications which are finished, ignored or
+    failed are deleted first, then these notifications, then soft-deleted
+    hosts and finally soft-deleted failover segments which aren't referenced
+    by any host anymore. A batch only deletes rows of a single table.
+
+    :param context: context to query under
+    :param before: only delete rows last updated or deleted before this
+                   datetime, all of them if None
+    :param max_rows: maximum number of rows deleted in the batch
+
+    :returns: dict mapping table names to the number of rows deleted, empty
+              once there is nothing left to delete
+    """
+    return IMPL.purge_rows(context, before, max_rows)
+
+
+def archive_rows(context, before, max_rows):
+    """Move a batch of processed notifications and soft-deleted rows.
+
+    Same as purge_rows, except the rows are copied to the shadow tables
+    before they are deleted.
+
+    :param context: context to query under
+    :param before: only move rows last updated or deleted before this
+                   datetime, all of them if None
+    :param max_rows: maximum number of rows moved in the batch
+
+    :returns: dict mapping table names to the number of rows moved, empty
+              once there is nothing left to move
+    """
+    return IMPL.archive_rows(context, before, max_rows)
+
+
+# lock related db apis
+
+
+def lock_acquire(context, name, owner, lease_duration):
+    """Acquire a lock if it isn't held or its lease has expired.
+
+    :param context: context to query under
+    :param name: name of the lock
+    :param owner: unique identifier of the holder of the lock
+    :param lease_duration: number of seconds the lock is leased for
+
+    :returns: True if the lock is acquired, False if it's held by another
+              owner
+    """
+    return IMPL.lock_acquire(context, name, owner, lease_duration)
+
+
+def lock_renew(context, name, owner, lease_duration):
+    """Extend the lease of a lock.
+
+    :param context: context to query under
+    :param name: name of the lock
+    :param owner: unique identifier of the holder of the lock
+    :param lease_duration: number of seconds the lease is extended for
+
+    :returns: False if the lock isn't held by owner anymore
+    """
+    return IMPL.lock_renew(context, name, owner, lease_duration)
+
+
+def lock_release(context, name, owner):
+    """Release a lock held by owner.
+
+    :param context: context to query under
+    :param name: name of the lock
+    :param owner: unique identifier of the holder of the lock
+    """
+    return IMPL.lock_release(context, name, owner)
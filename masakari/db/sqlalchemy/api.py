@@ -14,6 +14,7 @@
 #    under the License.
 """Implementation of SQLAlchemy backend."""
 
+import datetime
 import sys
 
 from oslo_db import api as oslo_db_api
@@ -21,15 +22,23 @@ from oslo_db import exception as db_exc
 from oslo_db.sqlalchemy import enginefacade
 from oslo_db.sqlalchemy import utils as sqlalchemyutils
 from oslo_utils import timeutils
+import six
+from sqlalchemy import and_
+from sqlalchemy import DateTime
+from sqlalchemy import exists
+from sqlalchemy import func
+from sqlalchemy import MetaData
 from sqlalchemy import or_
+from sqlalchemy import select
+from sqlalchemy import Table
 from sqlalchemy.orm import joinedload
-from sqlalchemy.sql import func
 from sqlalchemy.sql import null
 
 import masakari.conf
 from masakari.db.sqlalchemy import models
 from masakari import exception
 from masakari.i18n import _
+from masakari import utils
 
 
 CONF = masakari.conf.CONF
@@ -205,6 +214,50 @@ def _process_sort_params(sort_keys, sort_dirs,
     return result_keys, result_dirs
 
 
+class _CursorMarker(object):
+    """Sort key values of the row after which a page starts."""
+
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+
+def _get_marker(context, model, marker, sort_keys):
+    """Returns the row, or its sort key values, a page starts after.
+
+    The marker is either the id of the row, which is looked up, or a cursor
+    encoded by utils.encode_pagination_cursor() holding the sort key values
+    of the row, so that the page is a single range query.
+    """
+    if marker is None:
+        return None
+
+    if (isinstance(marker, six.integer_types) or
+            six.text_type(marker).isdigit()):
+        marker_row = model_query(context, model).filter_by(id=marker).first()
+        if not marker_row:
+            raise exception.MarkerNotFound(marker=marker)
+        return marker_row
+
+    values = utils.decode_pagination_cursor(marker)
+    columns = model.__table__.columns
+    for sort_key in sort_keys:
+        if sort_key not in columns:
+            # rejected by paginate_query
+            continue
+        if sort_key not in values:
+            raise exception.InvalidInput(
+                reason=_("Invalid pagination marker %s.") % marker)
+        if (values[sort_key] is not None and
+                isinstance(columns[sort_key].type, DateTime)):
+            try:
+                values[sort_key] = timeutils.parse_strtime(values[sort_key])
+            except (TypeError, ValueError):
+                raise exception.InvalidInput(
+                    reason=_("Invalid pagination marker %s.") % marker)
+
+    return _CursorMarker(values)
+
+
 @oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
 @main_context_manager.reader
 def failover_segment_get_all_by_filters(
@@ -228,14 +281,8 @@ def failover_segment_get_all_by_filters(
         query = query.filter(models.FailoverSegment.service_type == filters[
             'service_type'])
 
-    marker_row = None
-    if marker is not None:
-        marker_row = model_query(context,
-                                 models.FailoverSegment
-                                 ).filter_by(id=marker).first()
-
-        if not marker_row:
-            raise exception.MarkerNotFound(marker=marker)
+    marker_row = _get_marker(context, models.FailoverSegment, marker,
+                             sort_keys)
 
     try:
         query = sqlalchemyutils.paginate_query(query, models.FailoverSegment,
@@ -339,14 +386,10 @@ def is_failover_segment_under_recovery(context, failover_segment_id,
                                        filters=None):
     filters = filters or {}
 
-    # get all hosts against the failover_segment
-    inner_select = model_query(
-        context, models.Host, (models.Host.uuid,)).filter(
-            models.Host.failover_segment_id == failover_segment_id)
-
-    # check if any host has notification status as new, running or error
-    query = model_query(context, models.Notification,
-                        (func.count(models.Notification.id),))
+    # check if any notification of the segment has status as new, running
+    # or error
+    query = model_query(context, models.Notification).filter_by(
+        failover_segment_id=failover_segment_id)
     if 'status' in filters:
         status = filters['status']
         if isinstance(status, (list, tuple, set, frozenset)):
@@ -355,10 +398,7 @@ def is_failover_segment_under_recovery(context, failover_segment_id,
         else:
             query = query.filter(models.Notification.status == status)
 
-    query = query.filter(
-        models.Notification.source_host_uuid.in_(inner_select.subquery()))
-
-    return query.first()[0] > 0
+    return context.session.query(query.exists()).scalar()
 
 
 # db apis for host
@@ -396,13 +436,7 @@ def host_get_all_by_filters(
     if 'reserved' in filters:
         query = query.filter(models.Host.reserved == filters['reserved'])
 
-    marker_row = None
-    if marker is not None:
-        marker_row = model_query(context,
-                                 models.Host
-                                 ).filter_by(id=marker).first()
-        if not marker_row:
-            raise exception.MarkerNotFound(marker=marker)
+    marker_row = _get_marker(context, models.Host, marker, sort_keys)
 
     try:
         query = sqlalchemyutils.paginate_query(query, models.Host, limit,
@@ -517,6 +551,28 @@ def notifications_get_all_by_filters(
     sort_keys, sort_dirs = _process_sort_params(sort_keys,
                                                 sort_dirs)
 
+    query = _notifications_filter_query(context, filters)
+    marker_row = _get_marker(context, models.Notification, marker, sort_keys)
+
+    try:
+        query = sqlalchemyutils.paginate_query(query, models.Notification,
+                                               limit,
+                                               sort_keys,
+                                               marker=marker_row,
+                                               sort_dirs=sort_dirs)
+    except db_exc.InvalidSortKey as err:
+        raise exception.InvalidSortKey(err.message)
+
+    return query.all()
+
+
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.reader
+def notifications_count_by_filters(context, filters=None):
+    return _notifications_filter_query(context, filters).count()
+
+
+def _notifications_filter_query(context, filters):
     filters = filters or {}
     query = model_query(context, models.Notification)
 
@@ -540,24 +596,19 @@ def notifications_get_all_by_filters(
         query = query.filter(
             models.Notification.generated_time >= generated_since)
 
-    marker_row = None
-    if marker is not None:
-        marker_row = model_query(context,
-                                 models.Notification
-                                 ).filter_by(id=marker).first()
-        if not marker_row:
-            raise exception.MarkerNotFound(marker=marker)
+    if 'lease-expires-before' in filters:
+        lease_expires_before = timeutils.normalize_time(
+            filters['lease-expires-before'])
+        query = query.filter(
+            models.Notification.lease_expires_at < lease_expires_before)
 
-    try:
-        query = sqlalchemyutils.paginate_query(query, models.Notification,
-                                               limit,
-                                               sort_keys,
-                                               marker=marker_row,
-                                               sort_dirs=sort_dirs)
-    except db_exc.InvalidSortKey as err:
-        raise exception.InvalidSortKey(err.message)
+    if 'lease-expires-after' in filters:
+        lease_expires_after = timeutils.normalize_time(
+            filters['lease-expires-after'])
+        query = query.filter(
+            models.Notification.lease_expires_at > lease_expires_after)
 
-    return query.all()
+    return query
 
 
 @oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
@@ -592,17 +643,45 @@ def notification_get_by_id(context, notification_id):
     return result
 
 
+def _host_get_failover_segment_id(context, host_uuid):
+    result = model_query(context, models.Host,
+                         (models.Host.failover_segment_id,)).filter_by(
+        uuid=host_uuid).first()
+
+    return result[0] if result else None
+
+
 @oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
 @main_context_manager.writer
 def notification_create(context, values):
     notification = models.Notification()
     notification.update(values)
+    if 'failover_segment_id' not in values:
+        # Recorded on the notification, so that checking whether a failover
+        # segment is under recovery doesn't need to look at its hosts.
+        notification.failover_segment_id = _host_get_failover_segment_id(
+            context, values.get('source_host_uuid'))
 
     notification.save(session=context.session)
 
     return _notification_get_by_uuid(context, notification.notification_uuid)
 
 
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.reader
+def notification_duplicate_exists(context, source_host_uuid,
+                                  notification_type, payload_hash,
+                                  generated_since):
+    # Served by notifications_host_type_payload_hash_idx.
+    query = model_query(context, models.Notification).filter_by(
+        source_host_uuid=source_host_uuid, type=notification_type,
+        payload_hash=payload_hash).filter(
+        models.Notification.generated_time >= generated_since).filter(
+        models.Notification.status.in_(['new', 'running']))
+
+    return context.session.query(query.exists()).scalar()
+
+
 @oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
 @main_context_manager.writer
 def notification_update(context, notification_uuid, values):
@@ -615,6 +694,81 @@ def notification_update(context, notification_uuid, values):
     return _notification_get_by_uuid(context, notification.notification_uuid)
 
 
+def _claim_notification(context, notification_uuid, claimable, values):
+    # Conditional update, so that only one of the engines racing for the
+    # notification updates it.
+    count = model_query(context, models.Notification).filter_by(
+        notification_uuid=notification_uuid).filter(claimable).update(
+        values, synchronize_session=False)
+
+    if count == 0:
+        # raises NotificationNotFound if it doesn't exist at all
+        _notification_get_by_uuid(context, notification_uuid)
+        raise exception.NotificationAlreadyClaimed(
+            notification_uuid=notification_uuid)
+
+
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def notifications_expire_leases(context, owner):
+    now = timeutils.utcnow()
+    stale = or_(models.Notification.owner == owner,
+                models.Notification.owner == null(),
+                models.Notification.lease_expires_at == null())
+    values = {
+        # in the past, so that the lease is expired even when the db
+        # doesn't store fractions of seconds.
+        'lease_expires_at': now - datetime.timedelta(seconds=1),
+        'updated_at': now,
+    }
+    return model_query(context, models.Notification).filter(
+        models.Notification.status == 'running').filter(stale).update(
+        values, synchronize_session=False)
+
+
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def notification_claim(context, notification_uuid, owner, lease_duration):
+    now = timeutils.utcnow()
+    claimable = or_(
+        models.Notification.status.in_(['new', 'error']),
+        and_(models.Notification.status == 'running',
+             models.Notification.lease_expires_at < now))
+    values = {
+        'status': 'running',
+        'owner': owner,
+        'lease_expires_at': now + datetime.timedelta(seconds=lease_duration),
+        'updated_at': now,
+    }
+    _claim_notification(context, notification_uuid, claimable, values)
+
+    return _notification_get_by_uuid(context, notification_uuid)
+
+
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def notification_renew_lease(context, notification_uuid, owner,
+                             lease_duration):
+    now = timeutils.utcnow()
+    claimable = and_(models.Notification.status == 'running',
+                     models.Notification.owner == owner)
+    values = {
+        'lease_expires_at': now + datetime.timedelta(seconds=lease_duration),
+    }
+    _claim_notification(context, notification_uuid, claimable, values)
+
+
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def notification_release(context, notification_uuid, owner, values):
+    values = dict(values, owner=None, lease_expires_at=None,
+                  updated_at=timeutils.utcnow())
+    _claim_notification(context, notification_uuid,
+                        models.Notification.owner == owner, values)
+
+    return _notification_get_by_uuid(context, notification_uuid)
+
+
 @oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
 @main_context_manager.writer
 def notification_delete(context, notification_uuid):
@@ -625,3 +779,202 @@ def notification_delete(context, notification_uuid):
 
     if count == 0:
         raise exception.NotificationNotFound(id=notification_uuid)
+
+
+# db apis for evacuation
+
+
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.reader
+def evacuations_get_all_by_notification(context, notification_uuid):
+    query = model_query(context, models.Evacuation
+                        ).filter_by(notification_uuid=notification_uuid
+                                    ).order_by(models.Evacuation.id)
+
+    return query.all()
+
+
+def _evacuation_get(context, notification_uuid, instance_uuid):
+    query = model_query(context, models.Evacuation
+                        ).filter_by(notification_uuid=notification_uuid,
+                                    instance_uuid=instance_uuid)
+
+    result = query.first()
+    if not result:
+        raise exception.EvacuationNotFound(
+            notification_uuid=notification_uuid, instance_uuid=instance_uuid)
+
+    return result
+
+
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def evacuation_create(context, values):
+    evacuation = models.Evacuation()
+    evacuation.update(values)
+
+    evacuation.save(session=context.session)
+
+    return _evacuation_get(context, evacuation.notification_uuid,
+                           evacuation.instance_uuid)
+
+
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def evacuation_update(context, notification_uuid, instance_uuid, values):
+    evacuation = _evacuation_get(context, notification_uuid, instance_uuid)
+
+    evacuation.update(values)
+
+    evacuation.save(session=context.session)
+
+    return _evacuation_get(context, notification_uuid, instance_uuid)
+
+
+# db apis for purging and archiving rows
+
+
+_SHADOW_TABLE_PREFIX = 'shadow_'
+
+
+def _deleted_before(table, before):
+    condition = table.c.deleted != 0
+    if before is not None:
+        condition = and_(condition, table.c.deleted_at < before)
+    return condition
+
+
+def _removable_rows(before):
+    # Tables are processed in this order, so that a notification is only
+    # removed after its evacuations and a failover segment only after the
+    # hosts which belonged to it.
+    evacuations = models.Evacuation.__table__
+    notifications = models.Notification.__table__
+    hosts = models.Host.__table__
+    segments = models.FailoverSegment.__table__
+
+    processed = notifications.c.status.in_(['finished', 'ignored', 'failed'])
+    if before is not None:
+        processed = and_(processed, func.coalesce(
+            notifications.c.updated_at, notifications.c.created_at) < before)
+
+    host_exists = exists().where(
+        hosts.c.failover_segment_id == segments.c.uuid)
+
+    removable_notification = or_(processed,
+                                 _deleted_before(notifications, before))
+
+    return [
+        (evacuations, evacuations.c.notification_uuid.in_(
+            select([notifications.c.notification_uuid]).where(
+                removable_notification))),
+        (notifications, removable_notification),
+        (hosts, _deleted_before(hosts, before)),
+        (segments, and_(_deleted_before(segments, before), ~host_exists)),
+    ]
+
+
+def _remove_rows(context, table, condition, archive):
+    if archive:
+        shadow_table = Table(_SHADOW_TABLE_PREFIX + table.name, MetaData(),
+                             autoload=True,
+                             autoload_with=context.session.connection())
+        columns = [column.name for column in table.columns]
+        context.session.execute(shadow_table.insert().from_select(
+            columns, select([table.c[name] for name in columns]).where(
+                condition)))
+
+    return context.session.execute(table.delete().where(condition)).rowcount
+
+
+def _remove_rows_batch(context, before, max_rows, archive):
+    # Only one table is processed per batch, so that a batch holds locks on
+    # at most max_rows rows.
+    for table, condition in _removable_rows(before):
+        rows = context.session.execute(select([table.c.id]).where(
+            condition).order_by(table.c.id).limit(max_rows)).fetchall()
+        if not rows:
+            continue
+
+        return {table.name: _remove_rows(
+            context, table, table.c.id.in_([row[0] for row in rows]),
+            archive)}
+
+    return {}
+
+
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def purge_rows(context, before, max_rows):
+    return _remove_rows_batch(context, before, max_rows, archive=False)
+
+
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def archive_rows(context, before, max_rows):
+    return _remove_rows_batch(context, before, max_rows, archive=True)
+
+
+# lock related db apis
+
+
+@main_context_manager.writer
+def _lock_take_over(context, name, owner, lease_duration):
+    now = timeutils.utcnow()
+    values = {
+        'owner': owner,
+        'expires_at': now + datetime.timedelta(seconds=lease_duration),
+        'updated_at': now,
+    }
+    count = context.session.query(models.Lock).filter_by(name=name).filter(
+        models.Lock.expires_at < now).update(values,
+                                             synchronize_session=False)
+    return count > 0
+
+
+@main_context_manager.writer
+def _lock_create(context, name, owner, lease_duration):
+    lock = models.Lock()
+    lock.update({
+        'name': name,
+        'owner': owner,
+        'expires_at': timeutils.utcnow() + datetime.timedelta(
+            seconds=lease_duration),
+    })
+    lock.save(session=context.session)
+
+
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+def lock_acquire(context, name, owner, lease_duration):
+    # The row of a lock whose holder stopped without releasing it is taken
+    # over once its lease has expired, otherwise the row is inserted and the
+    # unique constraint on the name decides between engines racing for it.
+    if _lock_take_over(context, name, owner, lease_duration):
+        return True
+
+    try:
+        _lock_create(context, name, owner, lease_duration)
+    except db_exc.DBDuplicateEntry:
+        return False
+
+    return True
+
+
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def lock_renew(context, name, owner, lease_duration):
+    now = timeutils.utcnow()
+    values = {
+        'expires_at': now + datetime.timedelta(seconds=lease_duration),
+        'updated_at': now,
+    }
+    count = context.session.query(models.Lock).filter_by(
+        name=name, owner=owner).update(values, synchronize_session=False)
+    return count > 0
+
+
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def lock_release(context, name, owner):
+    context.session.query(models.Lock).filter_by(
+        name=name, owner=owner).delete(synchronize_session=False)
@@ -0,0 +1,28 @@
+# Copyright 2017 NTT DATA
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Column, MetaData, Table
+from sqlalchemy import DateTime, String
+
+
+def upgrade(migrate_engine):
+    meta = MetaData(bind=migrate_engine)
+
+    notifications = Table('notifications', meta, autoload=True)
+
+    # Engine processing the notification and time until which it owns it.
+    notifications.create_column(Column('owner', String(255), nullable=True))
+    notifications.create_column(Column('lease_expires_at', DateTime,
+                                       nullable=True))
@@ -0,0 +1,43 @@
+# Copyright 2017 NTT DATA
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from migrate.changeset import UniqueConstraint
+from sqlalchemy import Column, MetaData, Table
+from sqlalchemy import Integer, DateTime, String
+
+
+def define_locks_table(meta):
+
+    locks = Table('locks',
+                  meta,
+                  Column('created_at', DateTime),
+                  Column('updated_at', DateTime),
+                  Column('id', Integer, primary_key=True, nullable=False),
+                  Column('name', String(255), nullable=False),
+                  Column('owner', String(255), nullable=False),
+                  Column('expires_at', DateTime, nullable=False),
+                  UniqueConstraint('name', name='uniq_lock0name'),
+                  mysql_engine='InnoDB',
+                  mysql_charset='utf8',
+                  extend_existing=True)
+
+    return locks
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+    table = define_locks_table(meta)
+    table.create()
@@ -0,0 +1,68 @@
+# Copyright 2017 NTT DATA
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+
+from oslo_serialization import jsonutils
+from sqlalchemy import Column, Index, MetaData, String, Table
+from sqlalchemy import bindparam, select
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _payload_hash(payload):
+    # Same fingerprint as masakari.utils.notification_payload_hash, kept
+    # here so that this migration doesn't change with it.
+    if payload is None:
+        return None
+    canonical = jsonutils.dumps(jsonutils.loads(payload), sort_keys=True,
+                                separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def upgrade(migrate_engine):
+    meta = MetaData(bind=migrate_engine)
+
+    notifications = Table('notifications', meta, autoload=True)
+
+    notifications.create_column(Column('payload_hash', String(64),
+                                       nullable=True))
+
+    # Backfill the existing notifications in batches of rows, every batch
+    # is updated by a single executemany statement. The hash of the
+    # canonical JSON payload can't be computed by the database.
+    update = notifications.update().where(
+        notifications.c.id == bindparam('row_id')).values(
+        payload_hash=bindparam('row_payload_hash'))
+    last_id = 0
+    while True:
+        rows = migrate_engine.execute(
+            select([notifications.c.id, notifications.c.payload]).where(
+                notifications.c.id > last_id).order_by(
+                notifications.c.id).limit(BACKFILL_BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+
+        with migrate_engine.begin() as connection:
+            connection.execute(update, [
+                {'row_id': row.id,
+                 'row_payload_hash': _payload_hash(row.payload)}
+                for row in rows])
+        last_id = rows[-1].id
+
+    Index('notifications_host_type_payload_hash_idx',
+          notifications.c.source_host_uuid, notifications.c.type,
+          notifications.c.payload_hash,
+          notifications.c.generated_time).create(migrate_engine)
@@ -0,0 +1,46 @@
+# Copyright 2017 NTT DATA
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import and_, func, select
+from sqlalchemy import Column, Index, MetaData, String, Table
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def upgrade(migrate_engine):
+    meta = MetaData(bind=migrate_engine)
+
+    notifications = Table('notifications', meta, autoload=True)
+    hosts = Table('hosts', meta, autoload=True)
+
+    # Failover segment of the source host of the notification.
+    notifications.create_column(Column('failover_segment_id', String(36),
+                                       nullable=True))
+
+    # Backfill the existing notifications in ranges of ids.
+    failover_segment_id = select([hosts.c.failover_segment_id]).where(
+        hosts.c.uuid == notifications.c.source_host_uuid).limit(1).as_scalar()
+    max_id = migrate_engine.execute(
+        select([func.max(notifications.c.id)])).scalar() or 0
+    for start in range(0, max_id, BACKFILL_BATCH_SIZE):
+        migrate_engine.execute(notifications.update().where(and_(
+            notifications.c.id > start,
+            notifications.c.id <= start + BACKFILL_BATCH_SIZE)).values(
+            failover_segment_id=failover_segment_id))
+
+    # Notifications of a failover segment under recovery.
+    Index('notifications_failover_segment_id_status_idx',
+          notifications.c.failover_segment_id,
+          notifications.c.status).create(migrate_engine)
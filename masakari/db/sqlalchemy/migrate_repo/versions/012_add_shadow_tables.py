@@ -0,0 +1,46 @@
+# Copyright 2017 NTT DATA
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Column, Enum, MetaData, String, Table
+
+# Tables whose rows are moved to a shadow table by 'masakari-manage db
+# archive'. A column added to one of them must be added to its shadow table.
+ARCHIVED_TABLES = ['failover_segments', 'hosts', 'notifications',
+                   'evacuations']
+
+
+def _create_shadow_table(meta, table_name):
+    table = Table(table_name, meta, autoload=True)
+
+    columns = []
+    for column in table.columns:
+        # Enum types are named after the column of the original table.
+        column_type = (String(255) if isinstance(column.type, Enum)
+                       else column.type.copy())
+        columns.append(Column(column.name, column_type,
+                              primary_key=column.primary_key,
+                              nullable=column.nullable,
+                              autoincrement=False))
+
+    shadow_table = Table('shadow_' + table_name, meta, *columns,
+                         mysql_engine='InnoDB', mysql_charset='utf8')
+    shadow_table.create()
+
+
+def upgrade(migrate_engine):
+    meta = MetaData(bind=migrate_engine)
+
+    for table_name in ARCHIVED_TABLES:
+        _create_shadow_table(meta, table_name)
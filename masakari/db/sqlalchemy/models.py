@@ -115,6 +115,12 @@ class Notification(BASE, MasakariAPIBase, models.SoftDeleteMixin):
     __table_args__ = (
         schema.UniqueConstraint('notification_uuid',
                                 name='uniq_notification0uuid'),
+        Index('notifications_host_type_payload_hash_idx',
+              'source_host_uuid', 'type', 'payload_hash', 'generated_time'),
+        Index('notifications_status_lease_expires_at_idx',
+              'status', 'lease_expires_at'),
+        Index('notifications_failover_segment_id_status_idx',
+              'failover_segment_id', 'status'),
     )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -126,3 +132,39 @@ class Notification(BASE, MasakariAPIBase, models.SoftDeleteMixin):
                          'ignored', 'finished', name='notification_status'),
                     nullable=False)
     source_host_uuid = Column(String(36), nullable=False)
+    owner = Column(String(255))
+    lease_expires_at = Column(DateTime)
+    payload_hash = Column(String(64))
+    failover_segment_id = Column(String(36))
+
+
+class Evacuation(BASE, MasakariAPIBase, models.SoftDeleteMixin):
+    """Represents the evacuation of an instance for a notification."""
+    __tablename__ = 'evacuations'
+    __table_args__ = (
+        schema.UniqueConstraint('notification_uuid', 'instance_uuid',
+                                'deleted',
+                                name='uniq_evacuation0notification0instance'
+                                     '0deleted'),
+        Index('evacuations_notification_uuid_idx', 'notification_uuid'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    notification_uuid = Column(String(36), nullable=False)
+    instance_uuid = Column(String(36), nullable=False)
+    status = Column(Enum('evacuating', 'evacuated', 'error',
+                         name='evacuation_status'),
+                    nullable=False)
+
+
+class Lock(BASE, MasakariAPIBase):
+    """Represents a lock leased by an engine."""
+    __tablename__ = 'locks'
+    __table_args__ = (
+        schema.UniqueConstraint('name', name='uniq_lock0name'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(255), nullable=False)
+    owner = Column(String(255), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
@@ -52,6 +52,10 @@ class NotificationDriver(object):
                                 notification_uuid):
         pass
 
+    def get_recovery_timing_stats(self):
+        """Returns duration statistics of the recovery workflows."""
+        return {}
+
 
 def load_masakari_driver(masakari_driver=None):
     """Load a masakari driver module.
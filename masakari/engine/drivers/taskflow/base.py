@@ -12,19 +12,69 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import math
 import os
 
 from oslo_log import log as logging
 # For more information please visit: https://wiki.openstack.org/wiki/TaskFlow
+from taskflow.engines.action_engine import compiler
 from taskflow import formatters
 from taskflow.listeners import base
 from taskflow.listeners import logging as logging_listener
+from taskflow.listeners import timing
+from taskflow import states
 from taskflow import task
 
 from masakari import exception
 
 LOG = logging.getLogger(__name__)
 
+# Number of most recent durations kept per task, flow and notification type
+# to compute the percentiles from.
+_MAX_SAMPLES = 1000
+
+_TIMING_SAMPLES = {
+    compiler.TASK: collections.defaultdict(
+        lambda: collections.deque(maxlen=_MAX_SAMPLES)),
+    compiler.FLOW: collections.defaultdict(
+        lambda: collections.deque(maxlen=_MAX_SAMPLES)),
+    'notification_type': collections.defaultdict(
+        lambda: collections.deque(maxlen=_MAX_SAMPLES)),
+}
+
+
+def _percentile(sorted_samples, percent):
+    # nearest-rank percentile
+    rank = int(math.ceil(percent / 100.0 * len(sorted_samples)))
+    return sorted_samples[max(rank, 1) - 1]
+
+
+def get_timing_stats():
+    """Returns the duration percentiles per task, flow and notification type.
+
+    Durations are in seconds, computed over the most recent executions of
+    every task, flow and notification type.
+    """
+    result = {}
+    for kind, samples_by_name in _TIMING_SAMPLES.items():
+        result[kind] = {}
+        for name, samples in samples_by_name.items():
+            sorted_samples = sorted(samples)
+            result[kind][name] = {
+                'count': len(sorted_samples),
+                'p50': _percentile(sorted_samples, 50),
+                'p95': _percentile(sorted_samples, 95),
+                'p99': _percentile(sorted_samples, 99),
+                'max': sorted_samples[-1],
+            }
+    return result
+
+
+def reset_timing_stats():
+    for samples_by_name in _TIMING_SAMPLES.values():
+        samples_by_name.clear()
+
 
 def _make_task_name(cls, addons=None):
     """Makes a pretty name for a task class."""
@@ -88,3 +138,37 @@ class DynamicLogListener(logging_listener.DynamicLoggingListener):
             flow_listen_for=flow_listen_for,
             retry_listen_for=retry_listen_for,
             log=logger, fail_formatter=SpecialFormatter(engine))
+
+
+class TimingListener(timing.DurationListener):
+    """Records the duration of the tasks and flows of a recovery workflow.
+
+    The duration of the whole flow is also recorded for the type of the
+    notification it recovers from, so that the time to recover can be
+    compared with the time spent in every task.
+    """
+
+    def __init__(self, engine, notification_type):
+        super(TimingListener, self).__init__(engine)
+        self._notification_type = notification_type
+
+    def _receiver(self, item_type, item_name, state):
+        # Durations are measured from the start of the execution, so the
+        # revert of a failed task isn't recorded as another execution and the
+        # duration of a reverted flow includes its execution.
+        if state == states.REVERTING:
+            return
+        super(TimingListener, self)._receiver(item_type, item_name, state)
+
+    def _record_ending(self, timer, item_type, item_name, state):
+        # The durations are only kept in memory, not in the flow storage.
+        duration = timer.elapsed()
+        _TIMING_SAMPLES[item_type][item_name].append(duration)
+        if item_type == compiler.FLOW:
+            _TIMING_SAMPLES['notification_type'][
+                self._notification_type].append(duration)
+
+        LOG.debug("%(item_type)s '%(item_name)s' finished with state "
+                  "%(state)s in %(duration).2f sec.",
+                  {'item_type': item_type, 'item_name': item_name,
+                   'state': state, 'duration': duration})
@@ -21,12 +21,14 @@ Driver TaskFlowDriver:
 
 from oslo_log import log as logging
 from oslo_utils import excutils
+from taskflow import exceptions as taskflow_exception
 
 from masakari.compute import nova
 from masakari.engine import driver
 from masakari.engine.drivers.taskflow import base
 from masakari.engine.drivers.taskflow import host_failure
 from masakari.engine.drivers.taskflow import instance_failure
+from masakari.engine.drivers.taskflow import persistence
 from masakari.engine.drivers.taskflow import process_failure
 from masakari import exception
 from masakari.i18n import _
@@ -46,27 +48,68 @@ class TaskFlowDriver(driver.NotificationDriver):
         # Attaching this listener will capture all of the notifications
         # that taskflow sends out and redirect them to a more useful
         # log for masakari's debugging (or error reporting) usage.
-        with base.DynamicLogListener(flow_engine, logger=LOG):
+        with base.DynamicLogListener(flow_engine, logger=LOG), \
+                base.TimingListener(flow_engine,
+                                    fields.NotificationType.COMPUTE_HOST):
             flow_engine.run()
 
-    def _execute_rh_workflow(self, novaclient, process_what,
-                             reserved_host_list):
+    @staticmethod
+    def _check_reserved_hosts(reserved_host_list):
         if not reserved_host_list:
             msg = _('No reserved_hosts available for evacuation.')
             LOG.info(msg)
             raise exception.ReservedHostsUnavailable(message=msg)
 
+    def _execute_rh_workflow(self, novaclient, process_what,
+                             reserved_host_list):
+        self._check_reserved_hosts(reserved_host_list)
+
         process_what['reserved_host_list'] = reserved_host_list
         flow_engine = host_failure.get_rh_flow(novaclient, process_what)
 
-        with base.DynamicLogListener(flow_engine, logger=LOG):
+        with base.DynamicLogListener(flow_engine, logger=LOG), \
+                base.TimingListener(flow_engine,
+                                    fields.NotificationType.COMPUTE_HOST):
             try:
                 flow_engine.run()
             except exception.LockAlreadyAcquired as ex:
                 raise exception.HostRecoveryFailureException(ex.message)
 
+    def _execute_priority_workflow(self, novaclient, process_what,
+                                   recovery_method, reserved_host_list):
+        # Both workflows are run by a single flow, which falls back to the
+        # other workflow right at the evacuation of the instances.
+        process_what['reserved_host_list'] = reserved_host_list
+        flow_engine = host_failure.get_priority_flow(
+            novaclient, process_what, recovery_method)
+
+        with base.DynamicLogListener(flow_engine, logger=LOG), \
+                base.TimingListener(flow_engine,
+                                    fields.NotificationType.COMPUTE_HOST):
+            try:
+                flow_engine.run()
+            except exception.LockAlreadyAcquired as ex:
+                raise exception.HostRecoveryFailureException(ex.message)
+            except taskflow_exception.WrappedFailure as ex:
+                # The recovery is skipped if neither workflow found any
+                # instance to evacuate.
+                if all(failure.check(exception.SkipHostRecoveryException)
+                       for failure in ex):
+                    next(iter(ex)).reraise()
+
+                # The failures of both workflows are raised together.
+                msg = "; ".join(failure.exception_str for failure in ex)
+                raise exception.HostRecoveryFailureException(msg)
+
     def _execute_auto_priority_workflow(self, novaclient, process_what,
                                         reserved_host_list):
+        if reserved_host_list:
+            self._execute_priority_workflow(
+                novaclient, process_what,
+                fields.FailoverSegmentRecoveryMethod.AUTO_PRIORITY,
+                reserved_host_list)
+            return
+
         try:
             self._execute_auto_workflow(novaclient, process_what)
         except Exception as ex:
@@ -76,44 +119,49 @@ class TaskFlowDriver(driver.NotificationDriver):
                     return
 
                 # Caught generic Exception to make sure that any failure
-                # should lead to execute 'reserved_host' recovery workflow.
+                # is reported as there is no reserved_host to fall back to.
                 msg = ("Failed to evacuate all instances from "
                        "failed_host: '%(failed_host)s' using "
-                       "'%(auto)s' workflow, retrying using "
-                       "'%(reserved_host)s' workflow.")
+                       "'%(auto)s' workflow.")
                 LOG.warning(msg, {
                     'failed_host': process_what['host_name'],
-                    'auto': fields.FailoverSegmentRecoveryMethod.AUTO,
-                    'reserved_host':
-                        fields.FailoverSegmentRecoveryMethod.RESERVED_HOST
+                    'auto': fields.FailoverSegmentRecoveryMethod.AUTO
                 })
-                self._execute_rh_workflow(novaclient, process_what,
-                                          reserved_host_list)
+                self._check_reserved_hosts(reserved_host_list)
 
     def _execute_rh_priority_workflow(self, novaclient, process_what,
                                       reserved_host_list):
-        try:
+        if reserved_host_list:
+            self._execute_priority_workflow(
+                novaclient, process_what,
+                fields.FailoverSegmentRecoveryMethod.RH_PRIORITY,
+                reserved_host_list)
+            return
+
+        msg = ("No reserved_hosts available for evacuation of instances "
+               "from failed_host '%(failed_host)s', using '%(auto)s' "
+               "workflow.")
+        LOG.warning(msg, {
+            'failed_host': process_what['host_name'],
+            'auto': fields.FailoverSegmentRecoveryMethod.AUTO
+        })
+        self._execute_auto_workflow(novaclient, process_what)
+
+    def _execute_host_failure_workflow(self, novaclient, process_what,
+                                       recovery_method, reserved_host_list):
+        if recovery_method == fields.FailoverSegmentRecoveryMethod.AUTO:
+            self._execute_auto_workflow(novaclient, process_what)
+        elif recovery_method == (
+                fields.FailoverSegmentRecoveryMethod.RESERVED_HOST):
             self._execute_rh_workflow(novaclient, process_what,
                                       reserved_host_list)
-        except Exception as ex:
-            with excutils.save_and_reraise_exception(reraise=False) as ctxt:
-                if isinstance(ex, exception.SkipHostRecoveryException):
-                    ctxt.reraise = True
-                    return
-
-                # Caught generic Exception to make sure that any failure
-                # should lead to execute 'auto' recovery workflow.
-                msg = ("Failed to evacuate all instances from "
-                       "failed_host '%(failed_host)s' using "
-                       "'%(reserved_host)s' workflow, retrying using "
-                       "'%(auto)s' workflow")
-                LOG.warning(msg, {
-                    'failed_host': process_what['host_name'],
-                    'reserved_host':
-                        fields.FailoverSegmentRecoveryMethod.RESERVED_HOST,
-                    'auto': fields.FailoverSegmentRecoveryMethod.AUTO
-                })
-                self._execute_auto_workflow(novaclient, process_what)
+        elif recovery_method == (
+                fields.FailoverSegmentRecoveryMethod.AUTO_PRIORITY):
+            self._execute_auto_priority_workflow(novaclient, process_what,
+                                                reserved_host_list)
+        else:
+            self._execute_rh_priority_workflow(novaclient, process_what,
+                                               reserved_host_list)
 
     def execute_host_failure(self, context, host_name, recovery_method,
                              notification_uuid, reserved_host_list=None):
@@ -121,23 +169,15 @@ class TaskFlowDriver(driver.NotificationDriver):
         # get flow for host failure
         process_what = {
             'context': context,
-            'host_name': host_name
+            'host_name': host_name,
+            'notification_uuid': notification_uuid
         }
 
         try:
-            if recovery_method == fields.FailoverSegmentRecoveryMethod.AUTO:
-                self._execute_auto_workflow(novaclient, process_what)
-            elif recovery_method == (
-                    fields.FailoverSegmentRecoveryMethod.RESERVED_HOST):
-                self._execute_rh_workflow(novaclient, process_what,
-                                          reserved_host_list)
-            elif recovery_method == (
-                    fields.FailoverSegmentRecoveryMethod.AUTO_PRIORITY):
-                self._execute_auto_priority_workflow(novaclient, process_what,
-                                                    reserved_host_list)
-            else:
-                self._execute_rh_priority_workflow(novaclient, process_what,
-                                                   reserved_host_list)
+            with persistence.discard_flows_when_done(notification_uuid):
+                self._execute_host_failure_workflow(
+                    novaclient, process_what, recovery_method,
+                    reserved_host_list)
         except Exception as exc:
             with excutils.save_and_reraise_exception(reraise=False) as ctxt:
                 if isinstance(exc, (exception.SkipHostRecoveryException,
@@ -155,7 +195,8 @@ class TaskFlowDriver(driver.NotificationDriver):
         # get flow for instance failure
         process_what = {
             'context': context,
-            'instance_uuid': instance_uuid
+            'instance_uuid': instance_uuid,
+            'notification_uuid': notification_uuid
         }
 
         try:
@@ -170,8 +211,11 @@ class TaskFlowDriver(driver.NotificationDriver):
         # Attaching this listener will capture all of the notifications that
         # taskflow sends out and redirect them to a more useful log for
         # masakari's debugging (or error reporting) usage.
-        with base.DynamicLogListener(flow_engine, logger=LOG):
-            flow_engine.run()
+        with persistence.discard_flows_when_done(notification_uuid):
+            with base.DynamicLogListener(flow_engine, logger=LOG), \
+                    base.TimingListener(flow_engine,
+                                        fields.NotificationType.VM):
+                flow_engine.run()
 
     def execute_process_failure(self, context, process_name, host_name,
                                 notification_uuid):
@@ -180,7 +224,8 @@ class TaskFlowDriver(driver.NotificationDriver):
         process_what = {
             'context': context,
             'process_name': process_name,
-            'host_name': host_name
+            'host_name': host_name,
+            'notification_uuid': notification_uuid
         }
 
         # TODO(abhishekk) We need to create a map for process_name and
@@ -204,5 +249,11 @@ class TaskFlowDriver(driver.NotificationDriver):
         # Attaching this listener will capture all of the notifications that
         # taskflow sends out and redirect them to a more useful log for
         # masakari's debugging (or error reporting) usage.
-        with base.DynamicLogListener(flow_engine, logger=LOG):
-            flow_engine.run()
+        with persistence.discard_flows_when_done(notification_uuid):
+            with base.DynamicLogListener(flow_engine, logger=LOG), \
+                    base.TimingListener(flow_engine,
+                                        fields.NotificationType.PROCESS):
+                flow_engine.run()
+
+    def get_recovery_timing_stats(self):
+        return base.get_timing_stats()
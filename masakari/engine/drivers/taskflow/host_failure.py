@@ -13,20 +13,28 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import functools
+
 import eventlet
-from eventlet import timeout as etimeout
 
 from oslo_log import log as logging
-from oslo_service import loopingcall
 from oslo_utils import strutils
-import taskflow.engines
+from oslo_utils import timeutils
+from taskflow.patterns import graph_flow
 from taskflow.patterns import linear_flow
 from taskflow import retry
 
+from masakari.compute import nova
 import masakari.conf
 from masakari.engine.drivers.taskflow import base
+from masakari.engine.drivers.taskflow import persistence
+from masakari.engine.drivers.taskflow import placement
+from masakari.engine.drivers.taskflow import polling
 from masakari import exception
 from masakari.i18n import _
+from masakari import objects
+from masakari.objects import fields
 from masakari import utils
 
 
@@ -36,6 +44,177 @@ LOG = logging.getLogger(__name__)
 
 ACTION = 'instance:evacuate'
 
+# Task states of an instance being evacuated by nova.
+_EVACUATING_TASK_STATES = ('rebuilding', 'rebuild_block_device_mapping',
+                           'rebuild_spawning')
+
+
+def _wait_for_service_update(novaclient, context, host_name, enable=False):
+    """Wait until nova recognizes the nova-compute service update.
+
+    In 'poll' mode the wait ends as soon as nova reports the service as
+    disabled and down (or enabled and up if 'enable' is True), with
+    'wait_period_after_service_update' as the upper bound.
+    """
+    node_state = 'up' if enable else 'down'
+    if CONF.host_failure.service_update_wait_mode == 'fixed':
+        msg = ("Sleeping %(wait)s sec before starting recovery "
+               "thread until nova recognizes the node %(state)s.")
+        LOG.info(msg, {'wait': CONF.wait_period_after_service_update,
+                       'state': node_state})
+        eventlet.sleep(CONF.wait_period_after_service_update)
+        return
+
+    expected_status = 'enabled' if enable else 'disabled'
+
+    def _is_service_updated():
+        service = novaclient.get_service(context, host_name)
+        return (service.status == expected_status and
+                service.state == node_state)
+
+    msg = ("Waiting up to %(wait)s sec before starting recovery "
+           "thread until nova recognizes the node %(state)s.")
+    LOG.info(msg, {'wait': CONF.wait_period_after_service_update,
+                   'state': node_state})
+    if not polling.wait_until('service_update', _is_service_updated,
+                              CONF.wait_period_after_service_update):
+        msg = ("Nova doesn't recognize the node %(host_name)s %(state)s "
+               "after %(wait)s sec, continuing recovery.")
+        LOG.warning(msg, {'host_name': host_name, 'state': node_state,
+                          'wait': CONF.wait_period_after_service_update})
+
+
+def _get_instances_to_evacuate(novaclient, context, host_name):
+    """Get the instances to evacuate, HA_Enabled instances first."""
+    instance_list = novaclient.get_servers(context, host_name)
+
+    if CONF.host_failure.evacuate_all_instances:
+        return sorted(
+            instance_list, key=lambda k: strutils.bool_from_string(
+                k.metadata.get('HA_Enabled', False)), reverse=True)
+
+    return [instance for instance in instance_list if
+            strutils.bool_from_string(instance.metadata.get('HA_Enabled',
+                                                            False))]
+
+
+def _get_instance_demands(novaclient, context, instance_list):
+    """Get the resources required by each instance from its flavor."""
+    flavors = {}
+    demands = []
+    for instance in instance_list:
+        flavor_id = instance.flavor['id']
+        if flavor_id not in flavors:
+            flavors[flavor_id] = novaclient.get_flavor(context, flavor_id)
+        flavor = flavors[flavor_id]
+        demands.append((instance.id, placement.Resources(
+            vcpus=flavor.vcpus, memory_mb=flavor.ram,
+            disk_gb=flavor.disk + getattr(flavor, 'OS-FLV-EXT-DATA:ephemeral',
+                                          0))))
+    return demands
+
+
+def _get_host_capacities(novaclient, context, host_names):
+    """Get the free resources of the given compute hosts."""
+    ratio = CONF.host_failure.reserved_host_cpu_allocation_ratio
+    capacities = {}
+    for hypervisor in novaclient.get_hypervisors(context):
+        host_name = hypervisor.service['host']
+        if host_name in host_names:
+            capacities[host_name] = placement.Resources(
+                vcpus=hypervisor.vcpus * ratio - hypervisor.vcpus_used,
+                memory_mb=hypervisor.free_ram_mb,
+                disk_gb=hypervisor.free_disk_gb)
+    return capacities
+
+
+class _EvacuationProgress(object):
+    """Evacuation status of every instance of a host failure notification.
+
+    It is loaded once per flow and shared by its tasks, so a retry or a
+    fallback to another recovery workflow only evacuates and confirms the
+    instances which are still on the failed host. The status is also stored
+    in the database, so that the next attempt to recover the notification
+    can use it, unless notification_uuid is None.
+    """
+
+    def __init__(self, context, notification_uuid):
+        self.context = context
+        self.notification_uuid = notification_uuid
+        self._evacuations = {}
+        self._statuses = {}
+        self._requested_at = {}
+        if notification_uuid:
+            for evacuation in objects.EvacuationList.get_all_by_notification(
+                    context, notification_uuid):
+                self._evacuations[evacuation.instance_uuid] = evacuation
+                self._statuses[evacuation.instance_uuid] = evacuation.status
+                if evacuation.status == fields.EvacuationStatus.EVACUATING:
+                    self._requested_at[evacuation.instance_uuid] = (
+                        timeutils.normalize_time(evacuation.updated_at or
+                                                 evacuation.created_at))
+
+    def get_status(self, instance_id):
+        return self._statuses.get(instance_id)
+
+    def get_requested_at(self, instance_id):
+        """Time nova accepted to evacuate the instance, if it's evacuating."""
+        return self._requested_at.get(instance_id)
+
+    def set_status(self, instance_id, status):
+        if self.get_status(instance_id) == status:
+            return
+
+        self._statuses[instance_id] = status
+        if status == fields.EvacuationStatus.EVACUATING:
+            self._requested_at[instance_id] = timeutils.utcnow()
+        else:
+            self._requested_at.pop(instance_id, None)
+
+        if not self.notification_uuid:
+            return
+
+        try:
+            evacuation = self._evacuations.get(instance_id)
+            if evacuation is None:
+                evacuation = objects.Evacuation(
+                    context=self.context,
+                    notification_uuid=self.notification_uuid,
+                    instance_uuid=instance_id, status=status)
+                evacuation.create()
+                self._evacuations[instance_id] = evacuation
+            else:
+                evacuation.status = status
+                evacuation.save()
+        except Exception:
+            # The progress only saves work on retries, failing to record it
+            # must not fail the recovery itself.
+            LOG.warning("Failed to record evacuation status %(status)s of "
+                        "instance %(instance)s for notification "
+                        "%(notification_uuid)s.",
+                        {'status': status, 'instance': instance_id,
+                         'notification_uuid': self.notification_uuid},
+                        exc_info=True)
+
+
+def _get_evacuation_progress(context, notification_uuid, evacuation_progress):
+    # The progress is provided by the flow, tasks executed on their own
+    # load it.
+    if evacuation_progress is not None:
+        return evacuation_progress
+    return _EvacuationProgress(context, notification_uuid)
+
+
+def _load_into_engine(flow_detail_name, flow, process_what):
+    # The evacuation progress is loaded once and shared by all the tasks of
+    # the flow. Like the other values of process_what it isn't saved with
+    # the flow, it's loaded again when the flow is resumed.
+    store = dict(process_what)
+    store['evacuation_progress'] = _EvacuationProgress(
+        process_what['context'], process_what.get('notification_uuid'))
+    return persistence.load_taskflow_into_engine(flow_detail_name, flow,
+                                                 store)
+
 
 class DisableComputeServiceTask(base.MasakariTask):
     def __init__(self, novaclient):
@@ -47,35 +226,46 @@ class DisableComputeServiceTask(base.MasakariTask):
     def execute(self, context, host_name):
         self.novaclient.enable_disable_service(context, host_name)
 
-        # Sleep until nova-compute service is marked as disabled.
-        msg = ("Sleeping %(wait)s sec before starting recovery "
-               "thread until nova recognizes the node down.")
-        LOG.info(msg, {'wait': CONF.wait_period_after_service_update})
-        eventlet.sleep(CONF.wait_period_after_service_update)
+        if CONF.host_failure.force_down_failed_host:
+            try:
+                # Nova recognizes the node down as soon as the service is
+                # forced down, so there is no need to wait.
+                self.novaclient.force_down_service(context, host_name)
+                return
+            except exception.MasakariException as ex:
+                LOG.warning("Failed to force down nova-compute service on "
+                            "host %(host_name)s, waiting for nova to "
+                            "recognize the node down: %(error)s",
+                            {'host_name': host_name, 'error': ex})
+
+        # Wait until nova-compute service is marked as disabled.
+        _wait_for_service_update(self.novaclient, context, host_name)
 
 
 class PrepareHAEnabledInstancesTask(base.MasakariTask):
     """Get all HA_Enabled instances."""
     default_provides = set(["instance_list"])
 
-    def __init__(self, novaclient):
+    def __init__(self, novaclient, recovery_method=None):
         requires = ["host_name"]
-        super(PrepareHAEnabledInstancesTask, self).__init__(addons=[ACTION],
-                                                            requires=requires)
+        super(PrepareHAEnabledInstancesTask, self).__init__(
+            addons=_make_addons(recovery_method), requires=requires)
         self.novaclient = novaclient
 
-    def execute(self, context, host_name):
-        instance_list = self.novaclient.get_servers(context, host_name)
+    def execute(self, context, host_name, notification_uuid=None,
+                evacuation_progress=None):
+        instance_list = _get_instances_to_evacuate(self.novaclient, context,
+                                                   host_name)
+
+        # Instances confirmed as evacuated by a previous attempt to recover
+        # this notification don't need to be evacuated again.
+        progress = _get_evacuation_progress(context, notification_uuid,
+                                            evacuation_progress)
+        instance_list = [
+            instance for instance in instance_list
+            if progress.get_status(instance.id) !=
+            fields.EvacuationStatus.EVACUATED]
 
-        if CONF.host_failure.evacuate_all_instances:
-            instance_list = sorted(
-                instance_list, key=lambda k: strutils.bool_from_string(
-                    k.metadata.get('HA_Enabled', False)), reverse=True)
-        else:
-            instance_list = (
-                [instance for instance in instance_list if
-                 strutils.bool_from_string(instance.metadata.get('HA_Enabled',
-                                                                 False))])
         if not instance_list:
             msg = _('No instances to evacuate on host: %s.') % host_name
             LOG.info(msg)
@@ -86,63 +276,234 @@ class PrepareHAEnabledInstancesTask(base.MasakariTask):
         }
 
 
-class EvacuateInstancesTask(base.MasakariTask):
-    default_provides = set(["instance_list"])
+class OrderReservedHostsTask(base.MasakariTask):
+    """Order reserved hosts by their free capacity.
+
+    Reserved hosts which can take all the instances to evacuate are tried
+    first, so that the reserved_host workflow doesn't have to be retried
+    because of a reserved host running out of capacity.
+    """
+    default_provides = set(["ordered_reserved_host_list"])
 
     def __init__(self, novaclient):
+        requires = ["host_name", "reserved_host_list"]
+        super(OrderReservedHostsTask, self).__init__(addons=[ACTION],
+                                                     requires=requires)
+        self.novaclient = novaclient
+
+    def execute(self, context, host_name, reserved_host_list):
+        instance_list = _get_instances_to_evacuate(self.novaclient, context,
+                                                   host_name)
+        if not instance_list:
+            # PrepareHAEnabledInstancesTask skips the recovery.
+            return {
+                "ordered_reserved_host_list": reserved_host_list,
+            }
+
+        try:
+            demands = _get_instance_demands(self.novaclient, context,
+                                            instance_list)
+            capacities = _get_host_capacities(
+                self.novaclient, context,
+                set(reserved_host.name
+                    for reserved_host in reserved_host_list))
+        except exception.MasakariException as ex:
+            # The reserved hosts are still tried, just in their db order.
+            LOG.warning("Failed to get the resources of the instances and "
+                        "reserved hosts, keeping the order of the reserved "
+                        "hosts: %(error)s", {'error': ex})
+            return {
+                "ordered_reserved_host_list": reserved_host_list,
+            }
+
+        ordered_names = placement.order_hosts(
+            demands, [(reserved_host.name, capacities[reserved_host.name])
+                      for reserved_host in reserved_host_list
+                      if reserved_host.name in capacities])
+        hosts_by_name = {reserved_host.name: reserved_host
+                         for reserved_host in reserved_host_list}
+
+        # Reserved hosts unknown to nova are tried last.
+        ordered_reserved_host_list = (
+            [hosts_by_name[name] for name in ordered_names] +
+            [reserved_host for reserved_host in reserved_host_list
+             if reserved_host.name not in capacities])
+
+        LOG.info("Reserved hosts ordered by capacity for evacuating "
+                 "instances from host %(host_name)s: %(hosts)s",
+                 {'host_name': host_name,
+                  'hosts': [reserved_host.name for reserved_host in
+                            ordered_reserved_host_list]})
+        return {
+            "ordered_reserved_host_list": ordered_reserved_host_list,
+        }
+
+
+def _add_reserved_host_to_aggregate(novaclient, context, host_name,
+                                    reserved_host):
+    # Assign reserved_host to an aggregate to which the failed
+    # compute host belongs to.
+    aggregates = novaclient.get_aggregates_for_host(context, host_name)
+    if aggregates and reserved_host.name not in (aggregates[0].hosts or []):
+        # A failed compute host can be associated with
+        # multiple aggregates but operators will not
+        # associate it with multiple aggregates in real
+        # deployment so adding reserved_host to the very
+        # first aggregate from the list.
+        novaclient.add_host_to_aggregate(
+            context, reserved_host.name, aggregates[0])
+
+
+def _prepare_reserved_host(novaclient, context, host_name, reserved_host):
+    """Make reserved_host ready to take instances of the failed host."""
+    if CONF.host_failure.add_reserved_host_to_aggregate:
+        try:
+            _add_reserved_host_to_aggregate(novaclient, context, host_name,
+                                            reserved_host)
+        except (exception.NotFound, exception.Conflict) as ex:
+            # The cached aggregates are outdated, the aggregate may have
+            # been deleted or changed since they were fetched from nova.
+            LOG.warning("Failed to add reserved host %(reserved_host)s to "
+                        "the aggregate of host %(host_name)s, retrying with "
+                        "the aggregates fetched again from nova: %(error)s",
+                        {'reserved_host': reserved_host.name,
+                         'host_name': host_name, 'error': ex})
+            nova.invalidate_aggregate_cache()
+            _add_reserved_host_to_aggregate(novaclient, context, host_name,
+                                            reserved_host)
+
+    novaclient.enable_disable_service(
+        context, reserved_host.name, enable=True)
+
+    # Wait until nova-compute service is marked as enabled.
+    _wait_for_service_update(novaclient, context, reserved_host.name,
+                             enable=True)
+
+    # Set reserved property of reserved_host to False
+    reserved_host.reserved = False
+    reserved_host.save()
+
+
+def _evacuate_instances(novaclient, context, instance_list, progress,
+                        target=None):
+    """Evacuate instances and return the ids of the failed ones.
+
+    Instances for which nova already accepted an evacuate request during a
+    previous attempt to recover the notification are not evacuated again
+    while nova is still evacuating them, they only have to be confirmed.
+    Instances already confirmed as evacuated are skipped.
+    """
+    failed_evacuation_instances = []
+
+    def _evacuate_instance(instance):
+        vm_state = getattr(instance, "OS-EXT-STS:vm_state")
+        if vm_state not in ['active', 'error', 'resized', 'stopped']:
+            return
+
+        status = progress.get_status(instance.id)
+        if status == fields.EvacuationStatus.EVACUATED:
+            return
+
+        if status == fields.EvacuationStatus.EVACUATING:
+            # The instances are fetched from the failed host, so an
+            # instance which nova isn't evacuating anymore was left on it
+            # by the previous attempt.
+            task_state = getattr(instance, "OS-EXT-STS:task_state", None)
+            if task_state in _EVACUATING_TASK_STATES:
+                return
+
+            LOG.info("Instance %s is still on the failed host and isn't "
+                     "being evacuated, evacuating it again.", instance.id)
+
+        try:
+            # Evacuate API only evacuates an instance in
+            # active, stop or error state. If an instance is in
+            # resized status, masakari resets the instance
+            # state to *error* to evacuate it.
+            if vm_state == 'resized':
+                novaclient.reset_instance_state(context, instance.id)
+
+            # evacuate the instance
+            novaclient.evacuate_instance(context, instance.id, target=target)
+        except Exception:
+            LOG.exception("Failed to evacuate instance %s.", instance.id)
+            failed_evacuation_instances.append(instance.id)
+            progress.set_status(instance.id, fields.EvacuationStatus.ERROR)
+        else:
+            progress.set_status(instance.id,
+                                fields.EvacuationStatus.EVACUATING)
+
+    # Evacuate requests are dispatched in the order of instance_list,
+    # so HA_Enabled instances are always dispatched first.
+    pool = eventlet.GreenPool(CONF.host_failure.evacuation_pool_size)
+    for instance in instance_list:
+        pool.spawn_n(_evacuate_instance, instance)
+    pool.waitall()
+
+    return failed_evacuation_instances
+
+
+def _get_evacuation_started_at(progress, instance_list):
+    """Time from which the evacuated instances have to be confirmed.
+
+    Instances whose evacuation was requested by a previous attempt to
+    recover the notification may have been moved before this attempt.
+    """
+    started_at = timeutils.utcnow()
+    for instance in instance_list:
+        requested_at = progress.get_requested_at(instance.id)
+        if requested_at is not None and requested_at < started_at:
+            started_at = requested_at
+    return utils.isotime(started_at)
+
+
+def _make_addons(recovery_method):
+    # Tasks are added once per recovery method to the flows falling back
+    # from one recovery method to the other, which need unique task names.
+    if recovery_method:
+        return [ACTION, recovery_method]
+    return [ACTION]
+
+
+def _raise_evacuation_failure(host_name, failed_evacuation_instances):
+    msg = _("Failed to evacuate instances %(instances)s from "
+            "host %(host_name)s.") % {
+        'instances': failed_evacuation_instances,
+        'host_name': host_name
+    }
+    raise exception.HostRecoveryFailureException(message=msg)
+
+
+class EvacuateInstancesTask(base.MasakariTask):
+    default_provides = set(["instance_list", "evacuation_started_at"])
+
+    def __init__(self, novaclient, recovery_method=None, inject=None):
         requires = ["host_name", "instance_list"]
-        super(EvacuateInstancesTask, self).__init__(addons=[ACTION],
-                                                    requires=requires)
+        super(EvacuateInstancesTask, self).__init__(
+            addons=_make_addons(recovery_method), requires=requires,
+            inject=inject)
         self.novaclient = novaclient
 
-    def execute(self, context, host_name, instance_list, reserved_host=None):
+    def execute(self, context, host_name, instance_list, reserved_host=None,
+                notification_uuid=None, evacuation_progress=None):
+        progress = _get_evacuation_progress(context, notification_uuid,
+                                            evacuation_progress)
+        evacuation_started_at = _get_evacuation_started_at(progress,
+                                                           instance_list)
+
         def _do_evacuate(context, host_name, instance_list,
                          reserved_host=None):
             if reserved_host:
-                if CONF.host_failure.add_reserved_host_to_aggregate:
-                    # Assign reserved_host to an aggregate to which the failed
-                    # compute host belongs to.
-                    aggregates = self.novaclient.get_aggregate_list(context)
-                    for aggregate in aggregates:
-                        if host_name in aggregate.hosts:
-                            self.novaclient.add_host_to_aggregate(
-                                context, reserved_host.name, aggregate)
-                            # A failed compute host can be associated with
-                            # multiple aggregates but operators will not
-                            # associate it with multiple aggregates in real
-                            # deployment so adding reserved_host to the very
-                            # first aggregate from the list.
-                            break
-
-                self.novaclient.enable_disable_service(
-                    context, reserved_host.name, enable=True)
-
-                # Sleep until nova-compute service is marked as enabled.
-                msg = ("Sleeping %(wait)s sec before starting recovery "
-                       "thread until nova recognizes the node up.")
-                LOG.info(msg, {
-                    'wait': CONF.wait_period_after_service_update})
-                eventlet.sleep(CONF.wait_period_after_service_update)
-
-                # Set reserved property of reserved_host to False
-                reserved_host.reserved = False
-                reserved_host.save()
-
-            for instance in instance_list:
-                vm_state = getattr(instance, "OS-EXT-STS:vm_state")
-                if vm_state in ['active', 'error', 'resized', 'stopped']:
-                    # Evacuate API only evacuates an instance in
-                    # active, stop or error state. If an instance is in
-                    # resized status, masakari resets the instance
-                    # state to *error* to evacuate it.
-                    if vm_state == 'resized':
-                        self.novaclient.reset_instance_state(
-                            context, instance.id)
-
-                    # evacuate the instance
-                    self.novaclient.evacuate_instance(
-                        context, instance.id,
-                        target=reserved_host.name if reserved_host else None)
+                _prepare_reserved_host(self.novaclient, context, host_name,
+                                       reserved_host)
+
+            failed_evacuation_instances = _evacuate_instances(
+                self.novaclient, context, instance_list, progress,
+                target=reserved_host.name if reserved_host else None)
+
+            if failed_evacuation_instances:
+                _raise_evacuation_failure(host_name,
+                                          failed_evacuation_instances)
 
         lock_name = reserved_host.name if reserved_host else None
 
@@ -162,54 +523,222 @@ class EvacuateInstancesTask(base.MasakariTask):
 
         return {
             "instance_list": instance_list,
+            "evacuation_started_at": evacuation_started_at,
         }
 
 
-class ConfirmEvacuationTask(base.MasakariTask):
+class GroupReservedHostsTask(base.MasakariTask):
+    """Split reserved hosts into groups of evacuation targets.
+
+    Each group holds up to 'reserved_host_max_targets' reserved hosts, which
+    share the instances of the failed host. The next group is used if the
+    evacuation to a group fails.
+    """
+    default_provides = set(["reserved_host_groups"])
+
+    def __init__(self, novaclient, rebind=None):
+        requires = ["reserved_host_list"]
+        super(GroupReservedHostsTask, self).__init__(addons=[ACTION],
+                                                     requires=requires,
+                                                     rebind=rebind)
+        self.novaclient = novaclient
+
+    def execute(self, context, reserved_host_list):
+        max_targets = CONF.host_failure.reserved_host_max_targets
+        return {
+            "reserved_host_groups": [
+                reserved_host_list[index:index + max_targets]
+                for index in range(0, len(reserved_host_list), max_targets)],
+        }
+
+
+class EvacuateInstancesToReservedHostsTask(base.MasakariTask):
+    """Evacuate instances to several reserved hosts in parallel."""
+    default_provides = set(["instance_list", "evacuation_started_at"])
+
     def __init__(self, novaclient):
-        requires = ["instance_list", "host_name"]
-        super(ConfirmEvacuationTask, self).__init__(addons=[ACTION],
-                                                    requires=requires)
+        requires = ["host_name", "instance_list", "reserved_hosts"]
+        super(EvacuateInstancesToReservedHostsTask, self).__init__(
+            addons=[ACTION], requires=requires)
         self.novaclient = novaclient
 
-    def execute(self, context, instance_list, host_name):
-        failed_evacuation_instances = []
+    def _lock_reserved_hosts(self, reserved_hosts, locked_hosts, func):
+        """Call func with the reserved hosts which could be locked.
+
+        Reserved hosts locked by another recovery are skipped. Locks are
+        held until func returns.
+        """
+        if not reserved_hosts:
+            if not locked_hosts:
+                raise exception.ReservedHostsUnavailable()
+            return func(locked_hosts)
+
+        reserved_host = reserved_hosts[0]
+
+        @utils.synchronized(reserved_host.name)
+        def _with_lock():
+            return self._lock_reserved_hosts(
+                reserved_hosts[1:], locked_hosts + [reserved_host], func)
+
+        try:
+            return _with_lock()
+        except exception.LockAlreadyAcquired:
+            # Locks of the following reserved hosts are handled by the
+            # nested calls, so only reserved_host can be locked here.
+            LOG.info("Reserved host %s is used by another recovery, "
+                     "skipping it.", reserved_host.name)
+            return self._lock_reserved_hosts(reserved_hosts[1:],
+                                             locked_hosts, func)
+
+    def _assign_instances(self, context, instance_list, reserved_hosts):
+        try:
+            demands = _get_instance_demands(self.novaclient, context,
+                                            instance_list)
+            capacities = _get_host_capacities(
+                self.novaclient, context,
+                set(reserved_host.name for reserved_host in reserved_hosts))
+        except exception.MasakariException as ex:
+            # Instances are still shared between the reserved hosts, just
+            # without taking their size into account.
+            LOG.warning("Failed to get the resources of the instances and "
+                        "reserved hosts, spreading instances round-robin: "
+                        "%(error)s", {'error': ex})
+            demands = [(instance.id, placement.Resources(0, 0, 0))
+                       for instance in instance_list]
+            capacities = {}
+
+        assignment = placement.spread(
+            demands, [(reserved_host.name, capacities.get(reserved_host.name))
+                      for reserved_host in reserved_hosts])
+
+        instances_by_host = collections.OrderedDict(
+            (reserved_host.name, []) for reserved_host in reserved_hosts)
+        # Instances keep the order of instance_list on every reserved host,
+        # so HA_Enabled instances are still dispatched first.
         for instance in instance_list:
-            def _wait_for_evacuation():
-                new_instance = self.novaclient.get_server(context, instance.id)
-                instance_host = getattr(new_instance,
-                                        "OS-EXT-SRV-ATTR:hypervisor_hostname")
-                old_vm_state = getattr(instance, "OS-EXT-STS:vm_state")
-                new_vm_state = getattr(new_instance,
-                                       "OS-EXT-STS:vm_state")
-
-                if instance_host != host_name:
-                    if ((old_vm_state == 'error' and
-                        new_vm_state == 'active') or
-                            old_vm_state == new_vm_state):
-                        raise loopingcall.LoopingCallDone()
-
-            periodic_call = loopingcall.FixedIntervalLoopingCall(
-                _wait_for_evacuation)
-            try:
-                # add a timeout to the periodic call.
-                periodic_call.start(interval=CONF.verify_interval)
-                etimeout.with_timeout(CONF.wait_period_after_evacuation,
-                                      periodic_call.wait)
-            except etimeout.Timeout:
-                # Instance is not evacuated in the expected time_limit.
-                failed_evacuation_instances.append(instance.id)
-            finally:
-                # stop the periodic call, in case of exceptions or Timeout.
-                periodic_call.stop()
+            instances_by_host[assignment[instance.id]].append(instance)
+        return instances_by_host
+
+    def execute(self, context, host_name, instance_list, reserved_hosts,
+                notification_uuid=None, evacuation_progress=None):
+        progress = _get_evacuation_progress(context, notification_uuid,
+                                            evacuation_progress)
+        evacuation_started_at = _get_evacuation_started_at(progress,
+                                                           instance_list)
+
+        def _do_evacuate(locked_hosts):
+            instances_by_host = self._assign_instances(context, instance_list,
+                                                       locked_hosts)
+            LOG.info("Evacuating instances from host %(host_name)s to "
+                     "reserved hosts %(assignment)s",
+                     {'host_name': host_name,
+                      'assignment': {
+                          name: [instance.id for instance in instances]
+                          for name, instances in instances_by_host.items()}})
+
+            failed_evacuation_instances = []
+
+            def _evacuate_to_reserved_host(reserved_host):
+                instances = instances_by_host[reserved_host.name]
+                if not instances:
+                    return
+                try:
+                    _prepare_reserved_host(self.novaclient, context,
+                                           host_name, reserved_host)
+                except Exception:
+                    LOG.exception("Failed to prepare reserved host %s.",
+                                  reserved_host.name)
+                    failed_evacuation_instances.extend(
+                        instance.id for instance in instances)
+                    return
+
+                failed_evacuation_instances.extend(_evacuate_instances(
+                    self.novaclient, context, instances, progress,
+                    target=reserved_host.name))
+
+            # Every reserved host is prepared and takes its instances in its
+            # own green thread.
+            pool = eventlet.GreenPool(len(locked_hosts))
+            for reserved_host in locked_hosts:
+                pool.spawn_n(_evacuate_to_reserved_host, reserved_host)
+            pool.waitall()
+
+            if failed_evacuation_instances:
+                _raise_evacuation_failure(host_name,
+                                          failed_evacuation_instances)
+
+        self._lock_reserved_hosts(list(reserved_hosts), [], _do_evacuate)
+
+        return {
+            "instance_list": instance_list,
+            "evacuation_started_at": evacuation_started_at,
+        }
+
+
+class ConfirmEvacuationTask(base.MasakariTask):
+    def __init__(self, novaclient, recovery_method=None):
+        requires = ["instance_list", "host_name"]
+        super(ConfirmEvacuationTask, self).__init__(
+            addons=_make_addons(recovery_method), requires=requires)
+        self.novaclient = novaclient
+
+    def execute(self, context, instance_list, host_name,
+                notification_uuid=None, evacuation_started_at=None,
+                evacuation_progress=None):
+        progress = _get_evacuation_progress(context, notification_uuid,
+                                            evacuation_progress)
+
+        # All the evacuated instances are tracked together. The instances
+        # still on the failed host are fetched by a single server list call
+        # per interval, only the instances which left it are fetched one by
+        # one. Instances which didn't change since their evacuation was
+        # requested are not moved yet and aren't returned by nova.
+        pending_instances = {instance.id: instance
+                             for instance in instance_list}
+
+        def _is_evacuated(instance, new_instance):
+            instance_host = getattr(new_instance,
+                                    "OS-EXT-SRV-ATTR:hypervisor_hostname")
+            old_vm_state = getattr(instance, "OS-EXT-STS:vm_state")
+            new_vm_state = getattr(new_instance, "OS-EXT-STS:vm_state")
+
+            if instance_host == host_name:
+                return False
+
+            return ((old_vm_state == 'error' and new_vm_state == 'active') or
+                    old_vm_state == new_vm_state)
+
+        def _is_evacuated_all():
+            instances_on_host = set(
+                server.id for server in self.novaclient.get_servers(
+                    context, host_name))
+            moved_instances = [instance_id for instance_id in pending_instances
+                               if instance_id not in instances_on_host]
+            if not moved_instances:
+                return False
+
+            for new_instance in self.novaclient.get_servers_by_uuids(
+                    context, moved_instances,
+                    changes_since=evacuation_started_at):
+                instance = pending_instances[new_instance.id]
+                if _is_evacuated(instance, new_instance):
+                    del pending_instances[new_instance.id]
+                    progress.set_status(new_instance.id,
+                                        fields.EvacuationStatus.EVACUATED)
+
+            return not pending_instances
+
+        # Instances which are not evacuated in the expected time_limit are
+        # left in pending_instances.
+        polling.wait_until('evacuation', _is_evacuated_all,
+                           CONF.wait_period_after_evacuation)
+
+        failed_evacuation_instances = list(pending_instances)
+        for instance_id in failed_evacuation_instances:
+            progress.set_status(instance_id, fields.EvacuationStatus.ERROR)
 
         if failed_evacuation_instances:
-            msg = _("Failed to evacuate instances %(instances)s from "
-                    "host %(host_name)s.") % {
-                'instances': failed_evacuation_instances,
-                'host_name': host_name
-            }
-            raise exception.HostRecoveryFailureException(message=msg)
+            _raise_evacuation_failure(host_name, failed_evacuation_instances)
 
 
 def get_auto_flow(novaclient, process_what):
@@ -231,7 +760,47 @@ def get_auto_flow(novaclient, process_what):
                            EvacuateInstancesTask(novaclient),
                            ConfirmEvacuationTask(novaclient))
 
-    return taskflow.engines.load(auto_evacuate_flow, store=process_what)
+    return _load_into_engine(
+        fields.FailoverSegmentRecoveryMethod.AUTO, auto_evacuate_flow,
+        process_what)
+
+
+def _get_rh_evacuation_flow(novaclient, flow_name, recovery_method=None):
+    """Constructs the flow evacuating instances to reserved hosts.
+
+    The evacuation is retried with the next reserved host, or group of
+    reserved hosts, if it fails. The HA_Enabled instances are fetched again
+    before every try.
+    """
+    rh_flow = linear_flow.Flow("%s_reserved_host" % flow_name)
+
+    reserved_host_list = 'reserved_host_list'
+    if CONF.host_failure.reserved_host_placement:
+        rh_flow.add(OrderReservedHostsTask(novaclient))
+        reserved_host_list = 'ordered_reserved_host_list'
+
+    if CONF.host_failure.reserved_host_max_targets > 1:
+        rh_flow.add(GroupReservedHostsTask(
+            novaclient, rebind={'reserved_host_list': reserved_host_list}))
+        retry_flow = linear_flow.Flow(
+            "retry_%s" % flow_name, retry=retry.ParameterizedForEach(
+                rebind=['reserved_host_groups'], provides='reserved_hosts'))
+        evacuate_task = EvacuateInstancesToReservedHostsTask(novaclient)
+    else:
+        retry_flow = linear_flow.Flow(
+            "retry_%s" % flow_name, retry=retry.ParameterizedForEach(
+                rebind=[reserved_host_list], provides='reserved_host'))
+        evacuate_task = EvacuateInstancesTask(
+            novaclient, recovery_method=recovery_method)
+
+    prepare_task = PrepareHAEnabledInstancesTask(
+        novaclient, recovery_method=recovery_method)
+    retry_flow.add(prepare_task, evacuate_task,
+                   ConfirmEvacuationTask(novaclient,
+                                         recovery_method=recovery_method))
+
+    rh_flow.add(retry_flow)
+    return rh_flow
 
 
 def get_rh_flow(novaclient, process_what):
@@ -240,21 +809,130 @@ def get_rh_flow(novaclient, process_what):
     This flow will do the following:
 
     1. Disable compute service on source host
-    2. Get all HA_Enabled instances.
-    3. Evacuate all the HA_Enabled instances using reserved_host.
-    4. Confirm evacuation of instances.
+    2. Order reserved hosts by their free capacity, if
+       'reserved_host_placement' is enabled.
+    3. Split reserved hosts into groups of 'reserved_host_max_targets'
+       hosts, if it is greater than 1.
+    4. Get all HA_Enabled instances.
+    5. Evacuate all the HA_Enabled instances using reserved_host, or spread
+       them over a group of reserved hosts.
+    6. Confirm evacuation of instances.
     """
     flow_name = ACTION.replace(":", "_") + "_engine"
     nested_flow = linear_flow.Flow(flow_name)
+    nested_flow.add(DisableComputeServiceTask(novaclient),
+                    _get_rh_evacuation_flow(novaclient, flow_name))
+
+    return _load_into_engine(
+        fields.FailoverSegmentRecoveryMethod.RESERVED_HOST, nested_flow,
+        process_what)
+
+
+class _SelectRecoveryMethodTask(base.MasakariTask):
+    """Provides the recovery method of the current try to the deciders."""
+
+    def __init__(self):
+        super(_SelectRecoveryMethodTask, self).__init__(
+            addons=[ACTION], requires=["recovery_method"])
+
+    def execute(self, recovery_method):
+        return recovery_method
+
+
+class _RecoveryMethodRetry(retry.ForEach):
+    """Tries the recovery methods one after the other until one succeeds."""
 
-    rh_flow = linear_flow.Flow(
-        "retry_%s" % flow_name, retry=retry.ParameterizedForEach(
-            rebind=['reserved_host_list'], provides='reserved_host'))
+    def __init__(self, recovery_methods, name=None):
+        super(_RecoveryMethodRetry, self).__init__(
+            recovery_methods, name=name, provides='recovery_method',
+            requires=['host_name'])
 
-    rh_flow.add(PrepareHAEnabledInstancesTask(novaclient),
-                EvacuateInstancesTask(novaclient),
-                ConfirmEvacuationTask(novaclient))
+    def on_failure(self, history, *args, **kwargs):
+        # There are no instances to evacuate, the other workflow would
+        # skip the recovery all the same.
+        if history.caused_by(exception.SkipHostRecoveryException, index=-1):
+            return retry.REVERT
 
-    nested_flow.add(DisableComputeServiceTask(novaclient), rh_flow)
+        decision = super(_RecoveryMethodRetry, self).on_failure(
+            history, *args, **kwargs)
+        if decision == retry.RETRY:
+            failed_method = list(history.provided_iter())[-1]
+            msg = ("Failed to evacuate all instances from "
+                   "failed_host '%(failed_host)s' using "
+                   "'%(failed_method)s' workflow, retrying using "
+                   "'%(next_method)s' workflow.")
+            LOG.warning(msg, {
+                'failed_host': kwargs.get('host_name'),
+                'failed_method': failed_method,
+                'next_method': self._get_next_value(self._values, history)
+            })
+        return decision
 
-    return taskflow.engines.load(nested_flow, store=process_what)
+
+def _is_recovery_method(select_task_name, recovery_method, history):
+    return history[select_task_name] == recovery_method
+
+
+def get_priority_flow(novaclient, process_what, recovery_method):
+    """Constructs and returns the engine entrypoint flow.
+
+    This flow will do the following:
+
+    1. Disable compute service on source host
+    2. Get all HA_Enabled instances, evacuate and confirm them using 'auto'
+       workflow for 'auto_priority' recovery_method and 'reserved_host'
+       workflow for 'rh_priority' recovery_method.
+    3. If it fails, get the HA_Enabled instances which are still on the
+       source host, evacuate and confirm them using the other workflow.
+
+    The compute service is disabled only once.
+    """
+    if recovery_method == fields.FailoverSegmentRecoveryMethod.AUTO_PRIORITY:
+        recovery_methods = [fields.FailoverSegmentRecoveryMethod.AUTO,
+                            fields.FailoverSegmentRecoveryMethod.RESERVED_HOST]
+    else:
+        recovery_methods = [fields.FailoverSegmentRecoveryMethod.RESERVED_HOST,
+                            fields.FailoverSegmentRecoveryMethod.AUTO]
+
+    flow_name = ACTION.replace(":", "_") + "_engine"
+    priority_flow = linear_flow.Flow(flow_name)
+    priority_flow.add(DisableComputeServiceTask(novaclient))
+
+    auto_flow = linear_flow.Flow("%s_auto" % flow_name)
+    auto_flow.add(
+        PrepareHAEnabledInstancesTask(
+            novaclient,
+            recovery_method=fields.FailoverSegmentRecoveryMethod.AUTO),
+        # 'reserved_host' is provided by the retry of the 'reserved_host'
+        # workflow, it must not be used by the 'auto' workflow.
+        EvacuateInstancesTask(
+            novaclient,
+            recovery_method=fields.FailoverSegmentRecoveryMethod.AUTO,
+            inject={'reserved_host': None}),
+        ConfirmEvacuationTask(
+            novaclient,
+            recovery_method=fields.FailoverSegmentRecoveryMethod.AUTO))
+    rh_flow = _get_rh_evacuation_flow(
+        novaclient, flow_name,
+        recovery_method=fields.FailoverSegmentRecoveryMethod.RESERVED_HOST)
+
+    # Only the workflow of the recovery method selected by the retry is
+    # executed on each try, the other one is ignored.
+    select_task = _SelectRecoveryMethodTask()
+    recovery_flow = graph_flow.Flow(
+        "recovery_%s" % flow_name,
+        retry=_RecoveryMethodRetry(recovery_methods))
+    recovery_flow.add(select_task)
+    for method, method_flow in (
+            (fields.FailoverSegmentRecoveryMethod.AUTO, auto_flow),
+            (fields.FailoverSegmentRecoveryMethod.RESERVED_HOST, rh_flow)):
+        # Both workflows provide and require 'instance_list', they must not
+        # be linked to each other.
+        recovery_flow.add(method_flow, resolve_requires=False,
+                          resolve_existing=False)
+        recovery_flow.link(select_task, method_flow, decider=functools.partial(
+            _is_recovery_method, select_task.name, method))
+
+    priority_flow.add(recovery_flow)
+
+    return _load_into_engine(recovery_method, priority_flow, process_what)
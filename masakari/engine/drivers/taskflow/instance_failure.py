@@ -13,16 +13,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from eventlet import timeout as etimeout
-
 from oslo_log import log as logging
-from oslo_service import loopingcall
 from oslo_utils import strutils
-import taskflow.engines
 from taskflow.patterns import linear_flow
 
 import masakari.conf
 from masakari.engine.drivers.taskflow import base
+from masakari.engine.drivers.taskflow import persistence
+from masakari.engine.drivers.taskflow import polling
 from masakari import exception
 from masakari.i18n import _
 
@@ -70,28 +68,17 @@ class StopInstanceTask(base.MasakariTask):
 
             self.novaclient.stop_server(context, instance.id)
 
-        def _wait_for_power_off():
+        def _is_powered_off():
             new_instance = self.novaclient.get_server(context, instance_uuid)
             vm_state = getattr(new_instance, 'OS-EXT-STS:vm_state')
-            if vm_state == 'stopped':
-                raise loopingcall.LoopingCallDone()
-
-        periodic_call = loopingcall.FixedIntervalLoopingCall(
-            _wait_for_power_off)
-
-        try:
-            # add a timeout to the periodic call.
-            periodic_call.start(interval=CONF.verify_interval)
-            etimeout.with_timeout(CONF.wait_period_after_power_off,
-                                  periodic_call.wait)
-        except etimeout.Timeout:
+            return vm_state == 'stopped'
+
+        if not polling.wait_until('power_off', _is_powered_off,
+                                  CONF.wait_period_after_power_off):
             msg = _("Failed to stop instance %(instance)s") % {
                 'instance': instance.id
             }
             raise exception.InstanceRecoveryFailureException(message=msg)
-        finally:
-            # stop the periodic call, in case of exceptions or Timeout.
-            periodic_call.stop()
 
 
 class StartInstanceTask(base.MasakariTask):
@@ -124,27 +111,17 @@ class ConfirmInstanceActiveTask(base.MasakariTask):
         self.novaclient = novaclient
 
     def execute(self, context, instance_uuid):
-        def _wait_for_active():
+        def _is_active():
             new_instance = self.novaclient.get_server(context, instance_uuid)
             vm_state = getattr(new_instance, 'OS-EXT-STS:vm_state')
-            if vm_state == 'active':
-                raise loopingcall.LoopingCallDone()
-
-        periodic_call = loopingcall.FixedIntervalLoopingCall(
-            _wait_for_active)
-        try:
-            # add a timeout to the periodic call.
-            periodic_call.start(interval=CONF.verify_interval)
-            etimeout.with_timeout(CONF.wait_period_after_power_on,
-                                  periodic_call.wait)
-        except etimeout.Timeout:
+            return vm_state == 'active'
+
+        if not polling.wait_until('power_on', _is_active,
+                                  CONF.wait_period_after_power_on):
             msg = _("Failed to start instance %(instance)s") % {
                 'instance': instance_uuid
             }
             raise exception.InstanceRecoveryFailureException(message=msg)
-        finally:
-            # stop the periodic call, in case of exceptions or Timeout.
-            periodic_call.stop()
 
 
 def get_instance_recovery_flow(novaclient, process_what):
@@ -164,5 +141,5 @@ def get_instance_recovery_flow(novaclient, process_what):
                                    StartInstanceTask(novaclient),
                                    ConfirmInstanceActiveTask(novaclient))
 
-    return taskflow.engines.load(instance_recovery_workflow,
-                                 store=process_what)
+    return persistence.load_taskflow_into_engine(
+        flow_name, instance_recovery_workflow, process_what)
@@ -0,0 +1,323 @@
+# Copyright 2016 NTT DATA
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Persistence of the recovery workflows.
+
+When '[taskflow]/connection' is set, the atoms of every recovery workflow
+are saved in a taskflow logbook named after the notification uuid. A
+workflow which didn't finish, because masakari-engine was restarted, is
+loaded from its saved flow detail the next time the notification is
+processed, so that the engine skips the tasks which already succeeded.
+
+Task results and retry values hold nova servers and masakari objects, which
+are not JSON serializable, so they are converted to primitives before they
+are saved and back when they are loaded.
+"""
+
+import contextlib
+import threading
+
+from novaclient.v2 import servers
+from oslo_log import log as logging
+from oslo_utils import uuidutils
+import taskflow.engines
+from taskflow import exceptions as taskflow_exception
+from taskflow.persistence import backends
+from taskflow.persistence import base as persistence_base
+from taskflow.persistence import models
+from taskflow import states
+
+import masakari.conf
+from masakari.objects import base as objects_base
+
+
+CONF = masakari.conf.CONF
+
+LOG = logging.getLogger(__name__)
+
+_OBJECT_KEY = 'masakari_object'
+_SERVER_KEY = 'nova_server'
+
+# Flows in these states are not resumed but executed again.
+_FINISHED_STATES = (states.SUCCESS, states.FAILURE, states.REVERTED,
+                    states.REVERT_FAILURE)
+
+_BACKEND = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def _to_primitive(value):
+    if isinstance(value, objects_base.MasakariObject):
+        return {_OBJECT_KEY: value.obj_to_primitive()}
+    if isinstance(value, dict):
+        return {key: _to_primitive(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_primitive(item) for item in value]
+    if hasattr(value, 'to_dict') and hasattr(value, 'id'):
+        # nova server
+        return {_SERVER_KEY: value.to_dict()}
+    return value
+
+
+def _from_primitive(value, context):
+    if isinstance(value, dict):
+        if list(value) == [_OBJECT_KEY]:
+            return objects_base.MasakariObject.obj_from_primitive(
+                value[_OBJECT_KEY], context=context)
+        if list(value) == [_SERVER_KEY]:
+            return servers.Server(None, value[_SERVER_KEY], loaded=True)
+        return {key: _from_primitive(item, context)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [_from_primitive(item, context) for item in value]
+    return value
+
+
+def _convert_atom_detail(atom_detail, convert):
+    atom_detail = atom_detail.copy()
+    if isinstance(atom_detail, models.RetryDetail):
+        # Retry results are the history of (value, failures) tuples.
+        atom_detail.results = [(convert(value), failures)
+                               for value, failures in atom_detail.results]
+    else:
+        atom_detail.results = convert(atom_detail.results)
+        atom_detail.revert_results = convert(atom_detail.revert_results)
+    return atom_detail
+
+
+def _restore_atom_detail(atom_detail, source):
+    # Saved atom details are handed back with the results taskflow gave us
+    # rather than copies rebuilt from their primitives, as retries compare
+    # the values they already provided with the ones they are given.
+    atom_detail = atom_detail.copy()
+    atom_detail.results = source.results
+    if not isinstance(atom_detail, models.RetryDetail):
+        atom_detail.revert_results = source.revert_results
+    return atom_detail
+
+
+def _restore_flow_detail(flow_detail, source, convert):
+    flow_detail = flow_detail.copy()
+    for atom_detail in list(flow_detail):
+        source_atom_detail = source.find(atom_detail.uuid)
+        if source_atom_detail is not None:
+            flow_detail.add(_restore_atom_detail(atom_detail,
+                                                 source_atom_detail))
+        else:
+            flow_detail.add(_convert_atom_detail(atom_detail, convert))
+    return flow_detail
+
+
+def _convert_flow_detail(flow_detail, convert):
+    flow_detail = flow_detail.copy()
+    for atom_detail in list(flow_detail):
+        flow_detail.add(_convert_atom_detail(atom_detail, convert))
+    return flow_detail
+
+
+def _convert_logbook(book, convert):
+    book = book.copy()
+    for flow_detail in list(book):
+        book.add(_convert_flow_detail(flow_detail, convert))
+    return book
+
+
+class _Connection(persistence_base.Connection):
+    """Connection converting atom results to and from primitives."""
+
+    def __init__(self, backend, connection, context):
+        self._backend = backend
+        self._connection = connection
+        self._context = context
+
+    def _to_primitive(self, value):
+        return _to_primitive(value)
+
+    def _from_primitive(self, value):
+        return _from_primitive(value, self._context)
+
+    @property
+    def backend(self):
+        return self._backend
+
+    def close(self):
+        self._connection.close()
+
+    def upgrade(self):
+        self._connection.upgrade()
+
+    def clear_all(self):
+        self._connection.clear_all()
+
+    def validate(self):
+        self._connection.validate()
+
+    def update_atom_details(self, atom_detail):
+        saved_atom_detail = self._connection.update_atom_details(
+            _convert_atom_detail(atom_detail, self._to_primitive))
+        return _restore_atom_detail(saved_atom_detail, atom_detail)
+
+    def update_flow_details(self, flow_detail):
+        saved_flow_detail = self._connection.update_flow_details(
+            _convert_flow_detail(flow_detail, self._to_primitive))
+        return _restore_flow_detail(saved_flow_detail, flow_detail,
+                                    self._from_primitive)
+
+    def save_logbook(self, book):
+        book = self._connection.save_logbook(
+            _convert_logbook(book, self._to_primitive))
+        return _convert_logbook(book, self._from_primitive)
+
+    def destroy_logbook(self, book_uuid):
+        self._connection.destroy_logbook(book_uuid)
+
+    def get_logbook(self, book_uuid, lazy=False):
+        book = self._connection.get_logbook(book_uuid, lazy=lazy)
+        return _convert_logbook(book, self._from_primitive)
+
+    def get_logbooks(self, lazy=False):
+        for book in self._connection.get_logbooks(lazy=lazy):
+            yield _convert_logbook(book, self._from_primitive)
+
+    def get_flows_for_book(self, book_uuid):
+        for flow_detail in self._connection.get_flows_for_book(book_uuid):
+            yield _convert_flow_detail(flow_detail, self._from_primitive)
+
+    def get_flow_details(self, fd_uuid, lazy=False):
+        flow_detail = self._connection.get_flow_details(fd_uuid, lazy=lazy)
+        return _convert_flow_detail(flow_detail, self._from_primitive)
+
+    def get_atom_details(self, ad_uuid):
+        atom_detail = self._connection.get_atom_details(ad_uuid)
+        return _convert_atom_detail(atom_detail, self._from_primitive)
+
+    def get_atoms_for_flow(self, fd_uuid):
+        for atom_detail in self._connection.get_atoms_for_flow(fd_uuid):
+            yield _convert_atom_detail(atom_detail, self._from_primitive)
+
+
+class _Backend(persistence_base.Backend):
+    """Backend handing out converting connections for a request context.
+
+    The objects loaded from the backend are bound to the request context of
+    the notification being processed.
+    """
+
+    def __init__(self, backend, context):
+        super(_Backend, self).__init__({})
+        self._backend = backend
+        self._context = context
+
+    def get_connection(self):
+        return _Connection(self, self._backend.get_connection(),
+                           self._context)
+
+    def close(self):
+        # The underlying backend is shared by all the workflows.
+        pass
+
+
+def _get_backend():
+    global _BACKEND
+
+    with _BACKEND_LOCK:
+        if _BACKEND is None:
+            backend = backends.fetch({'connection': CONF.taskflow.connection})
+            with contextlib.closing(backend.get_connection()) as conn:
+                conn.upgrade()
+            _BACKEND = backend
+        return _BACKEND
+
+
+def _reset_backend():
+    global _BACKEND
+
+    with _BACKEND_LOCK:
+        if _BACKEND is not None:
+            _BACKEND.close()
+        _BACKEND = None
+
+
+def load_taskflow_into_engine(flow_detail_name, flow, process_what):
+    """Loads flow into an engine, resuming its saved state if any.
+
+    :param flow_detail_name: Name of the saved flow detail, unique among the
+        workflows executed for a notification.
+    :param flow: Flow to load.
+    :param process_what: Values the flow requires. Its 'notification_uuid'
+        names the logbook in which the flow is saved.
+    """
+    notification_uuid = process_what.get('notification_uuid')
+    if not CONF.taskflow.connection or not notification_uuid:
+        return taskflow.engines.load(flow, store=process_what)
+
+    backend = _Backend(_get_backend(), process_what.get('context'))
+    with contextlib.closing(backend.get_connection()) as conn:
+        try:
+            book = conn.get_logbook(notification_uuid)
+        except taskflow_exception.NotFound:
+            book = models.LogBook(notification_uuid, uuid=notification_uuid)
+
+        flow_detail = None
+        for saved_flow_detail in book:
+            if (saved_flow_detail.name == flow_detail_name and
+                    saved_flow_detail.state not in _FINISHED_STATES):
+                flow_detail = saved_flow_detail
+                LOG.info("Resuming workflow '%(name)s' of notification "
+                         "%(notification_uuid)s from state %(state)s.",
+                         {'name': flow_detail_name,
+                          'notification_uuid': notification_uuid,
+                          'state': flow_detail.state})
+                break
+        else:
+            flow_detail = models.FlowDetail(flow_detail_name,
+                                            uuidutils.generate_uuid())
+            book.add(flow_detail)
+            conn.save_logbook(book)
+
+    flow_engine = taskflow.engines.load(flow, flow_detail=flow_detail,
+                                        book=book, backend=backend)
+    # The values of process_what are provided again every time the flow is
+    # loaded, so they don't need to be saved.
+    flow_engine.storage.inject(process_what, transient=True)
+    return flow_engine
+
+
+def discard_saved_flows(notification_uuid):
+    """Deletes the workflows saved for a processed notification."""
+    if not CONF.taskflow.connection:
+        return
+
+    with contextlib.closing(_get_backend().get_connection()) as conn:
+        try:
+            conn.destroy_logbook(notification_uuid)
+        except taskflow_exception.NotFound:
+            pass
+
+
+@contextlib.contextmanager
+def discard_flows_when_done(notification_uuid):
+    """Deletes the saved workflows once the notification is processed.
+
+    The saved workflows are kept if processing is interrupted, for example
+    by masakari-engine being stopped, so that they can be resumed.
+    """
+    try:
+        yield
+    except Exception:
+        discard_saved_flows(notification_uuid)
+        raise
+    discard_saved_flows(notification_uuid)
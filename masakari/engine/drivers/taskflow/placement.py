@@ -0,0 +1,135 @@
+# Copyright 2016 NTT DATA
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Capacity based placement of evacuated instances on reserved hosts.
+"""
+
+import collections
+
+
+Resources = collections.namedtuple('Resources',
+                                   ['vcpus', 'memory_mb', 'disk_gb'])
+
+
+def _fits(demand, free):
+    return all(d <= f for d, f in zip(demand, free))
+
+
+def _subtract(free, demand):
+    return Resources(*[f - d for f, d in zip(free, demand)])
+
+
+def _size(demand, total):
+    # Size of an instance relative to the overall capacity of the hosts, so
+    # that vcpus, memory and disk have the same weight.
+    return sum(float(d) / t for d, t in zip(demand, total) if t > 0)
+
+
+def first_fit_decreasing(demands, capacities):
+    """Packs instances on hosts using first-fit-decreasing.
+
+    :param demands: List of (instance_id, Resources) tuples.
+    :param capacities: List of (host_name, Resources) tuples of free
+        resources, in the order hosts should be filled.
+    :returns: Tuple of a dict mapping instance_id to host_name and the list
+        of instance_ids which don't fit on any host.
+    """
+    free = collections.OrderedDict(capacities)
+    total = Resources(*[sum(values) for values in zip(*free.values())]
+                      or (0, 0, 0))
+
+    assignment = {}
+    unplaced = []
+    for instance_id, demand in sorted(
+            demands, key=lambda item: _size(item[1], total), reverse=True):
+        for host_name, host_free in free.items():
+            if _fits(demand, host_free):
+                assignment[instance_id] = host_name
+                free[host_name] = _subtract(host_free, demand)
+                break
+        else:
+            unplaced.append(instance_id)
+
+    return assignment, unplaced
+
+
+def order_hosts(demands, capacities):
+    """Orders hosts by how well they can take all the instances.
+
+    Hosts on which all the instances fit come first, the one with least
+    capacity left after placing them first. They are followed by the hosts
+    on which only some of the instances fit, most placed instances first.
+
+    :param demands: List of (instance_id, Resources) tuples.
+    :param capacities: List of (host_name, Resources) tuples of free
+        resources.
+    :returns: List of host names.
+    """
+    total_demand = Resources(*[sum(values) for values in
+                               zip(*[demand for _, demand in demands])]
+                             or (0, 0, 0))
+
+    def _rank(capacity):
+        host_free = capacity[1]
+        _, unplaced = first_fit_decreasing(demands, [capacity])
+        leftover = _subtract(host_free, total_demand)
+        return (len(unplaced), _size(leftover, host_free))
+
+    return [host_name for host_name, _ in sorted(capacities, key=_rank)]
+
+
+def spread(demands, capacities):
+    """Spreads instances over hosts using worst-fit-decreasing.
+
+    Every instance, largest first, goes to the host which has the most free
+    resources left, so the instances are shared evenly between the hosts.
+    Instances which don't fit on any host, or all of them if the capacity of
+    some host is unknown, are spread round-robin.
+
+    :param demands: List of (instance_id, Resources) tuples.
+    :param capacities: List of (host_name, Resources or None) tuples of free
+        resources.
+    :returns: Dict mapping instance_id to host_name.
+    """
+    if not capacities:
+        return {}
+
+    host_names = [host_name for host_name, _ in capacities]
+    free = collections.OrderedDict(capacities)
+    if any(host_free is None for host_free in free.values()):
+        free = {}
+    total = Resources(*[sum(values) for values in zip(*free.values())]
+                      or (0, 0, 0))
+
+    assignment = {}
+    unplaced = []
+    for instance_id, demand in sorted(
+            demands, key=lambda item: _size(item[1], total), reverse=True):
+        fitting_hosts = [host_name for host_name, host_free in free.items()
+                         if _fits(demand, host_free)]
+        if not fitting_hosts:
+            unplaced.append(instance_id)
+            continue
+
+        host_name = max(fitting_hosts,
+                        key=lambda name: _size(free[name], total))
+        assignment[instance_id] = host_name
+        free[host_name] = _subtract(free[host_name], demand)
+
+    for index, instance_id in enumerate(unplaced):
+        assignment[instance_id] = host_names[index % len(host_names)]
+
+    return assignment
@@ -0,0 +1,98 @@
+# Copyright 2016 NTT DATA
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Polling helper used by the recovery tasks to wait for nova.
+"""
+
+import collections
+import random
+
+import eventlet
+from eventlet import timeout as etimeout
+from oslo_log import log as logging
+from oslo_utils import timeutils
+
+import masakari.conf
+
+
+CONF = masakari.conf.CONF
+
+LOG = logging.getLogger(__name__)
+
+_POLL_STATS = collections.defaultdict(
+    lambda: {'waits': 0, 'polls': 0, 'timeouts': 0})
+
+
+def get_poll_stats():
+    """Returns the number of waits, polls and timeouts per wait name."""
+    return {name: dict(stats) for name, stats in _POLL_STATS.items()}
+
+
+def reset_poll_stats():
+    _POLL_STATS.clear()
+
+
+def _intervals():
+    """Yields the intervals to sleep between two polls.
+
+    The interval starts at 'verify_interval' and is multiplied by
+    'verify_backoff_factor' after every poll, up to 'verify_max_interval'.
+    Each interval is randomized by +/- 'verify_jitter' of its value.
+    """
+    min_interval = CONF.verify_interval
+    max_interval = max(CONF.verify_max_interval, min_interval)
+    interval = min_interval
+    while True:
+        jitter = interval * CONF.verify_jitter
+        yield min(max(interval + random.uniform(-jitter, jitter),
+                      min_interval), max_interval)
+        interval = min(interval * CONF.verify_backoff_factor, max_interval)
+
+
+def wait_until(name, condition, timeout):
+    """Polls condition until it returns True or timeout expires.
+
+    :param name: Name of the wait, used for logging and poll statistics.
+    :param condition: Callable without arguments returning True once the
+        awaited state is reached.
+    :param timeout: Overall deadline of the wait in seconds.
+    :returns: True if the condition is met, False if timeout expired.
+    """
+    stats = _POLL_STATS[name]
+    stats['waits'] += 1
+    polls = 0
+    done = False
+    watch = timeutils.StopWatch()
+    watch.start()
+
+    # add a timeout to the polling, in case nova doesn't answer in time.
+    with etimeout.Timeout(timeout, False):
+        for interval in _intervals():
+            polls += 1
+            if condition():
+                done = True
+                break
+            eventlet.sleep(interval)
+
+    stats['polls'] += polls
+    if not done:
+        stats['timeouts'] += 1
+
+    LOG.debug("Wait '%(name)s' finished after %(polls)d polls in "
+              "%(elapsed).2f sec, condition met: %(done)s.",
+              {'name': name, 'polls': polls, 'elapsed': watch.elapsed(),
+               'done': done})
+    return done
@@ -13,15 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from eventlet import timeout as etimeout
-
 from oslo_log import log as logging
-from oslo_service import loopingcall
-import taskflow.engines
 from taskflow.patterns import linear_flow
 
 import masakari.conf
 from masakari.engine.drivers.taskflow import base
+from masakari.engine.drivers.taskflow import persistence
+from masakari.engine.drivers.taskflow import polling
 from masakari import exception
 from masakari.i18n import _
 
@@ -59,28 +57,16 @@ class ConfirmComputeNodeDisabledTask(base.MasakariTask):
         self.novaclient = novaclient
 
     def execute(self, context, process_name, host_name):
-        def _wait_for_disable():
-            service_disabled = self.novaclient.is_service_down(
-                context, host_name, process_name)
-            if service_disabled:
-                raise loopingcall.LoopingCallDone()
-
-        periodic_call = loopingcall.FixedIntervalLoopingCall(
-            _wait_for_disable)
-        try:
-            # add a timeout to the periodic call.
-            periodic_call.start(interval=CONF.verify_interval)
-            etimeout.with_timeout(
-                CONF.wait_period_after_service_update,
-                periodic_call.wait)
-        except etimeout.Timeout:
+        def _is_disabled():
+            return self.novaclient.is_service_down(context, host_name,
+                                                   process_name)
+
+        if not polling.wait_until('service_disable', _is_disabled,
+                                  CONF.wait_period_after_service_update):
             msg = _("Failed to disable service %(process_name)s") % {
                 'process_name': process_name
             }
             raise exception.ProcessRecoveryFailureException(message=msg)
-        finally:
-            # stop the periodic call, in case of exceptions or Timeout.
-            periodic_call.stop()
 
 
 def get_compute_process_recovery_flow(novaclient, process_what):
@@ -99,5 +85,5 @@ def get_compute_process_recovery_flow(novaclient, process_what):
         DisableComputeNodeTask(novaclient),
         ConfirmComputeNodeDisabledTask(novaclient))
 
-    return taskflow.engines.load(compute_process_recovery_workflow,
-                                 store=process_what)
+    return persistence.load_taskflow_into_engine(
+        flow_name, compute_process_recovery_workflow, process_what)
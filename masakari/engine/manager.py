@@ -22,15 +22,22 @@ workflows.
 
 """
 
+import threading
+
+import eventlet
 from oslo_log import log as logging
 import oslo_messaging as messaging
+from oslo_service import loopingcall
 from oslo_service import periodic_task
 from oslo_utils import timeutils
 
 import masakari.conf
+from masakari import context as masakari_context
 from masakari.engine import driver
 from masakari.engine import instance_events as virt_events
+from masakari.engine import scheduler
 from masakari import exception
+from masakari import locks
 from masakari import manager
 from masakari import objects
 from masakari.objects import fields
@@ -53,6 +60,8 @@ class MasakariManager(manager.Manager):
                                              *args, **kwargs)
 
         self.driver = driver.load_masakari_driver(masakari_driver)
+        self.scheduler = scheduler.NotificationScheduler()
+        self._unfinished_notification_stats = {}
 
     def _handle_notification_type_process(self, context, notification):
         notification_status = fields.NotificationStatus.FINISHED
@@ -176,29 +185,134 @@ class MasakariManager(manager.Manager):
 
         return notification_status
 
-    def _process_notification(self, context, notification):
-        @utils.synchronized(notification.source_host_uuid, blocking=True)
+    def _get_lock_name(self, notification):
+        """Returns the name of the lock serializing a notification.
+
+        Instance failures don't depend on each other, so they are serialized
+        per instance. Host and process failures are serialized per host.
+        """
+        if notification.type == fields.NotificationType.VM:
+            instance_uuid = notification.payload.get('instance_uuid')
+            if instance_uuid:
+                return 'instance-%s' % instance_uuid
+
+        return notification.source_host_uuid
+
+    def _renew_notification_lease(self, notification, lease_lost):
+        try:
+            notification.renew_lease(CONF.host,
+                                     CONF.notification_lease_duration)
+        except exception.NotificationAlreadyClaimed:
+            LOG.warning("Lost the lease of notification "
+                        "%(notification_uuid)s, it is processed by another "
+                        "engine.",
+                        {'notification_uuid': notification.notification_uuid})
+            lease_lost.set()
+            raise loopingcall.LoopingCallDone()
+        except Exception:
+            LOG.exception("Failed to renew the lease of notification "
+                          "%(notification_uuid)s.",
+                          {'notification_uuid':
+                              notification.notification_uuid})
+
+    @staticmethod
+    def _claim_notification(notification):
+        # Claiming the notification sets its status to running, and makes
+        # sure that no other engine processes it at the same time.
+        try:
+            notification.claim(CONF.host, CONF.notification_lease_duration)
+        except exception.NotificationAlreadyClaimed:
+            LOG.info("Notification %(notification_uuid)s is already being "
+                     "processed by another engine.",
+                     {'notification_uuid': notification.notification_uuid})
+            return False
+
+        return True
+
+    def _wait_for_instance_recoveries(self, context, notification):
+        """Waits until the instance failures of the host are processed.
+
+        Instance failures are claimed under the lock of their host, which is
+        held by the recovery of the host, so no other instance failure of
+        the host starts until it is recovered. Instance failures claimed by
+        engines which have stopped have an expired lease and are not waited
+        for.
+        """
+        while True:
+            running = objects.NotificationList.count(context, filters={
+                'source_host_uuid': notification.source_host_uuid,
+                'type': fields.NotificationType.VM,
+                'status': fields.NotificationStatus.RUNNING,
+                'lease-expires-after': timeutils.utcnow()})
+            if not running:
+                return
+
+            LOG.info("Waiting for %(count)d instance failure notifications "
+                     "of host %(host_uuid)s being processed before "
+                     "processing notification %(notification_uuid)s.",
+                     {'count': running,
+                      'host_uuid': notification.source_host_uuid,
+                      'notification_uuid': notification.notification_uuid})
+            eventlet.sleep(CONF.locks.poll_interval)
+
+    def _process_notification(self, context, notification,
+                              error_status=fields.NotificationStatus.ERROR):
+        lock_name = self._get_lock_name(notification)
+        claim_notification = self._claim_notification
+        if lock_name != notification.source_host_uuid:
+            # Instance failures are serialized per instance, but they are
+            # claimed under the lock of their host so that they don't
+            # overlap with the recovery of the host.
+            claim_notification = utils.synchronized(
+                notification.source_host_uuid,
+                blocking=True)(claim_notification)
+
+        @utils.synchronized(lock_name, blocking=True)
         def do_process_notification(notification):
+            if not claim_notification(notification):
+                return
+
             LOG.info('Processing notification %(notification_uuid)s of '
                      'type: %(type)s',
                      {'notification_uuid': notification.notification_uuid,
                       'type': notification.type})
 
-            update_data = {
-                'status': fields.NotificationStatus.RUNNING,
-            }
-            notification.update(update_data)
-            notification.save()
-
-            if notification.type == fields.NotificationType.PROCESS:
-                notification_status = self._handle_notification_type_process(
-                    context, notification)
-            elif notification.type == fields.NotificationType.VM:
-                notification_status = self._handle_notification_type_instance(
-                    context, notification)
-            elif notification.type == fields.NotificationType.COMPUTE_HOST:
-                notification_status = self._handle_notification_type_host(
-                    context, notification)
+            # The status isn't saved if the lease is lost while the
+            # notification is processed, as another engine may be
+            # processing it.
+            lease_lost = threading.Event()
+            heartbeat = loopingcall.FixedIntervalLoopingCall(
+                self._renew_notification_lease, notification, lease_lost)
+            interval = CONF.notification_lease_duration / 3.0
+            heartbeat.start(interval=interval, initial_delay=interval)
+            try:
+                if notification.type == fields.NotificationType.PROCESS:
+                    notification_status = (
+                        self._handle_notification_type_process(
+                            context, notification))
+                elif notification.type == fields.NotificationType.VM:
+                    notification_status = (
+                        self._handle_notification_type_instance(
+                            context, notification))
+                elif notification.type == (
+                        fields.NotificationType.COMPUTE_HOST):
+                    self._wait_for_instance_recoveries(context, notification)
+                    notification_status = self._handle_notification_type_host(
+                        context, notification)
+            finally:
+                heartbeat.stop()
+
+            if notification_status == fields.NotificationStatus.ERROR:
+                notification_status = error_status
+
+            if lease_lost.is_set():
+                LOG.warning("Status %(status)s of notification "
+                            "%(notification_uuid)s is not saved as its lease "
+                            "was lost while it was processed.",
+                            {'notification_uuid':
+                                notification.notification_uuid,
+                             'status': notification_status})
+                return
 
             LOG.info("Notification %(notification_uuid)s exits with "
                      "status: %(status)s.",
@@ -209,48 +323,256 @@ class MasakariManager(manager.Manager):
                 'status': notification_status
             }
             notification.update(update_data)
-            notification.save()
+            try:
+                notification.release(CONF.host)
+            except exception.NotificationAlreadyClaimed:
+                LOG.warning("Status of notification %(notification_uuid)s "
+                            "is not saved as it is processed by another "
+                            "engine.",
+                            {'notification_uuid':
+                                notification.notification_uuid})
 
         do_process_notification(notification)
 
+    def _get_segment_uuid(self, context, notification):
+        try:
+            host_obj = objects.Host.get_by_uuid(
+                context, notification.source_host_uuid)
+        except exception.HostNotFound:
+            return None
+
+        return host_obj.failover_segment_id
+
     def process_notification(self, context, notification=None):
         """Processes the notification"""
-        self._process_notification(context, notification)
+        if not CONF.notification_scheduler.enabled:
+            self._process_notification(context, notification)
+            return
+
+        self.scheduler.submit(
+            notification, self._get_segment_uuid(context, notification),
+            self._process_notification, context, notification)
+
+    def _process_notification_and_wait(self, context, notification,
+                                       **kwargs):
+        """Processes the notification and waits until it is processed.
+
+        The notification is queued by the scheduler like new notifications,
+        so that retried notifications are bound by the same limits.
+        """
+        if not CONF.notification_scheduler.enabled:
+            self._process_notification(context, notification, **kwargs)
+            return
+
+        processed = eventlet.event.Event()
+
+        def _process():
+            try:
+                self._process_notification(context, notification, **kwargs)
+            finally:
+                processed.send()
+
+        self.scheduler.submit(
+            notification, self._get_segment_uuid(context, notification),
+            _process)
+        processed.wait()
+
+    def _log_notification_queue_stats(self):
+        if not CONF.notification_scheduler.enabled:
+            return
+
+        for notification_type, stats in sorted(
+                self.scheduler.stats().items()):
+            LOG.info("Notification queue of type %(type)s: %(queued)d "
+                     "queued, %(running)d running, %(dispatched)d "
+                     "dispatched, waited %(wait_time_avg).2f seconds on "
+                     "average and %(wait_time_max).2f seconds at most.",
+                     dict(stats, type=notification_type))
+
+    @staticmethod
+    def _log_lock_stats():
+        for name, stats in sorted(locks.get_lock_stats().items()):
+            LOG.debug("Lock %(name)s: acquired %(acquired)d times, failed "
+                      "%(failed)d times, waited %(wait_time_max).2f seconds "
+                      "and held %(hold_time_max).2f seconds at most.",
+                      dict(stats, name=name))
+
+    def get_recovery_timing_stats(self):
+        """Returns duration percentiles of the recovery workflows."""
+        return self.driver.get_recovery_timing_stats()
+
+    def get_unfinished_notification_stats(self):
+        """Returns statistics of the last unfinished notifications run."""
+        return dict(self._unfinished_notification_stats)
+
+    @staticmethod
+    def _is_unfinished_notification_due(notification):
+        return (notification.status in (fields.NotificationStatus.ERROR,
+                                        fields.NotificationStatus.RUNNING) or
+                (notification.status == fields.NotificationStatus.NEW and
+                 timeutils.is_older_than(
+                     notification.generated_time,
+                     CONF.retry_notification_new_status_interval)))
+
+    def _process_unfinished_notification(self, context, notification):
+        try:
+            # Notifications which fail again aren't retried anymore.
+            self._process_notification_and_wait(
+                context, notification,
+                error_status=fields.NotificationStatus.FAILED)
+        except Exception:
+            LOG.exception("Failed to process notification "
+                          "%(notification_uuid)s.",
+                          {'notification_uuid':
+                              notification.notification_uuid})
+
+        # The notification object is updated and saved by the workflow
+        # execution, so its status doesn't need to be reloaded from db.
+        if notification.status == fields.NotificationStatus.FAILED:
+            LOG.error(
+                "Periodic task 'process_unfinished_notifications': "
+                "Notification %(notification_uuid)s exits with "
+                "status: %(status)s.",
+                {'notification_uuid': notification.notification_uuid,
+                 'status': notification.status})
+            return False
+
+        return True
+
+    @staticmethod
+    def _get_notification_pages(context, filters):
+        marker = None
+        while True:
+            notifications_list = objects.NotificationList.get_all(
+                context, filters=filters, sort_keys=['id'],
+                sort_dirs=['asc'],
+                limit=CONF.process_unfinished_notifications_batch_size,
+                marker=marker)
+            if not notifications_list:
+                return
+
+            marker = notifications_list[-1].id
+            yield notifications_list
+
+    @staticmethod
+    def _get_orphaned_filters():
+        # Running notifications whose lease has expired were being processed
+        # by an engine which has stopped.
+        return {'status': fields.NotificationStatus.RUNNING,
+                'lease-expires-before': timeutils.utcnow()}
+
+    def _get_unfinished_filters(self):
+        return [
+            self._get_orphaned_filters(),
+            {'status': [fields.NotificationStatus.ERROR,
+                        fields.NotificationStatus.NEW]},
+        ]
+
+    def _get_unfinished_notifications(self, context, filters_list):
+        """Yields pages of the notifications which need to be processed."""
+        for filters in filters_list:
+            for notifications_list in self._get_notification_pages(
+                    context, filters):
+                yield notifications_list
+
+    def _resume_running_notifications(self, context):
+        # The notifications this engine was processing when it stopped are
+        # still running and owned by it, and the ones claimed before leases
+        # were recorded have no lease, so nothing would ever process them
+        # again.
+        expired = objects.NotificationList.expire_leases(context, CONF.host)
+        if expired:
+            LOG.info("Expired the leases of %d running notifications "
+                     "interrupted by a stop of the engine.", expired)
+
+        resumed = 0
+        for notifications_list in self._get_notification_pages(
+                context, self._get_orphaned_filters()):
+            for notification in notifications_list:
+                LOG.info("Resuming processing of notification "
+                         "%(notification_uuid)s.",
+                         {'notification_uuid':
+                             notification.notification_uuid})
+                utils.spawn_n(self.process_notification, context,
+                              notification)
+                resumed += 1
+
+        return resumed
+
+    def init_host(self):
+        """Resumes the notifications left running by stopped engines."""
+        context = masakari_context.get_admin_context()
+        try:
+            self._resume_running_notifications(context)
+        except Exception:
+            # They are resumed by the periodic task later on.
+            LOG.exception("Failed to resume running notifications.")
 
     @periodic_task.periodic_task(
         spacing=CONF.process_unfinished_notifications_interval)
     def _process_unfinished_notifications(self, context):
-        filters = {
-            'status': [fields.NotificationStatus.ERROR,
-                       fields.NotificationStatus.NEW]
-        }
-        notifications_list = objects.NotificationList.get_all(context,
-                                                              filters=filters)
-
-        for notification in notifications_list:
-            if (notification.status == fields.NotificationStatus.ERROR or
-                    (notification.status == fields.NotificationStatus.NEW and
-                timeutils.is_older_than(
-                    notification.generated_time,
-                    CONF.retry_notification_new_status_interval))):
-                self._process_notification(context, notification)
-
-            # get updated notification from db after workflow execution
-            notification_db = objects.Notification.get_by_uuid(
-                context, notification.notification_uuid)
-
-            if notification_db.status == fields.NotificationStatus.ERROR:
-                # update notification status as failed
-                notification_status = fields.NotificationStatus.FAILED
-                update_data = {
-                    'status': notification_status
-                }
-
-                notification_db.update(update_data)
-                notification_db.save()
-                LOG.error(
-                    "Periodic task 'process_unfinished_notifications': "
-                    "Notification %(notification_uuid)s exits with "
-                    "status: %(status)s.",
-                    {'notification_uuid': notification.notification_uuid,
-                     'status': notification_status})
+        time_budget = CONF.process_unfinished_notifications_time_budget
+        watch = timeutils.StopWatch(duration=time_budget or None)
+        watch.start()
+
+        filters_list = self._get_unfinished_filters()
+        backlog = sum(objects.NotificationList.count(context, filters=filters)
+                      for filters in filters_list)
+        stats = {'backlog': backlog, 'dispatched': 0, 'failed': 0,
+                 'budget_exhausted': False}
+
+        def _process(notification):
+            if not self._process_unfinished_notification(context,
+                                                         notification):
+                stats['failed'] += 1
+
+        # Notifications are loaded a page at a time and processed by a
+        # bounded pool of green threads, so a large backlog is neither
+        # loaded in memory at once nor processed one notification at a time.
+        pool = eventlet.GreenPool(
+            CONF.process_unfinished_notifications_workers)
+        for notifications_list in self._get_unfinished_notifications(
+                context, filters_list):
+            for notification in notifications_list:
+                if watch.expired():
+                    stats['budget_exhausted'] = True
+                    break
+
+                if self._is_unfinished_notification_due(notification):
+                    stats['dispatched'] += 1
+                    pool.spawn_n(_process, notification)
+
+            if stats['budget_exhausted']:
+                break
+
+        if time_budget:
+            # The notifications still being processed when the budget is
+            # exhausted go on in the background, their lease keeps the next
+            # runs from processing them again.
+            with eventlet.Timeout(watch.leftover(), False):
+                pool.waitall()
+            if pool.running():
+                stats['budget_exhausted'] = True
+        else:
+            pool.waitall()
+
+        elapsed = watch.elapsed()
+        stats['elapsed'] = elapsed
+        stats['drain_rate'] = (stats['dispatched'] / elapsed
+                               if elapsed else 0.0)
+        self._unfinished_notification_stats = stats
+
+        if stats['backlog']:
+            LOG.info("Periodic task 'process_unfinished_notifications': "
+                     "processed %(dispatched)d of %(backlog)d unfinished "
+                     "notifications (%(failed)d failed) in %(elapsed).2f "
+                     "seconds, %(drain_rate).2f notifications per second.",
+                     stats)
+        if stats['budget_exhausted']:
+            LOG.warning("Periodic task 'process_unfinished_notifications' "
+                        "exceeded its time budget of %(budget)d seconds, "
+                        "the remaining notifications will be processed by "
+                        "the next run.", {'budget': time_budget})
+
+        self._log_notification_queue_stats()
+        self._log_lock_stats()
@@ -0,0 +1,179 @@
+# Copyright 2016 NTT DATA
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Priority scheduling of notifications in masakari-engine.
+
+Notifications are queued by the priority of their type and processed in the
+order they are received within a priority, while the number of notifications
+processed concurrently is limited per notification type and per failover
+segment.
+"""
+
+import bisect
+import collections
+import itertools
+
+from oslo_log import log as logging
+from oslo_utils import timeutils
+
+import masakari.conf
+from masakari import utils
+
+
+CONF = masakari.conf.CONF
+
+LOG = logging.getLogger(__name__)
+
+
+class _QueueEntry(object):
+    def __init__(self, priority, seq, notification, segment_uuid, func,
+                 args, kwargs):
+        self.priority = priority
+        self.seq = seq
+        self.notification = notification
+        self.segment_uuid = segment_uuid
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.queued_at = timeutils.utcnow()
+
+    @property
+    def type(self):
+        return self.notification.type
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class NotificationScheduler(object):
+    """Queues notifications and dispatches them to green threads."""
+
+    def __init__(self):
+        self._queue = []
+        self._seq = itertools.count()
+        self._running_by_type = collections.Counter()
+        self._running_by_segment = collections.Counter()
+        self._wait_stats = collections.defaultdict(
+            lambda: {'count': 0, 'total': 0.0, 'max': 0.0})
+
+    @staticmethod
+    def _type_limit(notification_type, option):
+        # Notification types which are not configured get the lowest
+        # priority and no concurrency limit. Values are validated as
+        # integers when the configuration is loaded.
+        return getattr(CONF.notification_scheduler, option).get(
+            notification_type)
+
+    def _priority(self, notification_type):
+        priority = self._type_limit(notification_type, 'type_priority')
+        if priority is None:
+            return float('inf')
+        return priority
+
+    def _can_run(self, entry):
+        type_concurrency = self._type_limit(entry.type, 'type_concurrency')
+        if (type_concurrency is not None and
+                self._running_by_type[entry.type] >= type_concurrency):
+            return False
+
+        segment_concurrency = CONF.notification_scheduler.segment_concurrency
+        if (segment_concurrency and entry.segment_uuid is not None and
+                self._running_by_segment[entry.segment_uuid] >=
+                segment_concurrency):
+            return False
+
+        return True
+
+    def submit(self, notification, segment_uuid, func, *args, **kwargs):
+        """Queues func to process the notification.
+
+        :param notification: Notification object to be processed.
+        :param segment_uuid: Uuid of the failover segment of the
+            notification's host or None if it is unknown.
+        :param func: Callable processing the notification, called with the
+            remaining args and kwargs.
+        """
+        entry = _QueueEntry(self._priority(notification.type),
+                            next(self._seq), notification, segment_uuid,
+                            func, args, kwargs)
+        bisect.insort(self._queue, entry)
+        LOG.debug("Queued notification %(notification_uuid)s of type "
+                  "%(type)s, queue depth: %(depth)d.",
+                  {'notification_uuid': notification.notification_uuid,
+                   'type': notification.type, 'depth': len(self._queue)})
+        self._dispatch()
+
+    def _dispatch(self):
+        # Entries are sorted by priority and by arrival within a priority,
+        # so the first entry which doesn't exceed any concurrency limit is
+        # the next one to run.
+        index = 0
+        while index < len(self._queue):
+            entry = self._queue[index]
+            if not self._can_run(entry):
+                index += 1
+                continue
+
+            del self._queue[index]
+            self._start(entry)
+
+    def _start(self, entry):
+        self._running_by_type[entry.type] += 1
+        if entry.segment_uuid is not None:
+            self._running_by_segment[entry.segment_uuid] += 1
+
+        wait_time = timeutils.delta_seconds(entry.queued_at,
+                                            timeutils.utcnow())
+        stats = self._wait_stats[entry.type]
+        stats['count'] += 1
+        stats['total'] += wait_time
+        stats['max'] = max(stats['max'], wait_time)
+
+        utils.spawn_n(self._run, entry)
+
+    def _run(self, entry):
+        try:
+            entry.func(*entry.args, **entry.kwargs)
+        except Exception:
+            LOG.exception("Failed to process notification "
+                          "%(notification_uuid)s.",
+                          {'notification_uuid':
+                              entry.notification.notification_uuid})
+        finally:
+            self._running_by_type[entry.type] -= 1
+            if entry.segment_uuid is not None:
+                self._running_by_segment[entry.segment_uuid] -= 1
+                if not self._running_by_segment[entry.segment_uuid]:
+                    del self._running_by_segment[entry.segment_uuid]
+            self._dispatch()
+
+    def stats(self):
+        """Returns queue depth, running count and wait time per type."""
+        queued = collections.Counter(entry.type for entry in self._queue)
+        result = {}
+        for notification_type in (set(queued) |
+                                  set(self._running_by_type) |
+                                  set(self._wait_stats)):
+            wait_stats = self._wait_stats.get(
+                notification_type, {'count': 0, 'total': 0.0, 'max': 0.0})
+            result[notification_type] = {
+                'queued': queued[notification_type],
+                'running': self._running_by_type[notification_type],
+                'dispatched': wait_stats['count'],
+                'wait_time_avg': (wait_stats['total'] / wait_stats['count']
+                                  if wait_stats['count'] else 0.0),
+                'wait_time_max': wait_stats['max'],
+            }
+        return result
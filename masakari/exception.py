@@ -267,6 +267,11 @@ class NotificationNotFound(NotFound):
     msg_fmt = _("No notification with id %(id)s.")
 
 
+class EvacuationNotFound(NotFound):
+    msg_fmt = _("No evacuation of instance %(instance_uuid)s for "
+                "notification %(notification_uuid)s.")
+
+
 class FailoverSegmentNotFoundByName(FailoverSegmentNotFound):
     msg_fmt = _("Failover segment with name %(segment_name)s could not "
                 "be found.")
@@ -341,6 +346,11 @@ class FailoverSegmentInUse(Conflict):
                 "to process notifications.")
 
 
+class NotificationAlreadyClaimed(Conflict):
+    msg_fmt = _("Notification %(notification_uuid)s is already being "
+                "processed by another engine.")
+
+
 class HostInUse(Conflict):
     msg_fmt = _("Host %(uuid)s can't be updated as it is in-use to process "
                 "notifications.")
@@ -215,26 +215,11 @@ class NotificationAPI(object):
 
     @staticmethod
     def _is_duplicate_notification(context, notification):
-        # Get all the notifications by filters
-
-        filters = {
-            'type': notification.type,
-            'status': [fields.NotificationStatus.NEW,
-                       fields.NotificationStatus.RUNNING],
-            'source_host_uuid': notification.source_host_uuid,
-            'generated-since': (notification.generated_time -
-                datetime.timedelta(
-                    seconds=CONF.duplicate_notification_detection_interval))
-        }
-        notifications_list = objects.NotificationList.get_all(context,
-                                                              filters=filters)
-        for db_notification in notifications_list:
-            # if payload is same notification should be considered as
-            # duplicate
-            if db_notification.payload == notification.payload:
-                return True
-
-        return False
+        # A new or running notification of the same type with the same
+        # payload from the same host is considered as duplicate.
+        generated_since = (notification.generated_time - datetime.timedelta(
+            seconds=CONF.duplicate_notification_detection_interval))
+        return notification.is_duplicate(generated_since)
 
     def create_notification(self, context, notification_data):
         """Create notification"""
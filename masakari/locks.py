@@ -0,0 +1,223 @@
+# Copyright 2017 NTT DATA
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Locks serializing the recovery of hosts and the use of reserved hosts.
+
+The backend of the locks is selected by the '[locks] backend' config option:
+
+* local: green thread locks of a single process.
+* file: file locks serializing the processes of a single node.
+* db: leases on rows of the masakari database serializing all the engines.
+
+The time spent waiting for and holding every lock is recorded, so that
+contended locks can be found with :func:`get_lock_stats`.
+"""
+
+import collections
+
+import eventlet
+from oslo_concurrency import lockutils
+from oslo_log import log as logging
+from oslo_service import loopingcall
+from oslo_utils import timeutils
+from oslo_utils import uuidutils
+
+import masakari.conf
+
+
+CONF = masakari.conf.CONF
+
+LOG = logging.getLogger(__name__)
+
+_LOCK_STATS = collections.defaultdict(
+    lambda: {'acquired': 0, 'failed': 0, 'wait_time_total': 0.0,
+             'wait_time_max': 0.0, 'hold_time_total': 0.0,
+             'hold_time_max': 0.0})
+
+
+def get_lock_stats():
+    """Returns acquisition counts and wait and hold times per lock name."""
+    return {name: dict(stats) for name, stats in _LOCK_STATS.items()}
+
+
+def reset_lock_stats():
+    _LOCK_STATS.clear()
+
+
+class LocalLockBackend(object):
+    """Locks serializing the green threads of a single process."""
+
+    def get_lock(self, name, semaphores=None):
+        return lockutils.internal_lock(name, semaphores=semaphores)
+
+
+class _FileLock(object):
+    def __init__(self, internal_lock, external_lock):
+        self._internal_lock = internal_lock
+        self._external_lock = external_lock
+
+    def acquire(self, blocking=True):
+        # File locks are held per process, so the green threads of this
+        # process are serialized by the internal lock first.
+        if not self._internal_lock.acquire(blocking=blocking):
+            return False
+
+        try:
+            acquired = self._external_lock.acquire(blocking=blocking)
+        except Exception:
+            self._internal_lock.release()
+            raise
+
+        if not acquired:
+            self._internal_lock.release()
+        return acquired
+
+    def release(self):
+        try:
+            self._external_lock.release()
+        finally:
+            self._internal_lock.release()
+
+
+class FileLockBackend(object):
+    """Locks serializing the processes of a single node."""
+
+    def get_lock(self, name, semaphores=None):
+        return _FileLock(lockutils.internal_lock(name, semaphores=semaphores),
+                         lockutils.external_lock(name))
+
+
+class _DBLock(object):
+    def __init__(self, name):
+        # masakari.context imports masakari.utils, which imports this
+        # module, so they are only imported once a db lock is used.
+        from masakari import context
+        from masakari import db
+
+        self.name = name
+        self.lost = False
+        self._db = db
+        self._owner = None
+        self._heartbeat = None
+        self._context = context.get_admin_context()
+
+    def _renew(self):
+        try:
+            renewed = self._db.lock_renew(self._context, self.name,
+                                          self._owner,
+                                          CONF.locks.lease_duration)
+        except Exception:
+            LOG.exception("Failed to renew the lease of lock %s.", self.name)
+            return
+
+        if not renewed:
+            LOG.warning("Lost the lease of lock %s.", self.name)
+            self.lost = True
+            raise loopingcall.LoopingCallDone()
+
+    def acquire(self, blocking=True):
+        owner = '%s:%s' % (CONF.host, uuidutils.generate_uuid())
+        while not self._db.lock_acquire(self._context, self.name, owner,
+                                        CONF.locks.lease_duration):
+            if not blocking:
+                return False
+            eventlet.sleep(CONF.locks.poll_interval)
+
+        self._owner = owner
+        self.lost = False
+        self._heartbeat = loopingcall.FixedIntervalLoopingCall(self._renew)
+        interval = CONF.locks.lease_duration / 3.0
+        self._heartbeat.start(interval=interval, initial_delay=interval)
+        return True
+
+    def release(self):
+        self._heartbeat.stop()
+        self._db.lock_release(self._context, self.name, self._owner)
+        self._owner = None
+        self._heartbeat = None
+        if self.lost:
+            LOG.warning("Released lock %s whose lease was lost while it was "
+                        "held, another engine may have held it at the same "
+                        "time.", self.name)
+
+
+class DBLockBackend(object):
+    """Locks serializing all the engines sharing the masakari database."""
+
+    def get_lock(self, name, semaphores=None):
+        return _DBLock(name)
+
+
+_BACKENDS = {
+    'local': LocalLockBackend(),
+    'file': FileLockBackend(),
+    'db': DBLockBackend(),
+}
+
+
+class _TimedLock(object):
+    """Records the time spent waiting for and holding a lock."""
+
+    def __init__(self, name, lock):
+        self.name = name
+        self._lock = lock
+        self._hold_watch = None
+
+    @property
+    def lost(self):
+        """Whether the lock was lost while held, checked by its holder."""
+        return getattr(self._lock, 'lost', False)
+
+    def acquire(self, blocking=True):
+        watch = timeutils.StopWatch()
+        watch.start()
+        acquired = self._lock.acquire(blocking=blocking)
+        wait_time = watch.elapsed()
+
+        stats = _LOCK_STATS[self.name]
+        stats['wait_time_total'] += wait_time
+        stats['wait_time_max'] = max(stats['wait_time_max'], wait_time)
+        if not acquired:
+            stats['failed'] += 1
+            return False
+
+        stats['acquired'] += 1
+        self._hold_watch = timeutils.StopWatch()
+        self._hold_watch.start()
+        return True
+
+    def release(self):
+        hold_time = self._hold_watch.elapsed()
+        stats = _LOCK_STATS[self.name]
+        stats['hold_time_total'] += hold_time
+        stats['hold_time_max'] = max(stats['hold_time_max'], hold_time)
+        LOG.debug("Lock %(name)s was held for %(hold_time).2f sec.",
+                  {'name': self.name, 'hold_time': hold_time})
+
+        self._lock.release()
+
+
+def get_lock(name, semaphores=None):
+    """Returns a lock of the configured backend.
+
+    :param name: Name of the lock.
+    :param semaphores: Container of the semaphores of the process-local
+        locks, the default one if None.
+    :returns: Lock object with acquire(blocking=True) and release() methods,
+        and a lost attribute set when the lease of a db lock expires while
+        it is held.
+    """
+    backend = _BACKENDS[CONF.locks.backend]
+    return _TimedLock(name, backend.get_lock(name, semaphores=semaphores))
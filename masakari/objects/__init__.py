@@ -18,6 +18,7 @@ def register_all():
     # NOTE(Dinesh_Bhor): You must make sure your object gets imported in this
     # function in order for it to be registered by services that may
     # need to receive it via RPC.
+    __import__('masakari.objects.evacuation')
     __import__('masakari.objects.host')
     __import__('masakari.objects.notification')
     __import__('masakari.objects.segment')
@@ -0,0 +1,84 @@
+# Copyright 2016 NTT Data.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from masakari import db
+from masakari import exception
+from masakari import objects
+from masakari.objects import base
+from masakari.objects import fields
+
+
+@base.MasakariObjectRegistry.register
+class Evacuation(base.MasakariPersistentObject, base.MasakariObject,
+                 base.MasakariObjectDictCompat):
+    """Evacuation of an instance during the recovery of a notification."""
+
+    VERSION = '1.0'
+
+    fields = {
+        'id': fields.IntegerField(),
+        'notification_uuid': fields.UUIDField(),
+        'instance_uuid': fields.UUIDField(),
+        'status': fields.EvacuationStatusField(),
+        }
+
+    @staticmethod
+    def _from_db_object(context, evacuation, db_evacuation):
+
+        for key in evacuation.fields:
+            setattr(evacuation, key, db_evacuation.get(key))
+
+        evacuation.obj_reset_changes()
+        evacuation._context = context
+        return evacuation
+
+    @base.remotable
+    def create(self):
+        if self.obj_attr_is_set('id'):
+            raise exception.ObjectActionError(action='create',
+                                              reason='already created')
+        updates = self.masakari_obj_get_changes()
+
+        db_evacuation = db.evacuation_create(self._context, updates)
+        self._from_db_object(self._context, self, db_evacuation)
+
+    @base.remotable
+    def save(self):
+        updates = self.masakari_obj_get_changes()
+
+        updates.pop('id', None)
+
+        db_evacuation = db.evacuation_update(self._context,
+                                             self.notification_uuid,
+                                             self.instance_uuid, updates)
+        self._from_db_object(self._context, self, db_evacuation)
+
+
+@base.MasakariObjectRegistry.register
+class EvacuationList(base.ObjectListBase, base.MasakariObject):
+
+    VERSION = '1.0'
+
+    fields = {
+        'objects': fields.ListOfObjectsField('Evacuation'),
+        }
+
+    @base.remotable_classmethod
+    def get_all_by_notification(cls, context, notification_uuid):
+        db_evacuations = db.evacuations_get_all_by_notification(
+            context, notification_uuid)
+
+        return base.obj_make_list(context, cls(context), objects.Evacuation,
+                                  db_evacuations)
@@ -111,6 +111,30 @@ class NotificationStatus(Enum):
         return cls.ALL[index]
 
 
+class EvacuationStatus(Enum):
+    """Represents possible statuses for evacuations of instances."""
+
+    EVACUATING = "evacuating"
+    EVACUATED = "evacuated"
+    ERROR = "error"
+
+    ALL = (EVACUATING, EVACUATED, ERROR)
+
+    def __init__(self):
+        super(EvacuationStatus,
+              self).__init__(valid_values=EvacuationStatus.ALL)
+
+    @classmethod
+    def index(cls, value):
+        """Return an index into the Enum given a value."""
+        return cls.ALL.index(value)
+
+    @classmethod
+    def from_index(cls, index):
+        """Return the Enum value at a given index."""
+        return cls.ALL[index]
+
+
 class FailoverSegmentRecoveryMethodField(BaseEnumField):
     AUTO_TYPE = FailoverSegmentRecoveryMethod()
 
@@ -121,3 +145,7 @@ class NotificationTypeField(BaseEnumField):
 
 class NotificationStatusField(BaseEnumField):
     AUTO_TYPE = NotificationStatus()
+
+
+class EvacuationStatusField(BaseEnumField):
+    AUTO_TYPE = EvacuationStatus()
@@ -22,6 +22,7 @@ from masakari import exception
 from masakari import objects
 from masakari.objects import base
 from masakari.objects import fields
+from masakari import utils
 
 LOG = logging.getLogger(__name__)
 
@@ -30,7 +31,10 @@ LOG = logging.getLogger(__name__)
 class Notification(base.MasakariPersistentObject, base.MasakariObject,
                    base.MasakariObjectDictCompat):
 
-    VERSION = '1.0'
+    # Version 1.0: Initial version
+    # Version 1.1: Added claim(), renew_lease() and release()
+    # Version 1.2: Added is_duplicate()
+    VERSION = '1.2'
 
     fields = {
         'id': fields.IntegerField(),
@@ -79,6 +83,8 @@ class Notification(base.MasakariPersistentObject, base.MasakariObject,
                       dict(uuid=updates['notification_uuid']))
 
         if 'payload' in updates:
+            updates['payload_hash'] = utils.notification_payload_hash(
+                updates['payload'])
             updates['payload'] = jsonutils.dumps(updates['payload'])
 
         db_notification = db.notification_create(self._context, updates)
@@ -95,6 +101,46 @@ class Notification(base.MasakariPersistentObject, base.MasakariObject,
                                                  updates)
         self._from_db_object(self._context, self, db_notification)
 
+    @base.remotable
+    def is_duplicate(self, generated_since):
+        """Checks whether a new or running notification is the same.
+
+        Notifications are the same if they have the same type, source host
+        and payload. Only the ones generated since generated_since count.
+        """
+        return db.notification_duplicate_exists(
+            self._context, self.source_host_uuid, self.type,
+            utils.notification_payload_hash(self.payload), generated_since)
+
+    @base.remotable
+    def claim(self, owner, lease_duration):
+        """Claims the notification for processing by owner.
+
+        :raises: NotificationAlreadyClaimed if another engine owns the
+            notification or it doesn't need to be processed.
+        """
+        db_notification = db.notification_claim(self._context,
+                                                self.notification_uuid,
+                                                owner, lease_duration)
+        self._from_db_object(self._context, self, db_notification)
+
+    @base.remotable
+    def renew_lease(self, owner, lease_duration):
+        db.notification_renew_lease(self._context, self.notification_uuid,
+                                    owner, lease_duration)
+
+    @base.remotable
+    def release(self, owner):
+        """Saves the changes and releases the claim of owner."""
+        updates = self.masakari_obj_get_changes()
+
+        updates.pop('id', None)
+
+        db_notification = db.notification_release(self._context,
+                                                  self.notification_uuid,
+                                                  owner, updates)
+        self._from_db_object(self._context, self, db_notification)
+
     @base.remotable
     def destroy(self):
         if not self.obj_attr_is_set('id'):
@@ -111,7 +157,10 @@ class Notification(base.MasakariPersistentObject, base.MasakariObject,
 @base.MasakariObjectRegistry.register
 class NotificationList(base.ObjectListBase, base.MasakariObject):
 
-    VERSION = '1.0'
+    # Version 1.0: Initial version
+    # Version 1.1: Added expire_leases()
+    # Version 1.2: Added count()
+    VERSION = '1.2'
 
     fields = {
         'objects': fields.ListOfObjectsField('Notification'),
@@ -129,3 +178,16 @@ class NotificationList(base.ObjectListBase, base.MasakariObject):
 
         return base.obj_make_list(context, cls(context), objects.Notification,
                                   groups)
+
+    @base.remotable_classmethod
+    def count(cls, context, filters=None):
+        """Returns the number of notifications matching the filters."""
+        return db.notifications_count_by_filters(context, filters=filters)
+
+    @base.remotable_classmethod
+    def expire_leases(cls, context, owner):
+        """Expires the leases of the running notifications of owner.
+
+        :returns: Number of notifications whose lease is expired.
+        """
+        return db.notifications_expire_leases(context, owner)
@@ -84,6 +84,7 @@ class Service(service.Service):
             'version': verstr
         })
         self.basic_config_check()
+        self.manager.init_host()
 
         LOG.debug("Creating RPC server for service %s", self.topic)
 
@@ -0,0 +1,198 @@
+# Copyright 2017 NTT DATA
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""In-process fake of the nova API with modelled latencies and failures."""
+
+import collections
+import datetime
+import itertools
+import random
+
+import eventlet
+from oslo_utils import timeutils
+from oslo_utils import uuidutils
+
+from masakari import exception
+from masakari.tests.unit import fakes
+
+
+class Hypervisor(object):
+    def __init__(self, host_name, vcpus=4096, vcpus_used=0,
+                 free_ram_mb=4194304, free_disk_gb=65536):
+        self.service = {'host': host_name}
+        self.vcpus = vcpus
+        self.vcpus_used = vcpus_used
+        self.free_ram_mb = free_ram_mb
+        self.free_disk_gb = free_disk_gb
+
+
+class FakeNovaAPI(object):
+    """Fake of :class:`masakari.compute.nova.API` keeping nova in memory.
+
+    Every call sleeps for its latency, randomly increased or decreased by
+    up to 'jitter' of it, and fails with its failure rate. The latency and
+    failure rate of a call default to 'latency' and 'failure_rate' unless
+    set by call name in 'latencies' and 'failure_rates'. An evacuated
+    instance lands on its target host 'evacuation_time' seconds after it is
+    evacuated. The number of calls is counted by call name in call_counts.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0,
+                 evacuation_time=0.0, latencies=None, failure_rates=None,
+                 seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.evacuation_time = evacuation_time
+        self.latencies = latencies or {}
+        self.failure_rates = failure_rates or {}
+        self.call_counts = collections.Counter()
+        self._random = random.Random(seed)
+        self._servers = collections.OrderedDict()
+        self._services = collections.OrderedDict()
+        self._hypervisors = []
+        # instance id -> (target host, time the evacuation completes)
+        self._evacuations = {}
+        self._service_ids = itertools.count(1)
+        self._flavor = fakes.FakeNovaClient.Flavor(id='1')
+
+    def add_host(self, host_name, instance_count=0, ha_enabled=True,
+                 status='enabled', state='up'):
+        """Adds a compute host running instance_count instances."""
+        self._services[host_name] = fakes.FakeNovaClient.Service(
+            id=next(self._service_ids), host=host_name,
+            binary='nova-compute', status=status, state=state)
+        self._hypervisors.append(Hypervisor(host_name))
+        for _ in range(instance_count):
+            instance_uuid = uuidutils.generate_uuid()
+            self._servers[instance_uuid] = fakes.FakeNovaClient.Server(
+                id=instance_uuid, uuid=instance_uuid, host=host_name,
+                vm_state='active', ha_enabled=ha_enabled)
+
+    def get_instance_ids(self, host_name):
+        return [server.id for server in self._servers.values()
+                if server.host == host_name]
+
+    def _call(self, name):
+        self.call_counts[name] += 1
+        latency = self.latencies.get(name, self.latency)
+        if latency:
+            jitter = latency * self.jitter
+            eventlet.sleep(max(self._random.uniform(latency - jitter,
+                                                    latency + jitter), 0))
+
+        if self._random.random() < self.failure_rates.get(name,
+                                                          self.failure_rate):
+            raise exception.MasakariException(
+                "Injected failure of nova call '%s'." % name)
+
+    def _settle(self, server):
+        evacuation = self._evacuations.get(server.id)
+        if evacuation and evacuation[1] <= timeutils.utcnow():
+            del self._evacuations[server.id]
+            server.host = evacuation[0]
+            setattr(server, 'OS-EXT-SRV-ATTR:hypervisor_hostname',
+                    evacuation[0])
+        return server
+
+    def _get_server(self, uuid):
+        try:
+            return self._settle(self._servers[uuid])
+        except KeyError:
+            raise exception.NotFound()
+
+    def _schedule(self, source_host):
+        # Hosts nova would schedule an evacuated instance to.
+        for service in self._services.values():
+            if (service.host != source_host and
+                    service.status == 'enabled' and service.state == 'up'):
+                return service.host
+        raise exception.MasakariException("No valid host was found.")
+
+    def get_servers(self, context, host):
+        self._call('get_servers')
+        return [server for server in self._servers.values()
+                if self._settle(server).host == host]
+
+    def get_servers_by_uuids(self, context, uuids, changes_since=None):
+        servers = []
+        for uuid in uuids:
+            self._call('get_servers_by_uuids')
+            if uuid in self._servers:
+                servers.append(self._settle(self._servers[uuid]))
+        return servers
+
+    def enable_disable_service(self, context, host_name, enable=False,
+                               reason=None):
+        self._call('enable_disable_service')
+        self._services[host_name].status = 'enabled' if enable else (
+            'disabled')
+
+    def is_service_down(self, context, host_name, binary):
+        self._call('is_service_down')
+        return self._services[host_name].status == 'disabled'
+
+    def get_service(self, context, host_name, binary='nova-compute'):
+        self._call('get_service')
+        return self._services[host_name]
+
+    def force_down_service(self, context, host_name, binary='nova-compute',
+                           force_down=True):
+        self._call('force_down_service')
+        self._services[host_name].state = 'down' if force_down else 'up'
+
+    def evacuate_instance(self, context, uuid, target=None,
+                          on_shared_storage=True):
+        self._call('evacuate_instance')
+        server = self._get_server(uuid)
+        target = target or self._schedule(server.host)
+        self._evacuations[uuid] = (
+            target, timeutils.utcnow() +
+            datetime.timedelta(seconds=self.evacuation_time))
+
+    def reset_instance_state(self, context, uuid, status='error'):
+        self._call('reset_instance_state')
+        setattr(self._get_server(uuid), 'OS-EXT-STS:vm_state', status)
+
+    def get_server(self, context, uuid):
+        self._call('get_server')
+        return self._get_server(uuid)
+
+    def stop_server(self, context, uuid):
+        self._call('stop_server')
+        setattr(self._get_server(uuid), 'OS-EXT-STS:vm_state', 'stopped')
+
+    def start_server(self, context, uuid):
+        self._call('start_server')
+        setattr(self._get_server(uuid), 'OS-EXT-STS:vm_state', 'active')
+
+    def get_flavor(self, context, flavor_id):
+        self._call('get_flavor')
+        return self._flavor
+
+    def get_hypervisors(self, context):
+        self._call('get_hypervisors')
+        return list(self._hypervisors)
+
+    def get_aggregate_list(self, context):
+        self._call('get_aggregate_list')
+        return []
+
+    def get_aggregates_for_host(self, context, host_name):
+        self._call('get_aggregates_for_host')
+        return []
+
+    def add_host_to_aggregate(self, context, host, aggregate):
+        self._call('add_host_to_aggregate')
@@ -0,0 +1,227 @@
+# Copyright 2017 NTT DATA
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark of the hot notification queries on a seeded database.
+
+Seeds the notifications table with a large history, measures the queries of
+the engine periodic task, the duplicate notification detection and the
+failover segment under recovery check without the indexes of the table,
+then creates them and measures the queries again::
+
+    python -m masakari.tests.benchmark.notification_queries --rows 1000000
+
+A sqlite database is created in a temporary directory unless --connection
+is given, which must point to an empty database.
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+
+from oslo_utils import timeutils
+from oslo_utils import uuidutils
+
+import masakari.conf
+from masakari import context as masakari_context
+from masakari import db
+from masakari.db.sqlalchemy import api as db_api
+from masakari.db.sqlalchemy import migration
+from masakari.db.sqlalchemy import models
+from masakari.objects import fields
+
+
+CONF = masakari.conf.CONF
+
+SEED_BATCH_SIZE = 10000
+
+# Share of every status in the seeded notifications, finished ones make up
+# the rest of the history.
+STATUS_SHARES = (('new', 0.001), ('running', 0.001), ('error', 0.001),
+                 ('failed', 0.01), ('ignored', 0.05))
+
+
+def _status(rand):
+    value = rand.random()
+    for status, share in STATUS_SHARES:
+        if value < share:
+            return status
+        value -= share
+    return 'finished'
+
+
+def seed(engine, rows, hosts, segments, seed=None):
+    """Fills the database with segments, hosts and rows notifications.
+
+    :returns: Dict with the segment_uuid of a segment and the host_uuid of
+        one of its hosts.
+    """
+    rand = random.Random(seed)
+    now = timeutils.utcnow()
+    segment_uuids = [uuidutils.generate_uuid() for _ in range(segments)]
+    engine.execute(models.FailoverSegment.__table__.insert(), [
+        {'created_at': now, 'deleted': 0, 'uuid': segment_uuid,
+         'name': 'segment-%d' % index, 'service_type': 'compute',
+         'recovery_method': 'auto'}
+        for index, segment_uuid in enumerate(segment_uuids)])
+
+    host_uuids = [uuidutils.generate_uuid() for _ in range(hosts)]
+    engine.execute(models.Host.__table__.insert(), [
+        {'created_at': now, 'deleted': 0, 'uuid': host_uuid,
+         'name': 'host-%d' % index, 'reserved': False, 'type': 'COMPUTE',
+         'control_attributes': 'SSH', 'on_maintenance': False,
+         'failover_segment_id': segment_uuids[index % segments]}
+        for index, host_uuid in enumerate(host_uuids)])
+
+    host_segments = dict(
+        (host_uuid, segment_uuids[index % segments])
+        for index, host_uuid in enumerate(host_uuids))
+    notifications = models.Notification.__table__
+    for start in range(0, rows, SEED_BATCH_SIZE):
+        batch = []
+        for index in range(start, min(start + SEED_BATCH_SIZE, rows)):
+            host_uuid = rand.choice(host_uuids)
+            # Notifications are generated evenly over the last year, the
+            # latest ones last.
+            generated_time = now - datetime.timedelta(
+                seconds=(rows - index) * 31536000 // rows)
+            batch.append({
+                'created_at': generated_time, 'deleted': 0,
+                'notification_uuid': uuidutils.generate_uuid(),
+                'generated_time': generated_time,
+                'type': rand.choice(['VM', 'PROCESS', 'COMPUTE_HOST']),
+                'payload': '{"event": "STOPPED"}',
+                'payload_hash': '%064x' % rand.getrandbits(256),
+                'status': _status(rand),
+                'source_host_uuid': host_uuid,
+                'failover_segment_id': host_segments[host_uuid]})
+        engine.execute(notifications.insert(), batch)
+
+    return {'segment_uuid': segment_uuids[0], 'host_uuid': host_uuids[0]}
+
+
+def _queries(seeded):
+    now = timeutils.utcnow()
+    batch_size = CONF.process_unfinished_notifications_batch_size
+    return [
+        ('unfinished notifications',
+         lambda ctxt: db.notifications_get_all_by_filters(
+             ctxt, filters={'status': ['error', 'new']}, limit=batch_size)),
+        ('orphaned notifications',
+         lambda ctxt: db.notifications_get_all_by_filters(
+             ctxt, filters={'status': 'running',
+                            'lease-expires-before': now},
+             limit=batch_size)),
+        ('expire leases',
+         lambda ctxt: db.notifications_expire_leases(ctxt, 'no-such-engine')),
+        ('duplicate notification',
+         lambda ctxt: db.notification_duplicate_exists(
+             ctxt, seeded['host_uuid'], 'VM', '0' * 64,
+             now - datetime.timedelta(
+                 seconds=CONF.duplicate_notification_detection_interval))),
+        ('host notifications since',
+         lambda ctxt: db.notifications_get_all_by_filters(
+             ctxt, filters={'source_host_uuid': seeded['host_uuid'],
+                            'type': 'VM',
+                            'generated-since': now - datetime.timedelta(
+                                days=1)})),
+        ('segment under recovery',
+         lambda ctxt: db.is_failover_segment_under_recovery(
+             ctxt, seeded['segment_uuid'], filters={'status': [
+                 fields.NotificationStatus.NEW,
+                 fields.NotificationStatus.RUNNING,
+                 fields.NotificationStatus.ERROR]})),
+    ]
+
+
+def measure(seeded, repeat):
+    """Runs every query repeat times.
+
+    :returns: List of (query name, best time in seconds) tuples.
+    """
+    ctxt = masakari_context.get_admin_context()
+    results = []
+    for name, query in _queries(seeded):
+        elapsed = []
+        for _ in range(repeat):
+            watch = timeutils.StopWatch().start()
+            query(ctxt)
+            elapsed.append(watch.elapsed())
+        results.append((name, min(elapsed)))
+    return results
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the notification queries on a seeded '
+                    'database.')
+    parser.add_argument('--connection',
+                        help='URL of an empty database, a temporary sqlite '
+                             'database by default.')
+    parser.add_argument('--rows', type=int, default=1000000,
+                        help='Number of seeded notifications.')
+    parser.add_argument('--hosts', type=int, default=1000)
+    parser.add_argument('--segments', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of runs of every query, the best one '
+                             'is reported.')
+    parser.add_argument('--seed', type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    CONF([], project='masakari')
+    tempdir = None
+    connection = args.connection
+    if not connection:
+        tempdir = tempfile.mkdtemp()
+        connection = 'sqlite:///%s' % os.path.join(tempdir, 'masakari.db')
+    CONF.set_override('connection', connection, 'database')
+    db_api.configure(CONF)
+
+    try:
+        engine = db_api.get_engine()
+        migration.db_sync()
+        # Indexes other than the unique constraints are created once the
+        # table is seeded.
+        indexes = [index for index in models.Notification.__table__.indexes
+                   if not index.unique]
+        for index in indexes:
+            index.drop(engine)
+
+        print('Seeding %d notifications...' % args.rows)
+        seeded = seed(engine, args.rows, args.hosts, args.segments,
+                      seed=args.seed)
+
+        before = measure(seeded, args.repeat)
+        for index in indexes:
+            index.create(engine)
+        after = measure(seeded, args.repeat)
+    finally:
+        if tempdir:
+            os.remove(os.path.join(tempdir, 'masakari.db'))
+            os.rmdir(tempdir)
+
+    print('%-26s %16s %16s' % ('query', 'no indexes (ms)', 'indexes (ms)'))
+    for (name, before_time), (_, after_time) in zip(before, after):
+        print('%-26s %16.2f %16.2f' % (name, before_time * 1000,
+                                       after_time * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+# Copyright 2017 NTT DATA
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark of the recovery workflows against a fake nova.
+
+Runs the host, instance and process failure recovery of the taskflow driver
+against :class:`masakari.tests.benchmark.fake_nova.FakeNovaAPI` and reports
+the wall time, the number of nova calls and the peak memory allocated by
+every recovery::
+
+    python -m masakari.tests.benchmark.recovery --instances 10 100 1000 \\
+        --latency 0.05 --jitter 0.2 --evacuation-time 2
+
+Nothing is stored in the database, the recovery runs without a notification.
+"""
+
+import argparse
+import collections
+import json
+import resource
+import sys
+
+try:
+    import tracemalloc
+except ImportError:
+    # python 2, the peak memory is the maximum resident set size instead.
+    tracemalloc = None
+
+import eventlet
+import mock
+from oslo_utils import timeutils
+
+from masakari.compute import nova
+import masakari.conf
+from masakari import context as masakari_context
+from masakari.engine.drivers.taskflow import driver
+from masakari.objects import fields
+from masakari.tests.benchmark import fake_nova
+
+
+CONF = masakari.conf.CONF
+
+FAILED_HOST = 'failed-host'
+COMPUTE_HOSTS = ['compute-1', 'compute-2']
+RESERVED_HOST = 'reserved-host'
+
+SCENARIOS = ('host_failure_auto', 'host_failure_reserved_host',
+             'instance_failure', 'process_failure')
+
+
+class ReservedHost(object):
+    """Stand-in for the Host object of a reserved host."""
+
+    def __init__(self, name):
+        self.name = name
+        self.reserved = True
+
+    def save(self):
+        pass
+
+
+def _host_failure(recovery_method):
+    def _run(taskflow_driver, novaclient, context, instance_count,
+             concurrency):
+        novaclient.add_host(FAILED_HOST, instance_count, state='down')
+        for host_name in COMPUTE_HOSTS:
+            novaclient.add_host(host_name)
+        reserved_host_list = None
+        if recovery_method == (
+                fields.FailoverSegmentRecoveryMethod.RESERVED_HOST):
+            novaclient.add_host(RESERVED_HOST, status='disabled')
+            reserved_host_list = [ReservedHost(RESERVED_HOST)]
+
+        def _recover():
+            taskflow_driver.execute_host_failure(
+                context, FAILED_HOST, recovery_method, None,
+                reserved_host_list=reserved_host_list)
+        return _recover
+    return _run
+
+
+def _instance_failure(taskflow_driver, novaclient, context, instance_count,
+                      concurrency):
+    # Every instance of the host fails, the notifications are processed
+    # concurrently as masakari-engine would.
+    novaclient.add_host(COMPUTE_HOSTS[0], instance_count)
+    instance_ids = novaclient.get_instance_ids(COMPUTE_HOSTS[0])
+
+    def _recover():
+        pool = eventlet.GreenPool(concurrency)
+        for instance_id in instance_ids:
+            pool.spawn_n(taskflow_driver.execute_instance_failure, context,
+                         instance_id, None)
+        pool.waitall()
+    return _recover
+
+
+def _process_failure(taskflow_driver, novaclient, context, instance_count,
+                     concurrency):
+    novaclient.add_host(COMPUTE_HOSTS[0], instance_count)
+
+    def _recover():
+        taskflow_driver.execute_process_failure(
+            context, 'nova-compute', COMPUTE_HOSTS[0], None)
+    return _recover
+
+
+_SCENARIOS = {
+    'host_failure_auto': _host_failure(
+        fields.FailoverSegmentRecoveryMethod.AUTO),
+    'host_failure_reserved_host': _host_failure(
+        fields.FailoverSegmentRecoveryMethod.RESERVED_HOST),
+    'instance_failure': _instance_failure,
+    'process_failure': _process_failure,
+}
+
+
+def run_scenario(scenario, instance_count, concurrency=10, **nova_kwargs):
+    """Runs the recovery of a scenario and measures it.
+
+    :param scenario: One of SCENARIOS.
+    :param instance_count: Number of instances on the failed host.
+    :param concurrency: Number of instance failures recovered concurrently.
+    :param nova_kwargs: Arguments of the FakeNovaAPI modelling nova.
+    :returns: Dict with the scenario, instance_count, wall_time in seconds,
+        nova_calls by call name, peak_memory in bytes and the error, if any,
+        raised by the recovery.
+    """
+    novaclient = fake_nova.FakeNovaAPI(**nova_kwargs)
+    context = masakari_context.get_admin_context()
+    taskflow_driver = driver.TaskFlowDriver()
+    recover = _SCENARIOS[scenario](taskflow_driver, novaclient, context,
+                                   instance_count, concurrency)
+
+    error = None
+    if tracemalloc:
+        tracemalloc.start()
+    watch = timeutils.StopWatch()
+    try:
+        with mock.patch.object(nova, 'API', return_value=novaclient):
+            watch.start()
+            recover()
+    except Exception as exc:
+        error = '%s: %s' % (type(exc).__name__, exc)
+    finally:
+        watch.stop()
+        if tracemalloc:
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        else:
+            peak_memory = resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    return {
+        'scenario': scenario,
+        'instance_count': instance_count,
+        'wall_time': watch.elapsed(),
+        'nova_calls': dict(novaclient.call_counts),
+        'peak_memory': peak_memory,
+        'error': error,
+    }
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the recovery workflows against a fake nova.')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS,
+                        default=list(SCENARIOS))
+    parser.add_argument('--instances', nargs='+', type=int,
+                        default=[10, 100, 1000],
+                        help='Numbers of instances per host to run every '
+                             'scenario with.')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='Seconds taken by every nova call.')
+    parser.add_argument('--jitter', type=float, default=0.2,
+                        help='Fraction of the latency by which it randomly '
+                             'varies.')
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help='Probability of every nova call to fail.')
+    parser.add_argument('--call-latency', action='append', default=[],
+                        metavar='CALL=SECONDS',
+                        help='Latency of a single nova call.')
+    parser.add_argument('--call-failure-rate', action='append', default=[],
+                        metavar='CALL=RATE',
+                        help='Failure rate of a single nova call.')
+    parser.add_argument('--evacuation-time', type=float, default=2.0,
+                        help='Seconds after which an evacuated instance is '
+                             'on its new host.')
+    parser.add_argument('--evacuation-pool-size', type=int, default=None,
+                        help="Overrides '[host_failure] "
+                             "evacuation_pool_size'.")
+    parser.add_argument('--concurrency', type=int, default=10,
+                        help='Number of instance failures recovered '
+                             'concurrently.')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', action='store_true',
+                        help='Print the results as JSON.')
+    return parser.parse_args(argv)
+
+
+def _parse_call_values(values):
+    result = {}
+    for value in values:
+        name, _, number = value.partition('=')
+        result[name] = float(number)
+    return result
+
+
+def _print_results(results):
+    print('%-28s %9s %10s %10s %12s  %s' % (
+        'scenario', 'instances', 'wall (s)', 'nova calls', 'peak (KiB)',
+        'error'))
+    for result in results:
+        print('%-28s %9d %10.2f %10d %12d  %s' % (
+            result['scenario'], result['instance_count'],
+            result['wall_time'], sum(result['nova_calls'].values()),
+            result['peak_memory'] // 1024, result['error'] or ''))
+
+    calls = collections.Counter()
+    for result in results:
+        calls.update(result['nova_calls'])
+    print('\nnova calls: %s' % ', '.join(
+        '%s=%d' % item for item in sorted(calls.items())))
+
+
+def main(argv=None):
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    CONF([], project='masakari')
+    CONF.set_override('service_update_wait_mode', 'poll', 'host_failure')
+    if args.evacuation_pool_size:
+        CONF.set_override('evacuation_pool_size', args.evacuation_pool_size,
+                          'host_failure')
+
+    nova_kwargs = {
+        'latency': args.latency,
+        'jitter': args.jitter,
+        'failure_rate': args.failure_rate,
+        'latencies': _parse_call_values(args.call_latency),
+        'failure_rates': _parse_call_values(args.call_failure_rate),
+        'evacuation_time': args.evacuation_time,
+        'seed': args.seed,
+    }
+    results = [run_scenario(scenario, instance_count,
+                            concurrency=args.concurrency, **nova_kwargs)
+               for scenario in args.scenarios
+               for instance_count in args.instances]
+
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        _print_results(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -20,6 +20,7 @@ import mock
 from oslo_serialization import jsonutils
 from oslo_utils import timeutils
 from six.moves import http_client as http
+import six.moves.urllib.parse as urlparse
 from webob import exc
 
 from masakari.api.openstack.ha import notifications
@@ -32,6 +33,7 @@ from masakari import test
 from masakari.tests.unit.api.openstack import fakes
 from masakari.tests.unit.objects import test_objects
 from masakari.tests import uuidsentinel
+from masakari import utils
 
 NOW = timeutils.utcnow().replace(microsecond=0)
 
@@ -110,6 +112,44 @@ class NotificationTestCase(test.TestCase):
         self._assert_notification_data(NOTIFICATION_LIST,
                                        _make_notifications_list(result))
 
+    @mock.patch.object(ha_api.NotificationAPI, 'get_all')
+    def test_index_next_link(self, mock_get_all):
+        mock_get_all.return_value = notification_obj.NotificationList(
+            objects=NOTIFICATION_LIST.objects)
+        req = fakes.HTTPRequest.blank('/v1/notifications?limit=2',
+                                      use_admin_context=True, version='1.1')
+
+        result = self.controller.index(req)
+
+        next_link = result['notifications_links'][0]
+        self.assertEqual('next', next_link['rel'])
+        params = urlparse.parse_qs(urlparse.urlsplit(next_link['href']).query)
+        self.assertEqual(
+            {'created_at': utils.strtime(NOW), 'id': 2},
+            utils.decode_pagination_cursor(params['marker'][0]))
+
+    @mock.patch.object(ha_api.NotificationAPI, 'get_all')
+    def test_index_without_next_link(self, mock_get_all):
+        mock_get_all.return_value = notification_obj.NotificationList(
+            objects=NOTIFICATION_LIST.objects)
+        req = fakes.HTTPRequest.blank('/v1/notifications',
+                                      use_admin_context=True, version='1.1')
+
+        result = self.controller.index(req)
+
+        self.assertNotIn('notifications_links', result)
+
+    @mock.patch.object(ha_api.NotificationAPI, 'get_all')
+    def test_index_next_link_before_v1_1(self, mock_get_all):
+        mock_get_all.return_value = notification_obj.NotificationList(
+            objects=NOTIFICATION_LIST.objects)
+        req = fakes.HTTPRequest.blank('/v1/notifications?limit=2',
+                                      use_admin_context=True, version='1.0')
+
+        result = self.controller.index(req)
+
+        self.assertNotIn('notifications_links', result)
+
     @ddt.data(
         # limit negative
         "limit=-1",
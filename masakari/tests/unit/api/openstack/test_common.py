@@ -17,6 +17,8 @@
 Test suites for 'common' code used throughout the OpenStack HTTP API.
 """
 
+import datetime
+
 import mock
 from testtools import matchers
 import webob
@@ -25,6 +27,7 @@ from masakari.api.openstack import common
 from masakari import test
 from masakari.tests.unit.api.openstack import fakes
 from masakari.tests import uuidsentinel
+from masakari import utils
 
 
 class MiscFunctionsTest(test.TestCase):
@@ -141,6 +144,28 @@ class TestCollectionLinks(test.NoDBTestCase):
                                                mock.sentinel.coll_key)
         self.assertThat(results, matchers.HasLength(1))
 
+    @mock.patch('masakari.api.openstack.common.ViewBuilder._get_next_link')
+    def test_items_with_sort_keys(self, href_link_mock):
+        created_at = datetime.datetime(2017, 1, 1)
+        items = [
+            {"uuid": "123", "id": 1, "name": "fake",
+             "created_at": created_at}
+        ]
+        req = mock.MagicMock()
+        params = mock.PropertyMock(return_value=dict(limit=1))
+        type(req).params = params
+
+        builder = common.ViewBuilder()
+        results = builder._get_collection_links(req, items,
+                                                mock.sentinel.coll_key,
+                                                sort_keys=['name'])
+
+        cursor = href_link_mock.call_args[0][1]
+        self.assertEqual({'name': 'fake', 'id': 1,
+                          'created_at': utils.strtime(created_at)},
+                         utils.decode_pagination_cursor(cursor))
+        self.assertThat(results, matchers.HasLength(1))
+
 
 class LinkPrefixTest(test.NoDBTestCase):
 
@@ -0,0 +1,72 @@
+# Copyright 2016 NTT DATA
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import datetime
+
+import mock
+from oslo_config import cfg
+
+from masakari.cmd import manage
+from masakari.db import api as db_api
+from masakari import test
+
+# masakari-manage registers its command categories when it is imported, the
+# other tests parse the config without any.
+manage.CONF.unregister_opt(cfg.SubCommandOpt('category'))
+
+
+@mock.patch('time.sleep')
+class DbCommandsTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(DbCommandsTestCase, self).setUp()
+        self.commands = manage.DbCommands()
+
+    @mock.patch.object(db_api, 'purge_rows')
+    def test_purge(self, mock_purge_rows, mock_sleep):
+        mock_purge_rows.side_effect = [
+            {'notifications': 2, 'evacuations': 3},
+            {'notifications': 1, 'evacuations': 0},
+            {'hosts': 1},
+            {}]
+
+        with mock.patch('six.moves.builtins.print') as mock_print:
+            self.commands.purge('2017-01-01T10:00:00+01:00', 2, 0.1)
+
+        before = datetime.datetime(2017, 1, 1, 9, 0, 0)
+        self.assertEqual(4, mock_purge_rows.call_count)
+        for call in mock_purge_rows.call_args_list:
+            self.assertEqual((before, 2), call[0][1:])
+        self.assertEqual([mock.call(0.1)] * 3, mock_sleep.call_args_list)
+        mock_print.assert_has_calls([
+            mock.call('Deleted 3 rows from evacuations.'),
+            mock.call('Deleted 1 rows from hosts.'),
+            mock.call('Deleted 3 rows from notifications.')])
+
+    @mock.patch.object(db_api, 'archive_rows', return_value={})
+    def test_archive_without_before(self, mock_archive_rows, mock_sleep):
+        self.commands.archive(None, 1000, 0)
+
+        mock_archive_rows.assert_called_once_with(mock.ANY, None, 1000)
+        self.assertFalse(mock_sleep.called)
+
+    @mock.patch.object(db_api, 'purge_rows')
+    def test_purge_invalid_before(self, mock_purge_rows, mock_sleep):
+        self.assertRaises(SystemExit, self.commands.purge, 'yesterday',
+                          1000, 0)
+        self.assertFalse(mock_purge_rows.called)
+
+    @mock.patch.object(db_api, 'archive_rows')
+    def test_archive_invalid_batch_size(self, mock_archive_rows, mock_sleep):
+        self.assertRaises(SystemExit, self.commands.archive, None, 0, 0)
+        self.assertFalse(mock_archive_rows.called)
@@ -12,11 +12,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
 import mock
 from six.moves import http_client as http
 
 from keystoneauth1 import exceptions as keystone_exception
 from novaclient import exceptions as nova_exception
+from oslo_utils import fixture as utils_fixture
+from oslo_utils import timeutils
 
 from masakari.compute import nova
 from masakari import context
@@ -42,6 +45,10 @@ class NovaClientTestCase(test.TestCase):
         self.override_config('os_privileged_user_auth_url',
                              'http://keystonehost/identity_admin')
 
+        # start every test with an empty client cache.
+        nova._CLIENT_CACHE.clear()
+        self.addCleanup(nova._CLIENT_CACHE.clear)
+
     @mock.patch('novaclient.api_versions.APIVersion')
     @mock.patch('novaclient.client.Client')
     @mock.patch('keystoneauth1.loading.get_plugin_loader')
@@ -113,6 +120,138 @@ class NovaClientTestCase(test.TestCase):
             insecure=False, endpoint_type='publicURL', cacert=None,
             timeout=None, extensions=nova.nova_extensions)
 
+    @mock.patch('novaclient.api_versions.APIVersion')
+    @mock.patch('novaclient.client.Client')
+    @mock.patch('keystoneauth1.loading.get_plugin_loader')
+    @mock.patch('keystoneauth1.session.Session')
+    def test_nova_client_is_reused(self, p_session, p_plugin_loader,
+                                   p_client, p_api_version):
+        client_obj = nova.novaclient(self.ctx)
+        self.assertIs(client_obj, nova.novaclient(self.ctx))
+
+        # keystone session and nova client are built only once.
+        self.assertEqual(1, p_session.call_count)
+        self.assertEqual(1, p_client.call_count)
+        self.assertEqual({'size': 1, 'hits': 1, 'misses': 1},
+                         nova.get_client_cache_stats())
+
+    @mock.patch('novaclient.api_versions.APIVersion')
+    @mock.patch('novaclient.client.Client')
+    @mock.patch('keystoneauth1.loading.get_plugin_loader')
+    @mock.patch('keystoneauth1.session.Session')
+    def test_nova_client_cache_keyed_by_region(self, p_session,
+                                               p_plugin_loader, p_client,
+                                               p_api_version):
+        nova.novaclient(self.ctx)
+        self.override_config('os_region_name', 'farfaraway')
+        nova.novaclient(self.ctx)
+
+        self.assertEqual(2, p_client.call_count)
+        self.assertEqual({'size': 2, 'hits': 0, 'misses': 2},
+                         nova.get_client_cache_stats())
+
+    @mock.patch('novaclient.api_versions.APIVersion')
+    @mock.patch('novaclient.client.Client')
+    @mock.patch('keystoneauth1.loading.get_plugin_loader')
+    @mock.patch('keystoneauth1.session.Session')
+    def test_nova_client_cache_key_hides_credentials(self, p_session,
+                                                     p_plugin_loader,
+                                                     p_client,
+                                                     p_api_version):
+        nova.novaclient(self.ctx)
+
+        self.assertNotIn('strongpassword',
+                         repr(list(nova._CLIENT_CACHE._clients)))
+
+    def test_nova_client_cache_returns_client_cached_first(self):
+        created = []
+
+        def fake_create():
+            # let the other green threads ask for the same client
+            eventlet.sleep(0)
+            created.append(mock.Mock())
+            return created[-1]
+
+        pool = eventlet.GreenPool()
+        results = list(pool.imap(
+            lambda _: nova._CLIENT_CACHE.get_or_create(('key',),
+                                                       fake_create),
+            range(5)))
+
+        # only the first client built is cached and used by every caller.
+        self.assertEqual([created[0]] * 5, results)
+        self.assertEqual(1, nova.get_client_cache_stats()['size'])
+        self.assertIs(created[0],
+                      nova._CLIENT_CACHE.get_or_create(('key',), fake_create))
+
+    def test_nova_client_cache_create_doesnt_block_other_clients(self):
+        cached_client = nova._CLIENT_CACHE.get_or_create(('cached',),
+                                                         mock.Mock)
+        creating = eventlet.event.Event()
+        created = eventlet.event.Event()
+
+        def fake_create():
+            creating.send()
+            created.wait()
+            return mock.Mock()
+
+        thread = eventlet.spawn(nova._CLIENT_CACHE.get_or_create, ('new',),
+                                fake_create)
+        creating.wait()
+
+        # the cached client is returned while the other one is built.
+        self.assertIs(cached_client,
+                      nova._CLIENT_CACHE.get_or_create(('cached',),
+                                                       mock.Mock))
+        created.send()
+        thread.wait()
+        self.assertEqual({'size': 2, 'hits': 1, 'misses': 2},
+                         nova.get_client_cache_stats())
+
+    @mock.patch('keystoneauth1.loading.get_plugin_loader')
+    @mock.patch('keystoneauth1.session.Session')
+    def test_nova_client_connection_pool_size(self, p_session,
+                                              p_plugin_loader):
+        self.override_config('nova_api_pool_size', 20)
+        nova.novaclient(self.ctx)
+
+        http_session = p_session.call_args[1]['session']
+        adapter = http_session.get_adapter('https://novahost')
+        self.assertEqual(20, adapter._pool_maxsize)
+
+    @mock.patch('novaclient.api_versions.discover_version')
+    @mock.patch('novaclient.client.Client')
+    @mock.patch('keystoneauth1.loading.get_plugin_loader')
+    @mock.patch('keystoneauth1.session.Session')
+    def test_nova_client_microversion_negotiation(self, p_session,
+                                                  p_plugin_loader, p_client,
+                                                  p_discover_version):
+        nova.novaclient(self.ctx,
+                        api_version=nova.NOVA_FORCE_DOWN_API_VERSION)
+        p_discover_version.assert_called_once_with(
+            p_client.return_value, mock.ANY)
+        self.assertEqual(nova.NOVA_FORCE_DOWN_API_VERSION,
+                         p_discover_version.call_args[0][1].get_string())
+
+        # default microversion client is cached separately.
+        nova.novaclient(self.ctx)
+        self.assertEqual(2, p_client.call_count)
+        self.assertEqual(1, p_discover_version.call_count)
+
+    @mock.patch('novaclient.api_versions.discover_version')
+    @mock.patch('novaclient.client.Client')
+    @mock.patch('keystoneauth1.loading.get_plugin_loader')
+    @mock.patch('keystoneauth1.session.Session')
+    def test_nova_client_microversion_unsupported(self, p_session,
+                                                  p_plugin_loader, p_client,
+                                                  p_discover_version):
+        p_discover_version.side_effect = nova_exception.UnsupportedVersion()
+        self.assertRaises(nova_exception.UnsupportedVersion,
+                          nova.novaclient, self.ctx,
+                          api_version=nova.NOVA_FORCE_DOWN_API_VERSION)
+        # client which doesn't support the microversion is not cached.
+        self.assertEqual(0, nova.get_client_cache_stats()['size'])
+
 
 class NovaApiTestCase(test.TestCase):
     def setUp(self):
@@ -120,6 +259,10 @@ class NovaApiTestCase(test.TestCase):
         self.api = nova.API()
         self.ctx = context.get_admin_context()
 
+        # start every test with an empty aggregate cache.
+        nova._AGGREGATE_CACHE.clear()
+        self.addCleanup(nova._AGGREGATE_CACHE.clear)
+
     @mock.patch('masakari.compute.nova.novaclient')
     def test_get_server(self, mock_novaclient):
         server_id = uuidsentinel.fake_server
@@ -165,6 +308,41 @@ class NovaApiTestCase(test.TestCase):
         mock_servers.list.assert_called_once_with(
             detailed=True, search_opts={'host': 'fake', 'all_tenants': True})
 
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_get_servers_by_uuids(self, mock_novaclient):
+        mock_servers = mock.MagicMock()
+        mock_servers.list.side_effect = [
+            [mock.Mock(id=uuidsentinel.fake_server_1)], []]
+        mock_novaclient.return_value = mock.MagicMock(servers=mock_servers)
+        servers = self.api.get_servers_by_uuids(
+            self.ctx, [uuidsentinel.fake_server_1,
+                       uuidsentinel.fake_server_2],
+            changes_since='2017-01-01T00:00:00Z')
+
+        self.assertEqual([uuidsentinel.fake_server_1],
+                         [server.id for server in servers])
+        # nova filters the servers, they are never all listed.
+        mock_servers.list.assert_has_calls([
+            mock.call(detailed=True, search_opts={
+                'all_tenants': True,
+                'uuid': uuidsentinel.fake_server_1,
+                'changes-since': '2017-01-01T00:00:00Z'}),
+            mock.call(detailed=True, search_opts={
+                'all_tenants': True,
+                'uuid': uuidsentinel.fake_server_2,
+                'changes-since': '2017-01-01T00:00:00Z'})])
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_get_servers_by_uuids_without_changes_since(self,
+                                                        mock_novaclient):
+        mock_servers = mock.MagicMock()
+        mock_novaclient.return_value = mock.MagicMock(servers=mock_servers)
+        self.api.get_servers_by_uuids(self.ctx, [uuidsentinel.fake_server_1])
+
+        mock_servers.list.assert_called_once_with(
+            detailed=True, search_opts={
+                'all_tenants': True, 'uuid': uuidsentinel.fake_server_1})
+
     @mock.patch('masakari.compute.nova.novaclient')
     def test_enable_disable_service_enable(self, mock_novaclient):
         host = 'fake'
@@ -208,6 +386,37 @@ class NovaApiTestCase(test.TestCase):
         mock_services.list.assert_called_once_with(binary='nova-compute',
                                                    host='fake')
 
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_get_service(self, mock_novaclient):
+        host = 'fake'
+        mock_services = mock.MagicMock()
+        mock_novaclient.return_value = mock.MagicMock(services=mock_services)
+        service = self.api.get_service(self.ctx, host)
+
+        mock_novaclient.assert_called_once_with(self.ctx)
+        mock_services.list.assert_called_once_with(host=host,
+                                                   binary='nova-compute')
+        self.assertEqual(mock_services.list.return_value[0], service)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_force_down_service(self, mock_novaclient):
+        host = 'fake'
+        mock_services = mock.MagicMock()
+        mock_novaclient.return_value = mock.MagicMock(services=mock_services)
+        self.api.force_down_service(self.ctx, host)
+
+        mock_novaclient.assert_called_once_with(
+            self.ctx, api_version=nova.NOVA_FORCE_DOWN_API_VERSION)
+        mock_services.force_down.assert_called_once_with(
+            host, 'nova-compute', force_down=True)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_force_down_service_unsupported_version(self, mock_novaclient):
+        mock_novaclient.side_effect = nova_exception.UnsupportedVersion()
+
+        self.assertRaises(exception.MasakariException,
+                          self.api.force_down_service, self.ctx, 'fake')
+
     @mock.patch('masakari.compute.nova.novaclient')
     def test_evacuate_instance(self, mock_novaclient):
         uuid = uuidsentinel.fake_server
@@ -239,6 +448,25 @@ class NovaApiTestCase(test.TestCase):
         mock_novaclient.assert_called_once_with(self.ctx)
         mock_servers.start.assert_called_once_with(uuidsentinel.fake_server)
 
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_get_flavor(self, mock_novaclient):
+        mock_flavors = mock.MagicMock()
+        mock_novaclient.return_value = mock.MagicMock(flavors=mock_flavors)
+        self.api.get_flavor(self.ctx, uuidsentinel.fake_flavor)
+
+        mock_novaclient.assert_called_once_with(self.ctx)
+        mock_flavors.get.assert_called_once_with(uuidsentinel.fake_flavor)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_get_hypervisors(self, mock_novaclient):
+        mock_hypervisors = mock.MagicMock()
+        mock_novaclient.return_value = mock.MagicMock(
+            hypervisors=mock_hypervisors)
+        self.api.get_hypervisors(self.ctx)
+
+        mock_novaclient.assert_called_once_with(self.ctx)
+        mock_hypervisors.list.assert_called_once_with(detailed=True)
+
     @mock.patch('masakari.compute.nova.novaclient')
     def test_get_aggregate_list(self, mock_novaclient):
         mock_aggregates = mock.MagicMock()
@@ -249,6 +477,99 @@ class NovaApiTestCase(test.TestCase):
         mock_novaclient.assert_called_once_with(self.ctx)
         self.assertTrue(mock_aggregates.list.called)
 
+    def _fake_aggregates(self):
+        return [mock.MagicMock(id=1, hosts=['host-1', 'host-2']),
+                mock.MagicMock(id=2, hosts=['host-2']),
+                mock.MagicMock(id=3, hosts=None)]
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_get_aggregates_for_host(self, mock_novaclient):
+        mock_aggregates = mock.MagicMock()
+        mock_aggregates.list.return_value = self._fake_aggregates()
+        mock_novaclient.return_value = mock.MagicMock(
+            aggregates=mock_aggregates)
+
+        self.assertEqual(
+            [1, 2], [aggregate.id for aggregate in
+                     self.api.get_aggregates_for_host(self.ctx, 'host-2')])
+        self.assertEqual(
+            [1], [aggregate.id for aggregate in
+                  self.api.get_aggregates_for_host(self.ctx, 'host-1')])
+        self.assertEqual(
+            [], self.api.get_aggregates_for_host(self.ctx, 'host-3'))
+
+        # aggregate list is fetched once and reused within the ttl.
+        mock_aggregates.list.assert_called_once_with()
+        self.assertEqual({'hosts': 2, 'hits': 2, 'misses': 1},
+                         nova.get_aggregate_cache_stats())
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_get_aggregates_for_host_ttl_expired(self, mock_novaclient):
+        mock_aggregates = mock.MagicMock()
+        mock_aggregates.list.return_value = self._fake_aggregates()
+        mock_novaclient.return_value = mock.MagicMock(
+            aggregates=mock_aggregates)
+        self.override_config('nova_aggregate_cache_ttl', 60)
+        now = timeutils.utcnow()
+        self.useFixture(utils_fixture.TimeFixture(now))
+
+        self.api.get_aggregates_for_host(self.ctx, 'host-1')
+        timeutils.advance_time_seconds(61)
+        self.api.get_aggregates_for_host(self.ctx, 'host-1')
+
+        self.assertEqual(2, mock_aggregates.list.call_count)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_get_aggregates_for_host_cache_disabled(self, mock_novaclient):
+        mock_aggregates = mock.MagicMock()
+        mock_aggregates.list.return_value = self._fake_aggregates()
+        mock_novaclient.return_value = mock.MagicMock(
+            aggregates=mock_aggregates)
+        self.override_config('nova_aggregate_cache_ttl', 0)
+
+        self.api.get_aggregates_for_host(self.ctx, 'host-1')
+        self.api.get_aggregates_for_host(self.ctx, 'host-1')
+
+        self.assertEqual(2, mock_aggregates.list.call_count)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_get_aggregates_for_host_invalidate(self, mock_novaclient):
+        mock_aggregates = mock.MagicMock()
+        mock_aggregates.list.return_value = self._fake_aggregates()
+        mock_novaclient.return_value = mock.MagicMock(
+            aggregates=mock_aggregates)
+
+        self.api.get_aggregates_for_host(self.ctx, 'host-1')
+        nova.invalidate_aggregate_cache()
+        self.api.get_aggregates_for_host(self.ctx, 'host-1')
+
+        self.assertEqual(2, mock_aggregates.list.call_count)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_add_host_to_aggregate_updates_cache(self, mock_novaclient):
+        aggregates = self._fake_aggregates()
+        mock_aggregates = mock.MagicMock()
+        mock_aggregates.list.return_value = aggregates
+        mock_novaclient.return_value = mock.MagicMock(
+            aggregates=mock_aggregates)
+
+        updated_aggregate = mock.MagicMock(
+            id=1, hosts=['host-1', 'host-2', 'reserved-host'])
+        mock_aggregates.add_host.return_value = updated_aggregate
+
+        self.api.get_aggregates_for_host(self.ctx, 'reserved-host')
+        self.api.add_host_to_aggregate(self.ctx, 'reserved-host',
+                                       aggregates[0])
+
+        self.assertEqual(
+            [updated_aggregate],
+            self.api.get_aggregates_for_host(self.ctx, 'reserved-host'))
+        # the other hosts of the aggregate see its new hosts too.
+        self.assertEqual(
+            [aggregates[1], updated_aggregate],
+            self.api.get_aggregates_for_host(self.ctx, 'host-2'))
+        mock_aggregates.list.assert_called_once_with()
+
     @mock.patch('masakari.compute.nova.novaclient')
     def test_add_host_to_aggregate(self, mock_novaclient):
         mock_aggregate = mock.MagicMock()
@@ -12,13 +12,18 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 """Unit tests for the DB API."""
+import datetime
+
+import mock
 from oslo_utils import timeutils
 
 from masakari import context
 from masakari import db
+from masakari.db.sqlalchemy import api as db_api
 from masakari import exception
 from masakari import test
 from masakari.tests import uuidsentinel
+from masakari import utils
 
 NOW = timeutils.utcnow().replace(microsecond=0)
 
@@ -345,7 +350,11 @@ class NotificationsTestCase(test.TestCase, ModelsObjectComparatorMixin):
             'source_host_uuid': uuidsentinel.source_host,
             'type': 'fake_type',
             'payload': 'fake_payload',
-            'status': 'new'
+            'status': 'new',
+            'owner': None,
+            'lease_expires_at': None,
+            'payload_hash': None,
+            'failover_segment_id': None
         }
 
     def _get_fake_values_list(self):
@@ -395,7 +404,11 @@ class NotificationsTestCase(test.TestCase, ModelsObjectComparatorMixin):
                    'source_host_uuid': uuidsentinel.source_host,
                    'type': 'updated_type',
                    'payload': 'updated_payload',
-                   'status': 'new'}
+                   'status': 'new',
+                   'owner': None,
+                   'lease_expires_at': None,
+                   'payload_hash': None,
+                   'failover_segment_id': None}
         ignored_keys = ['deleted', 'created_at', 'updated_at', 'deleted_at',
                         'id']
         self._create_notification(self._get_fake_values())
@@ -427,6 +440,38 @@ class NotificationsTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self._assertEqualListsOfObjects([notifications[1]],
                                         real_notification, ignored_keys)
 
+    def test_notification_get_all_by_filters_with_cursor(self):
+        notifications = [self._create_notification(p)
+                         for p in self._get_fake_values_list()]
+        ignored_keys = ['deleted', 'created_at', 'updated_at', 'deleted_at',
+                        'id']
+        cursor = utils.encode_pagination_cursor(
+            {'generated_time': notifications[0].generated_time,
+             'created_at': notifications[0].created_at,
+             'id': notifications[0].id})
+
+        with mock.patch.object(db_api, 'model_query',
+                               wraps=db_api.model_query) as mock_query:
+            real_notification = db.notifications_get_all_by_filters(
+                context=self.ctxt, marker=cursor, limit=1,
+                sort_keys=['generated_time', 'id'], sort_dirs=['asc', 'asc'])
+
+        # no separate query for the marker row
+        self.assertEqual(1, mock_query.call_count)
+        self._assertEqualListsOfObjects([notifications[1]],
+                                        real_notification, ignored_keys)
+
+    def test_notification_get_all_by_filters_invalid_cursor(self):
+        cursor = utils.encode_pagination_cursor({'id': 1})
+
+        self.assertRaises(exception.InvalidInput,
+                          db.notifications_get_all_by_filters,
+                          context=self.ctxt, marker=cursor,
+                          sort_keys=['generated_time'])
+        self.assertRaises(exception.InvalidInput,
+                          db.notifications_get_all_by_filters,
+                          context=self.ctxt, marker='invalid')
+
     def test_notification_not_found(self):
         self._create_notification(self._get_fake_values())
         self.assertRaises(exception.NotificationNotFound,
@@ -447,3 +492,439 @@ class NotificationsTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.assertRaises(exception.InvalidSortKey,
                           db.notifications_get_all_by_filters,
                           context=self.ctxt, sort_keys=['invalid_sort_key'])
+
+    def test_notification_claim(self):
+        self._create_notification(self._get_fake_values())
+
+        notification = db.notification_claim(
+            self.ctxt, uuidsentinel.notification, 'engine-1', 60)
+
+        self.assertEqual('running', notification.status)
+        self.assertEqual('engine-1', notification.owner)
+        self.assertGreater(notification.lease_expires_at, timeutils.utcnow())
+
+    def test_notification_claim_already_claimed(self):
+        self._create_notification(self._get_fake_values())
+        db.notification_claim(self.ctxt, uuidsentinel.notification,
+                              'engine-1', 60)
+
+        self.assertRaises(exception.NotificationAlreadyClaimed,
+                          db.notification_claim, self.ctxt,
+                          uuidsentinel.notification, 'engine-2', 60)
+        notification = db.notification_get_by_uuid(
+            self.ctxt, uuidsentinel.notification)
+        self.assertEqual('engine-1', notification.owner)
+
+    def test_notification_claim_finished(self):
+        values = self._get_fake_values()
+        values['status'] = 'finished'
+        self._create_notification(values)
+
+        self.assertRaises(exception.NotificationAlreadyClaimed,
+                          db.notification_claim, self.ctxt,
+                          uuidsentinel.notification, 'engine-1', 60)
+
+    def test_notification_claim_not_found(self):
+        self.assertRaises(exception.NotificationNotFound,
+                          db.notification_claim, self.ctxt,
+                          uuidsentinel.notification, 'engine-1', 60)
+
+    def test_notification_claim_expired_lease(self):
+        values = self._get_fake_values()
+        values.update(status='running', owner='engine-1',
+                      lease_expires_at=NOW - datetime.timedelta(seconds=1))
+        self._create_notification(values)
+
+        notification = db.notification_claim(
+            self.ctxt, uuidsentinel.notification, 'engine-2', 60)
+
+        self.assertEqual('engine-2', notification.owner)
+        self.assertEqual('running', notification.status)
+
+    def _create_host_in_segment(self):
+        db.failover_segment_create(self.ctxt, {
+            'uuid': uuidsentinel.failover_segment_id,
+            'name': 'fake_segment_name', 'service_type': 'fake_service_type',
+            'recovery_method': 'auto'})
+        db.host_create(self.ctxt, {
+            'uuid': uuidsentinel.source_host, 'name': 'fake_host_name',
+            'type': 'fake_type', 'control_attributes': 'fake_control_attr',
+            'failover_segment_id': uuidsentinel.failover_segment_id})
+
+    def test_notification_create_records_failover_segment(self):
+        self._create_host_in_segment()
+        values = self._get_fake_values()
+        del values['failover_segment_id']
+
+        notification = self._create_notification(values)
+
+        self.assertEqual(uuidsentinel.failover_segment_id,
+                         notification.failover_segment_id)
+
+    def test_is_failover_segment_under_recovery(self):
+        self._create_host_in_segment()
+        values = self._get_fake_values()
+        del values['failover_segment_id']
+        self._create_notification(values)
+        filters = {'status': ['new', 'running', 'error']}
+
+        self.assertTrue(db.is_failover_segment_under_recovery(
+            self.ctxt, uuidsentinel.failover_segment_id, filters=filters))
+        self.assertFalse(db.is_failover_segment_under_recovery(
+            self.ctxt, uuidsentinel.other_segment_id, filters=filters))
+
+        db.notification_update(self.ctxt, uuidsentinel.notification,
+                               {'status': 'finished'})
+        self.assertFalse(db.is_failover_segment_under_recovery(
+            self.ctxt, uuidsentinel.failover_segment_id, filters=filters))
+        self.assertTrue(db.is_failover_segment_under_recovery(
+            self.ctxt, uuidsentinel.failover_segment_id))
+
+    def test_notification_duplicate_exists(self):
+        values = dict(self._get_fake_values(), payload_hash='fake_hash')
+        self._create_notification(values)
+        since = NOW - datetime.timedelta(seconds=180)
+
+        self.assertTrue(db.notification_duplicate_exists(
+            self.ctxt, uuidsentinel.source_host, 'fake_type', 'fake_hash',
+            since))
+        self.assertFalse(db.notification_duplicate_exists(
+            self.ctxt, uuidsentinel.source_host, 'fake_type', 'other_hash',
+            since))
+        self.assertFalse(db.notification_duplicate_exists(
+            self.ctxt, uuidsentinel.source_host, 'fake_type', 'fake_hash',
+            NOW + datetime.timedelta(seconds=1)))
+
+        db.notification_update(self.ctxt, uuidsentinel.notification,
+                               {'status': 'finished'})
+        self.assertFalse(db.notification_duplicate_exists(
+            self.ctxt, uuidsentinel.source_host, 'fake_type', 'fake_hash',
+            since))
+
+    def test_notification_renew_lease(self):
+        self._create_notification(self._get_fake_values())
+        claimed = db.notification_claim(self.ctxt, uuidsentinel.notification,
+                                        'engine-1', 1)
+
+        db.notification_renew_lease(self.ctxt, uuidsentinel.notification,
+                                    'engine-1', 60)
+
+        notification = db.notification_get_by_uuid(
+            self.ctxt, uuidsentinel.notification)
+        self.assertGreater(notification.lease_expires_at,
+                           claimed.lease_expires_at)
+        self.assertRaises(exception.NotificationAlreadyClaimed,
+                          db.notification_renew_lease, self.ctxt,
+                          uuidsentinel.notification, 'engine-2', 60)
+
+    def test_notification_release(self):
+        self._create_notification(self._get_fake_values())
+        db.notification_claim(self.ctxt, uuidsentinel.notification,
+                              'engine-1', 60)
+
+        self.assertRaises(exception.NotificationAlreadyClaimed,
+                          db.notification_release, self.ctxt,
+                          uuidsentinel.notification, 'engine-2',
+                          {'status': 'finished'})
+        notification = db.notification_release(
+            self.ctxt, uuidsentinel.notification, 'engine-1',
+            {'status': 'finished'})
+
+        self.assertEqual('finished', notification.status)
+        self.assertIsNone(notification.owner)
+        self.assertIsNone(notification.lease_expires_at)
+
+    def test_notifications_get_all_by_lease_expires_before(self):
+        expired = self._get_fake_values()
+        expired.update(status='running', owner='engine-1',
+                       lease_expires_at=NOW - datetime.timedelta(seconds=1))
+        self._create_notification(expired)
+        valid = self._get_fake_values()
+        valid.update(notification_uuid=uuidsentinel.notification_2,
+                     status='running', owner='engine-2',
+                     lease_expires_at=NOW + datetime.timedelta(seconds=60))
+        self._create_notification(valid)
+
+        notifications = db.notifications_get_all_by_filters(
+            self.ctxt, filters={'status': 'running',
+                                'lease-expires-before': NOW})
+
+        self.assertEqual([uuidsentinel.notification],
+                         [n.notification_uuid for n in notifications])
+
+    def test_notifications_get_all_by_lease_expires_after(self):
+        expired = self._get_fake_values()
+        expired.update(status='running', owner='engine-1',
+                       lease_expires_at=NOW - datetime.timedelta(seconds=1))
+        self._create_notification(expired)
+        valid = self._get_fake_values()
+        valid.update(notification_uuid=uuidsentinel.notification_2,
+                     status='running', owner='engine-2',
+                     lease_expires_at=NOW + datetime.timedelta(seconds=60))
+        self._create_notification(valid)
+
+        notifications = db.notifications_get_all_by_filters(
+            self.ctxt, filters={'status': 'running',
+                                'lease-expires-after': NOW})
+
+        self.assertEqual([uuidsentinel.notification_2],
+                         [n.notification_uuid for n in notifications])
+
+    def test_notifications_count_by_filters(self):
+        for notification_uuid, status in (
+                (uuidsentinel.notification_1, 'new'),
+                (uuidsentinel.notification_2, 'error'),
+                (uuidsentinel.notification_3, 'finished')):
+            values = self._get_fake_values()
+            values.update(notification_uuid=notification_uuid, status=status)
+            self._create_notification(values)
+
+        self.assertEqual(2, db.notifications_count_by_filters(
+            self.ctxt, filters={'status': ['new', 'error']}))
+        self.assertEqual(3, db.notifications_count_by_filters(self.ctxt))
+
+    def test_notifications_expire_leases(self):
+        lease_expires_at = NOW + datetime.timedelta(seconds=60)
+        owners = {uuidsentinel.notification_1: 'engine-1',
+                  uuidsentinel.notification_2: None,
+                  uuidsentinel.notification_3: 'engine-2'}
+        for notification_uuid, owner in owners.items():
+            values = self._get_fake_values()
+            values.update(notification_uuid=notification_uuid,
+                          status='running', owner=owner,
+                          lease_expires_at=lease_expires_at)
+            self._create_notification(values)
+        finished = self._get_fake_values()
+        finished.update(status='finished', owner='engine-1')
+        self._create_notification(finished)
+
+        self.assertEqual(2, db.notifications_expire_leases(self.ctxt,
+                                                           'engine-1'))
+
+        notifications = db.notifications_get_all_by_filters(
+            self.ctxt, filters={'lease-expires-before': timeutils.utcnow()})
+        self.assertEqual(sorted([uuidsentinel.notification_1,
+                                 uuidsentinel.notification_2]),
+                         sorted(n.notification_uuid for n in notifications))
+
+
+class EvacuationsTestCase(test.TestCase, ModelsObjectComparatorMixin):
+
+    def setUp(self):
+        super(EvacuationsTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+
+    def _get_fake_values_list(self):
+        return [
+            {'notification_uuid': uuidsentinel.notification_1,
+             'instance_uuid': uuidsentinel.instance_1,
+             'status': 'evacuating'},
+            {'notification_uuid': uuidsentinel.notification_1,
+             'instance_uuid': uuidsentinel.instance_2,
+             'status': 'error'},
+            {'notification_uuid': uuidsentinel.notification_2,
+             'instance_uuid': uuidsentinel.instance_1,
+             'status': 'evacuated'}]
+
+    def _create_evacuation(self, values):
+        return db.evacuation_create(self.ctxt, values)
+
+    def test_evacuation_create(self):
+        values = self._get_fake_values_list()[0]
+        evacuation = self._create_evacuation(values)
+        self.assertIsNotNone(evacuation['id'])
+        ignored_keys = ['deleted', 'created_at', 'updated_at', 'deleted_at',
+                        'id']
+        self._assertEqualObjects(evacuation, values, ignored_keys)
+
+    def test_evacuations_get_all_by_notification(self):
+        evacuations = [self._create_evacuation(p)
+                       for p in self._get_fake_values_list()]
+        real_evacuations = db.evacuations_get_all_by_notification(
+            self.ctxt, uuidsentinel.notification_1)
+        self._assertEqualListsOfObjects(evacuations[:2], real_evacuations)
+
+    def test_evacuation_update(self):
+        [self._create_evacuation(p) for p in self._get_fake_values_list()]
+        evacuation = db.evacuation_update(
+            self.ctxt, uuidsentinel.notification_1, uuidsentinel.instance_1,
+            {'status': 'evacuated'})
+        self.assertEqual('evacuated', evacuation['status'])
+
+        # the evacuation of the instance for other notifications is
+        # not updated.
+        statuses = [e['status'] for e in
+                    db.evacuations_get_all_by_notification(
+                        self.ctxt, uuidsentinel.notification_2)]
+        self.assertEqual(['evacuated'], statuses)
+
+    def test_evacuation_not_found(self):
+        self.assertRaises(exception.EvacuationNotFound,
+                          db.evacuation_update, self.ctxt,
+                          uuidsentinel.notification_1,
+                          uuidsentinel.instance_1, {'status': 'evacuated'})
+
+
+class PurgeArchiveRowsTestCase(test.TestCase):
+
+    def setUp(self):
+        super(PurgeArchiveRowsTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+        self.old = NOW - datetime.timedelta(days=30)
+        self.before = NOW - datetime.timedelta(days=1)
+
+    def _create_notification(self, name, status, created_at):
+        return db.notification_create(self.ctxt, {
+            'notification_uuid': getattr(uuidsentinel, name),
+            'generated_time': created_at, 'created_at': created_at,
+            'source_host_uuid': uuidsentinel.source_host,
+            'type': 'fake_type', 'payload': 'fake_payload',
+            'status': status})
+
+    def _create_segment_with_host(self, name):
+        db.failover_segment_create(self.ctxt, {
+            'uuid': getattr(uuidsentinel, name), 'name': name,
+            'service_type': 'fake_service_type', 'recovery_method': 'auto'})
+        db.host_create(self.ctxt, {
+            'uuid': getattr(uuidsentinel, name + '_host'),
+            'name': name + '_host', 'type': 'fake_type',
+            'control_attributes': 'fake_control_attr',
+            'failover_segment_id': getattr(uuidsentinel, name)})
+
+    def _get_notification_uuids(self, table_name='notifications'):
+        engine = db_api.get_engine()
+        return sorted(row[0] for row in engine.execute(
+            'SELECT notification_uuid FROM %s' % table_name))
+
+    def test_purge_rows(self):
+        self._create_notification('old_finished', 'finished', self.old)
+        for instance in ('instance_1', 'instance_2'):
+            db.evacuation_create(self.ctxt, {
+                'notification_uuid': uuidsentinel.old_finished,
+                'instance_uuid': getattr(uuidsentinel, instance),
+                'status': 'evacuated'})
+        self._create_notification('old_running', 'running', self.old)
+        self._create_notification('new_finished', 'finished', NOW)
+
+        # the evacuations are purged before their notification.
+        self.assertEqual({'evacuations': 2},
+                         db.purge_rows(self.ctxt, self.before, 10))
+        self.assertEqual({'notifications': 1},
+                         db.purge_rows(self.ctxt, self.before, 10))
+        self.assertEqual({}, db.purge_rows(self.ctxt, self.before, 10))
+
+        self.assertEqual(sorted([uuidsentinel.old_running,
+                                 uuidsentinel.new_finished]),
+                         self._get_notification_uuids())
+        self.assertEqual([], self._get_notification_uuids('evacuations'))
+
+    def test_purge_rows_in_batches(self):
+        for name in ('finished', 'ignored', 'failed'):
+            self._create_notification(name, name, self.old)
+
+        self.assertEqual({'notifications': 2},
+                         db.purge_rows(self.ctxt, self.before, 2))
+        self.assertEqual({'notifications': 1},
+                         db.purge_rows(self.ctxt, self.before, 2))
+        self.assertEqual({}, db.purge_rows(self.ctxt, self.before, 2))
+
+    def test_purge_rows_evacuations_in_batches(self):
+        self._create_notification('old_finished', 'finished', self.old)
+        for instance in ('instance_1', 'instance_2', 'instance_3'):
+            db.evacuation_create(self.ctxt, {
+                'notification_uuid': uuidsentinel.old_finished,
+                'instance_uuid': getattr(uuidsentinel, instance),
+                'status': 'evacuated'})
+
+        self.assertEqual({'evacuations': 2},
+                         db.purge_rows(self.ctxt, self.before, 2))
+        self.assertEqual({'evacuations': 1},
+                         db.purge_rows(self.ctxt, self.before, 2))
+        self.assertEqual({'notifications': 1},
+                         db.purge_rows(self.ctxt, self.before, 2))
+        self.assertEqual({}, db.purge_rows(self.ctxt, self.before, 2))
+
+    def test_purge_rows_soft_deleted_hosts_and_segments(self):
+        self._create_segment_with_host('segment_1')
+        self._create_segment_with_host('segment_2')
+        db.failover_segment_delete(self.ctxt, uuidsentinel.segment_2)
+
+        # rows deleted after the given date are kept.
+        self.assertEqual({}, db.purge_rows(self.ctxt, self.before, 10))
+
+        # the segment is only purged once its host is.
+        self.assertEqual({'hosts': 1}, db.purge_rows(self.ctxt, None, 10))
+        self.assertEqual({'failover_segments': 1},
+                         db.purge_rows(self.ctxt, None, 10))
+        self.assertEqual({}, db.purge_rows(self.ctxt, None, 10))
+
+        self.assertEqual(uuidsentinel.segment_1_host,
+                         db.host_get_by_name(self.ctxt,
+                                             'segment_1_host').uuid)
+        self.assertRaises(exception.FailoverSegmentNotFound,
+                          db.failover_segment_get_by_uuid, self.ctxt,
+                          uuidsentinel.segment_2)
+
+    def test_archive_rows(self):
+        self._create_notification('old_finished', 'finished', self.old)
+        db.evacuation_create(self.ctxt, {
+            'notification_uuid': uuidsentinel.old_finished,
+            'instance_uuid': uuidsentinel.instance_1, 'status': 'evacuated'})
+        self._create_notification('new', 'new', NOW)
+
+        self.assertEqual({'evacuations': 1},
+                         db.archive_rows(self.ctxt, None, 10))
+        self.assertEqual({'notifications': 1},
+                         db.archive_rows(self.ctxt, None, 10))
+        self.assertEqual({}, db.archive_rows(self.ctxt, None, 10))
+
+        self.assertEqual([uuidsentinel.new], self._get_notification_uuids())
+        self.assertEqual([uuidsentinel.old_finished],
+                         self._get_notification_uuids('shadow_notifications'))
+        self.assertEqual([uuidsentinel.old_finished],
+                         self._get_notification_uuids('shadow_evacuations'))
+        engine = db_api.get_engine()
+        self.assertEqual('finished', engine.execute(
+            'SELECT status FROM shadow_notifications').scalar())
+
+
+class LocksTestCase(test.TestCase):
+
+    def setUp(self):
+        super(LocksTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+
+    def test_lock_acquire(self):
+        self.assertTrue(db.lock_acquire(self.ctxt, 'fake-lock', 'owner-1',
+                                        60))
+        self.assertFalse(db.lock_acquire(self.ctxt, 'fake-lock', 'owner-2',
+                                         60))
+        self.assertTrue(db.lock_acquire(self.ctxt, 'other-lock', 'owner-2',
+                                        60))
+
+    def test_lock_acquire_expired_lease(self):
+        self.assertTrue(db.lock_acquire(self.ctxt, 'fake-lock', 'owner-1',
+                                        -1))
+        self.assertTrue(db.lock_acquire(self.ctxt, 'fake-lock', 'owner-2',
+                                        60))
+        self.assertFalse(db.lock_renew(self.ctxt, 'fake-lock', 'owner-1',
+                                       60))
+
+    def test_lock_renew(self):
+        db.lock_acquire(self.ctxt, 'fake-lock', 'owner-1', -1)
+
+        self.assertTrue(db.lock_renew(self.ctxt, 'fake-lock', 'owner-1', 60))
+        self.assertFalse(db.lock_acquire(self.ctxt, 'fake-lock', 'owner-2',
+                                         60))
+
+    def test_lock_release(self):
+        db.lock_acquire(self.ctxt, 'fake-lock', 'owner-1', 60)
+
+        # releasing a lock held by another owner doesn't release it.
+        db.lock_release(self.ctxt, 'fake-lock', 'owner-2')
+        self.assertFalse(db.lock_acquire(self.ctxt, 'fake-lock', 'owner-2',
+                                         60))
+
+        db.lock_release(self.ctxt, 'fake-lock', 'owner-1')
+        self.assertTrue(db.lock_acquire(self.ctxt, 'fake-lock', 'owner-2',
+                                        60))
@@ -12,6 +12,7 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
 import logging
 import os
 
@@ -20,6 +21,7 @@ from migrate.versioning import repository
 from oslo_db.sqlalchemy import test_base
 from oslo_db.sqlalchemy import test_migrations
 from oslo_db.sqlalchemy import utils as oslodbutils
+from oslo_serialization import jsonutils
 import sqlalchemy
 from sqlalchemy.engine import reflection
 import sqlalchemy.exc
@@ -28,6 +30,7 @@ from masakari.db.sqlalchemy import migrate_repo
 from masakari.db.sqlalchemy import migration as sa_migration
 from masakari.db.sqlalchemy import models
 from masakari.tests import fixtures as masakari_fixtures
+from masakari import utils
 
 
 class MasakariMigrationsCheckers(test_migrations.WalkVersionsMixin):
@@ -176,6 +179,99 @@ class MasakariMigrationsCheckers(test_migrations.WalkVersionsMixin):
         for table in [failover_segments, hosts]:
             self.assertTrue(table.c.created_at.nullable)
 
+    def _check_006(self, engine, data):
+        self.assertColumnExists(engine, 'evacuations', 'notification_uuid')
+        self.assertColumnExists(engine, 'evacuations', 'instance_uuid')
+        self.assertColumnExists(engine, 'evacuations', 'status')
+        self.assertIndexMembers(engine, 'evacuations',
+                                'evacuations_notification_uuid_idx',
+                                ['notification_uuid'])
+
+    def _check_007(self, engine, data):
+        self.assertColumnExists(engine, 'notifications', 'owner')
+        self.assertColumnExists(engine, 'notifications', 'lease_expires_at')
+
+    def _check_008(self, engine, data):
+        self.assertColumnExists(engine, 'locks', 'name')
+        self.assertColumnExists(engine, 'locks', 'owner')
+        self.assertColumnExists(engine, 'locks', 'expires_at')
+
+    def _pre_upgrade_009(self, engine):
+        notifications = oslodbutils.get_table(engine, 'notifications')
+        payloads = {1: '{"instance_uuid": "fake", "event": "LIFECYCLE"}',
+                    2: '{"event": "STOPPED", "host_status": "NORMAL"}'}
+        engine.execute(notifications.insert(), [
+            {'id': id, 'notification_uuid': 'fake-uuid-%d' % id,
+             'generated_time': datetime.datetime(2017, 1, 1),
+             'type': 'VM', 'status': 'new',
+             'source_host_uuid': 'fake-host-uuid', 'payload': payload}
+            for id, payload in payloads.items()])
+        return payloads
+
+    def _check_009(self, engine, data):
+        self.assertColumnExists(engine, 'notifications', 'payload_hash')
+        self.assertIndexMembers(engine, 'notifications',
+                                'notifications_host_type_payload_hash_idx',
+                                ['source_host_uuid', 'type', 'payload_hash',
+                                 'generated_time'])
+        notifications = oslodbutils.get_table(engine, 'notifications')
+        rows = dict(engine.execute(sqlalchemy.select([
+            notifications.c.id, notifications.c.payload_hash]).where(
+            notifications.c.id.in_(list(data)))).fetchall())
+        self.assertEqual(
+            {id: utils.notification_payload_hash(jsonutils.loads(payload))
+             for id, payload in data.items()},
+            rows)
+
+    def _check_010(self, engine, data):
+        self.assertIndexMembers(engine, 'notifications',
+                                'notifications_status_lease_expires_at_idx',
+                                ['status', 'lease_expires_at'])
+
+    def _pre_upgrade_011(self, engine):
+        segments = oslodbutils.get_table(engine, 'failover_segments')
+        hosts = oslodbutils.get_table(engine, 'hosts')
+        notifications = oslodbutils.get_table(engine, 'notifications')
+        engine.execute(segments.insert(), {
+            'id': 1, 'uuid': 'fake-segment-uuid', 'name': 'fake-segment',
+            'service_type': 'compute', 'recovery_method': 'auto',
+            'deleted': 0})
+        engine.execute(hosts.insert(), {
+            'id': 1, 'uuid': 'fake-host-uuid', 'name': 'fake-host',
+            'type': 'COMPUTE', 'control_attributes': 'SSH',
+            'failover_segment_id': 'fake-segment-uuid', 'deleted': 0})
+        for id, host_uuid in [(11, 'fake-host-uuid'),
+                              (12, 'fake-unknown-host-uuid')]:
+            engine.execute(notifications.insert(), {
+                'id': id, 'notification_uuid': 'fake-uuid-%d' % id,
+                'generated_time': datetime.datetime(2017, 1, 1),
+                'type': 'VM', 'status': 'new', 'payload': '{}',
+                'source_host_uuid': host_uuid})
+        return {'segmented_id': 11, 'unsegmented_id': 12}
+
+    def _check_011(self, engine, data):
+        self.assertColumnExists(engine, 'notifications',
+                                'failover_segment_id')
+        self.assertIndexMembers(
+            engine, 'notifications',
+            'notifications_failover_segment_id_status_idx',
+            ['failover_segment_id', 'status'])
+        notifications = oslodbutils.get_table(engine, 'notifications')
+        rows = dict(engine.execute(sqlalchemy.select([
+            notifications.c.id,
+            notifications.c.failover_segment_id])).fetchall())
+        self.assertEqual('fake-segment-uuid', rows[data['segmented_id']])
+        self.assertIsNone(rows[data['unsegmented_id']])
+
+    def _check_012(self, engine, data):
+        for table_name in ['failover_segments', 'hosts', 'notifications',
+                           'evacuations']:
+            table = oslodbutils.get_table(engine, table_name)
+            shadow_table = oslodbutils.get_table(engine,
+                                                 'shadow_' + table_name)
+            self.assertEqual(sorted(table.columns.keys()),
+                             sorted(shadow_table.columns.keys()))
+
 
 class TestMasakariMigrationsSQLite(MasakariMigrationsCheckers,
                                    test_base.DbTestCase):
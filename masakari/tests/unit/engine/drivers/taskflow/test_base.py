@@ -0,0 +1,76 @@
+# Copyright 2017 NTT DATA
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit Tests for the listeners of recovery workflows
+"""
+
+import taskflow.engines
+from taskflow.patterns import linear_flow
+
+from masakari.engine.drivers.taskflow import base
+from masakari import test
+
+
+class FakeTask(base.MasakariTask):
+    def execute(self):
+        pass
+
+
+class FailingTask(base.MasakariTask):
+    def execute(self):
+        raise Exception("fake failure")
+
+
+class TimingListenerTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TimingListenerTestCase, self).setUp()
+        base.reset_timing_stats()
+        self.addCleanup(base.reset_timing_stats)
+
+    def _run_flow(self, *tasks):
+        flow = linear_flow.Flow('fake_flow').add(*tasks)
+        flow_engine = taskflow.engines.load(flow)
+        with base.TimingListener(flow_engine, 'VM'):
+            flow_engine.run()
+
+    def test_durations_recorded(self):
+        self._run_flow(FakeTask())
+        self._run_flow(FakeTask())
+
+        stats = base.get_timing_stats()
+        self.assertEqual(2, stats['task'][FakeTask.make_name()]['count'])
+        self.assertEqual(2, stats['flow']['fake_flow']['count'])
+        self.assertEqual(2, stats['notification_type']['VM']['count'])
+        for key in ('p50', 'p95', 'p99', 'max'):
+            self.assertGreaterEqual(stats['flow']['fake_flow'][key], 0.0)
+
+    def test_failed_task_duration_recorded(self):
+        self.assertRaises(Exception, self._run_flow, FailingTask())
+
+        stats = base.get_timing_stats()
+        self.assertEqual(1, stats['task'][FailingTask.make_name()]['count'])
+
+    def test_percentiles(self):
+        base._TIMING_SAMPLES['flow']['fake_flow'].extend(
+            float(duration) for duration in range(100, 0, -1))
+
+        stats = base.get_timing_stats()['flow']['fake_flow']
+        self.assertEqual(100, stats['count'])
+        self.assertEqual(50.0, stats['p50'])
+        self.assertEqual(95.0, stats['p95'])
+        self.assertEqual(99.0, stats['p99'])
+        self.assertEqual(100.0, stats['max'])
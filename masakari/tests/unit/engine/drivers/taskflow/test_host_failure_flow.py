@@ -17,17 +17,24 @@
 Unit Tests for host failure TaskFlow
 """
 import copy
+import datetime
 
 import mock
+from oslo_utils import timeutils
+from taskflow import exceptions as taskflow_exception
 
 from masakari.compute import nova
 from masakari import conf
 from masakari import context
 from masakari.engine.drivers.taskflow import host_failure
 from masakari import exception
+from masakari.objects import evacuation as evacuation_obj
+from masakari.objects import fields
 from masakari.objects import host as host_obj
 from masakari import test
 from masakari.tests.unit import fakes
+from masakari.tests import uuidsentinel
+from masakari import utils
 
 CONF = conf.CONF
 
@@ -47,10 +54,11 @@ class HostFailureTestCase(test.TestCase):
         self.instance_host = "fake-host"
         self.novaclient = nova.API()
         self.fake_client = fakes.FakeNovaClient()
+        nova.invalidate_aggregate_cache()
+        self.addCleanup(nova.invalidate_aggregate_cache)
 
     def _verify_instance_evacuated(self):
-        for server in self.novaclient.get_servers(self.ctxt,
-                                                  self.instance_host):
+        for server in self.fake_client.servers.list():
             instance = self.novaclient.get_server(self.ctxt, server.id)
             self.assertEqual('active',
                              getattr(instance, 'OS-EXT-STS:vm_state'))
@@ -166,6 +174,104 @@ class HostFailureTestCase(test.TestCase):
         # execute ConfirmEvacuationTask
         self._test_confirm_evacuate_task(instance_list)
 
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_evacuate_instances_task_outdated_aggregate_cache(
+            self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+        self.override_config("add_reserved_host_to_aggregate",
+                             True, "host_failure")
+        self.fake_client.servers.create(id="1", host=self.instance_host,
+                                        ha_enabled=True)
+        reserved_host = fakes.create_fake_host(name="fake-reserved-host",
+                                               reserved=True)
+        self.fake_client.aggregates.create(id="1", name='fake_agg',
+                                           hosts=[self.instance_host])
+        # the aggregates are cached, then the aggregate is replaced in nova.
+        self.novaclient.get_aggregates_for_host(self.ctxt,
+                                                self.instance_host)
+        self.fake_client.aggregates.aggregates = []
+        self.fake_client.aggregates.create(id="2", name='new_agg',
+                                           hosts=[self.instance_host])
+        add_host_to_aggregate = self.novaclient.add_host_to_aggregate
+
+        def fake_add_host_to_aggregate(context, host, aggregate):
+            if self.fake_client.aggregates.get(aggregate.id) is None:
+                raise exception.NotFound()
+            add_host_to_aggregate(context, host, aggregate)
+
+        with mock.patch.object(self.novaclient, "add_host_to_aggregate",
+                               side_effect=fake_add_host_to_aggregate), \
+                mock.patch.object(host_obj.Host, "save"):
+            self._evacuate_instances(
+                {"instance_list": self.fake_client.servers.list()},
+                reserved_host=reserved_host)
+
+        self.assertIn(reserved_host.name,
+                      self.fake_client.aggregates.get('2').hosts)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_order_reserved_hosts_task(self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+
+        # create test data
+        self.fake_client.flavors.create(id="1", vcpus=2, ram=2048, disk=20)
+        self.fake_client.servers.create(id="1", host=self.instance_host,
+                                        ha_enabled=True)
+        self.fake_client.servers.create(id="2", host=self.instance_host,
+                                        ha_enabled=True)
+        small_host = fakes.create_fake_host(name="small-host", reserved=True)
+        large_host = fakes.create_fake_host(name="large-host", reserved=True)
+        unknown_host = fakes.create_fake_host(name="unknown-host",
+                                              reserved=True)
+        self.fake_client.hypervisors.create(
+            id="1", host="small-host", vcpus=2, free_ram_mb=2048,
+            free_disk_gb=20)
+        self.fake_client.hypervisors.create(
+            id="2", host="large-host", vcpus=8, vcpus_used=2,
+            free_ram_mb=8192, free_disk_gb=100)
+
+        task = host_failure.OrderReservedHostsTask(self.novaclient)
+        result = task.execute(self.ctxt, self.instance_host,
+                              [unknown_host, small_host, large_host])
+
+        self.assertEqual(
+            [large_host, small_host, unknown_host],
+            result['ordered_reserved_host_list'])
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_order_reserved_hosts_task_resources_unavailable(
+            self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+        self.fake_client.flavors.create(id="1", vcpus=2, ram=2048, disk=20)
+        self.fake_client.servers.create(id="1", host=self.instance_host,
+                                        ha_enabled=True)
+        reserved_host_list = [
+            fakes.create_fake_host(name="small-host", reserved=True),
+            fakes.create_fake_host(name="large-host", reserved=True)]
+
+        task = host_failure.OrderReservedHostsTask(self.novaclient)
+        with mock.patch.object(self.novaclient, "get_hypervisors",
+                               side_effect=exception.MasakariException):
+            result = task.execute(self.ctxt, self.instance_host,
+                                  reserved_host_list)
+
+        # the reserved hosts are tried in their db order.
+        self.assertEqual(reserved_host_list,
+                         result['ordered_reserved_host_list'])
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_order_reserved_hosts_task_no_instances(self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+        reserved_host_list = [fakes.create_fake_host(name="reserved-host",
+                                                     reserved=True)]
+
+        task = host_failure.OrderReservedHostsTask(self.novaclient)
+        result = task.execute(self.ctxt, self.instance_host,
+                              reserved_host_list)
+
+        self.assertEqual(reserved_host_list,
+                         result['ordered_reserved_host_list'])
+
     @mock.patch('masakari.compute.nova.novaclient')
     def test_evacuate_instances_task(self, _mock_novaclient):
         _mock_novaclient.return_value = self.fake_client
@@ -192,6 +298,677 @@ class HostFailureTestCase(test.TestCase):
                          instance_list['instance_list'])
             self.assertEqual(2, mock_evacuate.call_count)
 
+    @mock.patch('eventlet.sleep')
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_disable_compute_service_task_poll_mode(self, _mock_novaclient,
+                                                    mock_sleep):
+        _mock_novaclient.return_value = self.fake_client
+        self.override_config("service_update_wait_mode", "poll",
+                             "host_failure")
+
+        # create test data
+        self.fake_client.services.create("1", host=self.instance_host,
+                                         binary="nova-compute",
+                                         status="enabled", state="down")
+
+        task = host_failure.DisableComputeServiceTask(self.novaclient)
+        with mock.patch.object(
+                self.novaclient, "get_service",
+                wraps=self.novaclient.get_service) as mock_get_service:
+            task.execute(self.ctxt, self.instance_host)
+
+        # recovery continues as soon as service is disabled and down.
+        mock_get_service.assert_called_once_with(self.ctxt,
+                                                 self.instance_host)
+        mock_sleep.assert_not_called()
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_disable_compute_service_task_poll_mode_timeout(
+            self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+        self.override_config("service_update_wait_mode", "poll",
+                             "host_failure")
+        self.override_config("wait_period_after_service_update", 1)
+
+        # create test data, service is never reported as down.
+        self.fake_client.services.create("1", host=self.instance_host,
+                                         binary="nova-compute",
+                                         status="enabled", state="up")
+
+        task = host_failure.DisableComputeServiceTask(self.novaclient)
+        task.execute(self.ctxt, self.instance_host)
+
+        service = self.novaclient.get_service(self.ctxt, self.instance_host)
+        self.assertEqual('disabled', service.status)
+
+    @mock.patch('eventlet.sleep')
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_disable_compute_service_task_force_down(self, _mock_novaclient,
+                                                     mock_sleep):
+        _mock_novaclient.return_value = self.fake_client
+        self.override_config("force_down_failed_host", True, "host_failure")
+
+        task = host_failure.DisableComputeServiceTask(self.novaclient)
+        with mock.patch.object(self.novaclient, "enable_disable_service"):
+            with mock.patch.object(
+                    self.novaclient,
+                    "force_down_service") as mock_force_down_service:
+                task.execute(self.ctxt, self.instance_host)
+
+        mock_force_down_service.assert_called_once_with(self.ctxt,
+                                                        self.instance_host)
+        # no need to wait for nova to recognize the node down.
+        mock_sleep.assert_not_called()
+
+    @mock.patch('eventlet.sleep')
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_disable_compute_service_task_force_down_unsupported(
+            self, _mock_novaclient, mock_sleep):
+        _mock_novaclient.return_value = self.fake_client
+        self.override_config("force_down_failed_host", True, "host_failure")
+
+        task = host_failure.DisableComputeServiceTask(self.novaclient)
+        with mock.patch.object(self.novaclient, "enable_disable_service"):
+            with mock.patch.object(
+                    self.novaclient, "force_down_service",
+                    side_effect=exception.MasakariException()):
+                task.execute(self.ctxt, self.instance_host)
+
+        # falls back to wait for nova to recognize the node down.
+        mock_sleep.assert_called_once_with(
+            CONF.wait_period_after_service_update)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_evacuate_instances_task_reserved_host_poll_mode(
+            self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+        self.override_config("service_update_wait_mode", "poll",
+                             "host_failure")
+
+        # create test data
+        self.fake_client.servers.create(id="1", host=self.instance_host,
+                                        ha_enabled=True)
+        reserved_host = fakes.create_fake_host(name="fake-reserved-host",
+                                               reserved=True)
+        self.fake_client.services.create("1", host=reserved_host.name,
+                                         binary="nova-compute",
+                                         status="disabled", state="up")
+
+        task = host_failure.EvacuateInstancesTask(self.novaclient)
+        with mock.patch.object(host_obj.Host, "save"):
+            with mock.patch.object(
+                    self.novaclient, "get_service",
+                    wraps=self.novaclient.get_service) as mock_get_service:
+                task.execute(self.ctxt, self.instance_host,
+                             self.fake_client.servers.list(),
+                             reserved_host=reserved_host)
+
+        mock_get_service.assert_called_once_with(self.ctxt,
+                                                 reserved_host.name)
+        self._verify_instance_evacuated()
+
+    def test_group_reserved_hosts_task(self):
+        self.override_config("reserved_host_max_targets", 2, "host_failure")
+        reserved_host_list = [
+            fakes.create_fake_host(name="reserved-host-%d" % index,
+                                   reserved=True)
+            for index in range(3)]
+
+        task = host_failure.GroupReservedHostsTask(self.novaclient)
+        result = task.execute(self.ctxt, reserved_host_list)
+
+        self.assertEqual([reserved_host_list[:2], reserved_host_list[2:]],
+                         result['reserved_host_groups'])
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_evacuate_instances_to_reserved_hosts_task(self,
+                                                       _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+
+        # create test data
+        self.fake_client.flavors.create(id="1", vcpus=2, ram=2048, disk=20)
+        for instance_id in ("1", "2", "3", "4"):
+            self.fake_client.servers.create(id=instance_id,
+                                            host=self.instance_host,
+                                            ha_enabled=True)
+        reserved_hosts = [
+            fakes.create_fake_host(name="reserved-host-1", reserved=True),
+            fakes.create_fake_host(name="reserved-host-2", reserved=True)]
+        self.fake_client.hypervisors.create(
+            id="1", host="reserved-host-1", vcpus=8, free_ram_mb=8192,
+            free_disk_gb=100)
+        self.fake_client.hypervisors.create(
+            id="2", host="reserved-host-2", vcpus=8, free_ram_mb=8192,
+            free_disk_gb=100)
+
+        task = host_failure.EvacuateInstancesToReservedHostsTask(
+            self.novaclient)
+        with mock.patch.object(
+                self.novaclient,
+                "enable_disable_service") as mock_enable_disable_service, \
+                mock.patch.object(host_obj.Host, "save") as mock_save:
+            task.execute(self.ctxt, self.instance_host,
+                         self.fake_client.servers.list(), reserved_hosts)
+
+        mock_enable_disable_service.assert_has_calls(
+            [mock.call(self.ctxt, "reserved-host-1", enable=True),
+             mock.call(self.ctxt, "reserved-host-2", enable=True)],
+            any_order=True)
+        self.assertEqual(2, mock_save.call_count)
+        # instances are shared evenly between the reserved hosts.
+        hosts = [server.host for server in self.fake_client.servers.list()]
+        self.assertEqual(2, hosts.count("reserved-host-1"))
+        self.assertEqual(2, hosts.count("reserved-host-2"))
+        self._verify_instance_evacuated()
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_evacuate_instances_to_reserved_hosts_task_skips_locked_host(
+            self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+
+        # create test data
+        self.fake_client.flavors.create(id="1")
+        self.fake_client.servers.create(id="1", host=self.instance_host,
+                                        ha_enabled=True)
+        self.fake_client.servers.create(id="2", host=self.instance_host,
+                                        ha_enabled=True)
+        reserved_hosts = [
+            fakes.create_fake_host(name="locked-reserved-host",
+                                   reserved=True),
+            fakes.create_fake_host(name="reserved-host", reserved=True)]
+
+        task = host_failure.EvacuateInstancesToReservedHostsTask(
+            self.novaclient)
+
+        @utils.synchronized("locked-reserved-host")
+        def _execute():
+            task.execute(self.ctxt, self.instance_host,
+                         self.fake_client.servers.list(), reserved_hosts)
+
+        with mock.patch.object(self.novaclient, "enable_disable_service"), \
+                mock.patch.object(host_obj.Host, "save"):
+            _execute()
+
+        self.assertEqual(["reserved-host", "reserved-host"],
+                         [server.host for server in
+                          self.fake_client.servers.list()])
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_evacuate_instances_to_reserved_hosts_task_all_locked(
+            self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+        self.fake_client.servers.create(id="1", host=self.instance_host,
+                                        ha_enabled=True)
+        reserved_hosts = [fakes.create_fake_host(name="locked-reserved-host",
+                                                 reserved=True)]
+
+        task = host_failure.EvacuateInstancesToReservedHostsTask(
+            self.novaclient)
+
+        @utils.synchronized("locked-reserved-host")
+        def _execute():
+            task.execute(self.ctxt, self.instance_host,
+                         self.fake_client.servers.list(), reserved_hosts)
+
+        self.assertRaises(exception.ReservedHostsUnavailable, _execute)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_host_failure_flow_for_multiple_reserved_hosts(
+            self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+        self.override_config("reserved_host_max_targets", 2, "host_failure")
+
+        # create test data
+        self.fake_client.flavors.create(id="1")
+        self.fake_client.servers.create(id="1", host=self.instance_host,
+                                        ha_enabled=True)
+        self.fake_client.servers.create(id="2", host=self.instance_host,
+                                        ha_enabled=True)
+        self.fake_client.services.create("1", host=self.instance_host,
+                                         binary="nova-compute")
+        self.fake_client.services.create("2", host="reserved-host-1",
+                                         binary="nova-compute",
+                                         status="disabled")
+        self.fake_client.services.create("3", host="reserved-host-2",
+                                         binary="nova-compute",
+                                         status="disabled")
+        reserved_host_list = [
+            fakes.create_fake_host(name="reserved-host-1", reserved=True),
+            fakes.create_fake_host(name="reserved-host-2", reserved=True)]
+
+        flow = host_failure.get_rh_flow(
+            self.novaclient, {'context': self.ctxt,
+                              'host_name': self.instance_host,
+                              'reserved_host_list': reserved_host_list})
+        with mock.patch.object(host_obj.Host, "save"):
+            flow.run()
+
+        self.assertEqual(["reserved-host-1", "reserved-host-2"],
+                         sorted(server.host for server in
+                                self.fake_client.servers.list()))
+        self._verify_instance_evacuated()
+
+    def _create_priority_flow_test_data(self):
+        self.override_config("wait_period_after_service_update", 0)
+        self.fake_client.servers.create(id="1", host=self.instance_host,
+                                        ha_enabled=True)
+        self.fake_client.services.create("1", host=self.instance_host,
+                                         binary="nova-compute")
+        self.fake_client.services.create("2", host="reserved-host",
+                                         binary="nova-compute",
+                                         status="disabled")
+        return {'context': self.ctxt, 'host_name': self.instance_host,
+                'reserved_host_list': [
+                    fakes.create_fake_host(name="reserved-host",
+                                           reserved=True)]}
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_host_failure_flow_auto_priority_fallback(
+            self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+        process_what = self._create_priority_flow_test_data()
+        evacuate = self.fake_client.servers.evacuate
+
+        def fake_evacuate(uuid, host=None, on_shared_storage=False):
+            # nova can't find a host for the instance on its own
+            if not host:
+                raise exception.MasakariException()
+            evacuate(uuid, host=host)
+
+        flow = host_failure.get_priority_flow(
+            self.novaclient, process_what,
+            fields.FailoverSegmentRecoveryMethod.AUTO_PRIORITY)
+        patch_service = mock.patch.object(
+            self.novaclient, "enable_disable_service",
+            wraps=self.novaclient.enable_disable_service)
+        patch_get_servers = mock.patch.object(
+            self.novaclient, "get_servers",
+            wraps=self.novaclient.get_servers)
+        with patch_service as mock_service, \
+                patch_get_servers as mock_get_servers, \
+                mock.patch.object(self.fake_client.servers, "evacuate",
+                                  side_effect=fake_evacuate), \
+                mock.patch.object(host_obj.Host, "save"):
+            flow.run()
+
+        self.assertEqual("reserved-host",
+                         self.fake_client.servers.get("1").host)
+        # the failed host is disabled once, only the reserved host is
+        # enabled by the fallback.
+        self.assertEqual(
+            [mock.call(self.ctxt, self.instance_host),
+             mock.call(self.ctxt, "reserved-host", enable=True)],
+            mock_service.call_args_list)
+        # the instances are fetched again by the fallback workflow, then
+        # once by the confirmation of their evacuation.
+        self.assertEqual(3, mock_get_servers.call_count)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_host_failure_flow_auto_priority_fallback_partial_failure(
+            self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+        process_what = self._create_priority_flow_test_data()
+        self.fake_client.servers.create(id="2", host=self.instance_host,
+                                        ha_enabled=True)
+        evacuate = self.fake_client.servers.evacuate
+
+        def fake_evacuate(uuid, host=None, on_shared_storage=False):
+            # nova can only find a host for the second instance on its own
+            if not host and uuid == "1":
+                raise exception.MasakariException()
+            evacuate(uuid, host=host)
+
+        flow = host_failure.get_priority_flow(
+            self.novaclient, process_what,
+            fields.FailoverSegmentRecoveryMethod.AUTO_PRIORITY)
+        patch_get_servers = mock.patch.object(
+            self.novaclient, "get_servers",
+            wraps=self.novaclient.get_servers)
+        patch_evacuate = mock.patch.object(
+            self.fake_client.servers, "evacuate", side_effect=fake_evacuate)
+        with patch_get_servers as mock_get_servers, \
+                patch_evacuate as mock_evacuate, \
+                mock.patch.object(host_obj.Host, "save"):
+            flow.run()
+
+        # only the instance left on the failed host is evacuated by the
+        # fallback.
+        self.assertEqual("reserved-host",
+                         self.fake_client.servers.get("1").host)
+        self.assertEqual("fake-host-1",
+                         self.fake_client.servers.get("2").host)
+        self.assertEqual(3, mock_evacuate.call_count)
+        # the fallback fetches the instances left on the failed host, then
+        # the confirmation of their evacuation fetches them once.
+        self.assertEqual(3, mock_get_servers.call_count)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_host_failure_flow_rh_priority_fallback(self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+        process_what = self._create_priority_flow_test_data()
+
+        flow = host_failure.get_priority_flow(
+            self.novaclient, process_what,
+            fields.FailoverSegmentRecoveryMethod.RH_PRIORITY)
+        with mock.patch.object(
+                host_failure, "_prepare_reserved_host",
+                side_effect=exception.MasakariException), \
+                mock.patch.object(
+                    self.novaclient, "enable_disable_service",
+                    wraps=self.novaclient.enable_disable_service
+                ) as mock_service:
+            flow.run()
+
+        # the instance is evacuated by nova after the reserved host failed
+        self.assertEqual("fake-host-1",
+                         self.fake_client.servers.get("1").host)
+        mock_service.assert_called_once_with(self.ctxt, self.instance_host)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_host_failure_flow_priority_all_failed(self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+        process_what = self._create_priority_flow_test_data()
+
+        flow = host_failure.get_priority_flow(
+            self.novaclient, process_what,
+            fields.FailoverSegmentRecoveryMethod.RH_PRIORITY)
+        with mock.patch.object(
+                host_failure, "_prepare_reserved_host",
+                side_effect=exception.MasakariException), \
+                mock.patch.object(
+                    self.novaclient, "evacuate_instance",
+                    side_effect=exception.MasakariException):
+            ex = self.assertRaises(taskflow_exception.WrappedFailure,
+                                   flow.run)
+
+        # the failures of both workflows are reported.
+        self.assertIsNotNone(ex.check(exception.MasakariException))
+        self.assertIsNotNone(
+            ex.check(exception.HostRecoveryFailureException))
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def _test_host_failure_flow_priority_no_instances(
+            self, recovery_method, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+        process_what = self._create_priority_flow_test_data()
+        # the only instance has already been evacuated
+        self.fake_client.servers.get("1").host = "fake-host-1"
+
+        flow = host_failure.get_priority_flow(
+            self.novaclient, process_what, recovery_method)
+        patch_get_servers = mock.patch.object(
+            self.novaclient, "get_servers",
+            wraps=self.novaclient.get_servers)
+        with patch_get_servers as mock_get_servers:
+            self.assertRaises(exception.SkipHostRecoveryException, flow.run)
+
+        # the other workflow doesn't run as there is nothing to recover.
+        self.assertEqual(1, mock_get_servers.call_count)
+
+    def test_host_failure_flow_auto_priority_no_instances(self):
+        self._test_host_failure_flow_priority_no_instances(
+            fields.FailoverSegmentRecoveryMethod.AUTO_PRIORITY)
+
+    def test_host_failure_flow_rh_priority_no_instances(self):
+        self._test_host_failure_flow_priority_no_instances(
+            fields.FailoverSegmentRecoveryMethod.RH_PRIORITY)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_evacuate_instances_task_concurrently(self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+        self.override_config("evacuate_all_instances",
+                             True, "host_failure")
+        self.override_config("evacuation_pool_size", 3, "host_failure")
+
+        # create test data
+        self.fake_client.servers.create(id="1", host=self.instance_host)
+        self.fake_client.servers.create(id="2", host=self.instance_host,
+                                        ha_enabled=True)
+        self.fake_client.servers.create(id="3", host=self.instance_host)
+
+        # execute PrepareHAEnabledInstancesTask
+        instance_list = self._test_instance_list()
+
+        # execute EvacuateInstancesTask
+        task = host_failure.EvacuateInstancesTask(self.novaclient)
+        with mock.patch.object(fakes.FakeNovaClient.ServerManager,
+                               "evacuate") as mock_evacuate:
+            task.execute(self.ctxt, self.instance_host,
+                         instance_list['instance_list'])
+            self.assertEqual(3, mock_evacuate.call_count)
+            # HA_Enabled instance is dispatched first.
+            self.assertEqual("2", mock_evacuate.call_args_list[0][0][0])
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_evacuate_instances_task_partial_failure(self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+        self.override_config("evacuation_pool_size", 2, "host_failure")
+
+        # create test data
+        self.fake_client.servers.create(id="1", host=self.instance_host,
+                                        ha_enabled=True)
+        self.fake_client.servers.create(id="2", host=self.instance_host,
+                                        ha_enabled=True)
+        instance_list = {
+            "instance_list": self.fake_client.servers.list()
+        }
+
+        def fake_evacuate(context, uuid, target=None):
+            if uuid == "1":
+                raise exception.MasakariException()
+
+        task = host_failure.EvacuateInstancesTask(self.novaclient)
+        with mock.patch.object(self.novaclient, "evacuate_instance",
+                               side_effect=fake_evacuate) as mock_evacuate:
+            ex = self.assertRaises(exception.HostRecoveryFailureException,
+                                   task.execute, self.ctxt,
+                                   self.instance_host,
+                                   instance_list['instance_list'])
+            # the failure of one instance doesn't stop evacuation of others.
+            self.assertEqual(2, mock_evacuate.call_count)
+            self.assertIn("['1']", ex.message)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_host_failure_flow_retry_evacuates_remaining_instances(
+            self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+
+        # create ha_enabled test data
+        self.fake_client.servers.create(id=uuidsentinel.instance_1,
+                                        host=self.instance_host,
+                                        ha_enabled=True)
+        self.fake_client.servers.create(id=uuidsentinel.instance_2,
+                                        host=self.instance_host,
+                                        ha_enabled=True)
+        evacuate = self.fake_client.servers.evacuate
+
+        def fake_evacuate(context, uuid, target=None):
+            if uuid == uuidsentinel.instance_2:
+                raise exception.MasakariException()
+            evacuate(uuid)
+
+        # first attempt fails to evacuate one of the instances
+        task = host_failure.EvacuateInstancesTask(self.novaclient)
+        with mock.patch.object(self.novaclient, "evacuate_instance",
+                               side_effect=fake_evacuate):
+            self.assertRaises(exception.HostRecoveryFailureException,
+                              task.execute, self.ctxt, self.instance_host,
+                              self.fake_client.servers.list(),
+                              notification_uuid=uuidsentinel.notification)
+
+        # retry only gets the instance left on the failed host
+        task = host_failure.PrepareHAEnabledInstancesTask(self.novaclient)
+        instance_list = task.execute(
+            self.ctxt, self.instance_host,
+            notification_uuid=uuidsentinel.notification)['instance_list']
+        self.assertEqual([uuidsentinel.instance_2],
+                         [instance.id for instance in instance_list])
+
+        task = host_failure.EvacuateInstancesTask(self.novaclient)
+        with mock.patch.object(
+                self.novaclient, "evacuate_instance",
+                wraps=self.novaclient.evacuate_instance) as mock_evacuate:
+            task.execute(self.ctxt, self.instance_host, instance_list,
+                         notification_uuid=uuidsentinel.notification)
+        mock_evacuate.assert_called_once_with(
+            self.ctxt, uuidsentinel.instance_2, target=None)
+
+        task = host_failure.ConfirmEvacuationTask(self.novaclient)
+        task.execute(self.ctxt, instance_list, self.instance_host,
+                     notification_uuid=uuidsentinel.notification)
+
+        evacuations = evacuation_obj.EvacuationList.get_all_by_notification(
+            self.ctxt, uuidsentinel.notification)
+        self.assertEqual(
+            {uuidsentinel.instance_1: 'evacuating',
+             uuidsentinel.instance_2: 'evacuated'},
+            {e.instance_uuid: e.status for e in evacuations})
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_evacuate_instances_task_skips_evacuating_instances(
+            self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+
+        # create ha_enabled test data
+        for instance_id in (uuidsentinel.instance_1, uuidsentinel.instance_3):
+            self.fake_client.servers.create(id=instance_id,
+                                            host=self.instance_host,
+                                            ha_enabled=True)
+        self.fake_client.servers.create(id=uuidsentinel.instance_2,
+                                        host=self.instance_host,
+                                        ha_enabled=True,
+                                        task_state='rebuilding')
+        # a previous attempt already evacuated the first instance and
+        # nova is evacuating the second one.
+        for instance_id, status in ((uuidsentinel.instance_1, 'evacuated'),
+                                    (uuidsentinel.instance_2, 'evacuating')):
+            evacuation_obj.Evacuation(
+                context=self.ctxt, notification_uuid=uuidsentinel.notification,
+                instance_uuid=instance_id, status=status).create()
+
+        task = host_failure.PrepareHAEnabledInstancesTask(self.novaclient)
+        instance_list = task.execute(
+            self.ctxt, self.instance_host,
+            notification_uuid=uuidsentinel.notification)['instance_list']
+        self.assertEqual(
+            sorted([uuidsentinel.instance_2, uuidsentinel.instance_3]),
+            sorted(instance.id for instance in instance_list))
+
+        task = host_failure.EvacuateInstancesTask(self.novaclient)
+        with mock.patch.object(self.novaclient,
+                               "evacuate_instance") as mock_evacuate:
+            task.execute(self.ctxt, self.instance_host, instance_list,
+                         notification_uuid=uuidsentinel.notification)
+        mock_evacuate.assert_called_once_with(
+            self.ctxt, uuidsentinel.instance_3, target=None)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_evacuate_instances_task_evacuates_left_instances_again(
+            self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+
+        # nova accepted to evacuate the instance in a previous attempt
+        # which crashed, but the instance was left on the failed host.
+        self.fake_client.servers.create(id=uuidsentinel.instance_1,
+                                        host=self.instance_host,
+                                        ha_enabled=True)
+        evacuation_obj.Evacuation(
+            context=self.ctxt, notification_uuid=uuidsentinel.notification,
+            instance_uuid=uuidsentinel.instance_1,
+            status='evacuating').create()
+
+        task = host_failure.PrepareHAEnabledInstancesTask(self.novaclient)
+        instance_list = task.execute(
+            self.ctxt, self.instance_host,
+            notification_uuid=uuidsentinel.notification)['instance_list']
+        task = host_failure.EvacuateInstancesTask(self.novaclient)
+        with mock.patch.object(
+                self.novaclient, "evacuate_instance",
+                wraps=self.novaclient.evacuate_instance) as mock_evacuate:
+            task.execute(self.ctxt, self.instance_host, instance_list,
+                         notification_uuid=uuidsentinel.notification)
+
+        mock_evacuate.assert_called_once_with(
+            self.ctxt, uuidsentinel.instance_1, target=None)
+        self.assertEqual(
+            "fake-host-1",
+            self.fake_client.servers.get(uuidsentinel.instance_1).host)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_evacuate_instances_task_skips_evacuated_instances(
+            self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+
+        # create ha_enabled test data
+        for instance_id in (uuidsentinel.instance_1, uuidsentinel.instance_2):
+            self.fake_client.servers.create(id=instance_id,
+                                            host=self.instance_host,
+                                            ha_enabled=True)
+        evacuation_obj.Evacuation(
+            context=self.ctxt, notification_uuid=uuidsentinel.notification,
+            instance_uuid=uuidsentinel.instance_1,
+            status='evacuated').create()
+
+        # the instance list wasn't filtered by the prepare task.
+        task = host_failure.EvacuateInstancesTask(self.novaclient)
+        with mock.patch.object(self.novaclient,
+                               "evacuate_instance") as mock_evacuate:
+            task.execute(self.ctxt, self.instance_host,
+                         self.fake_client.servers.list(),
+                         notification_uuid=uuidsentinel.notification)
+        mock_evacuate.assert_called_once_with(
+            self.ctxt, uuidsentinel.instance_2, target=None)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_host_failure_flow_loads_evacuation_progress_once(
+            self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+        process_what = self._create_priority_flow_test_data()
+        process_what['notification_uuid'] = uuidsentinel.notification
+
+        with mock.patch.object(
+                evacuation_obj.EvacuationList, 'get_all_by_notification',
+                return_value=[]) as mock_get_all:
+            flow = host_failure.get_priority_flow(
+                self.novaclient, process_what,
+                fields.FailoverSegmentRecoveryMethod.RH_PRIORITY)
+            with mock.patch.object(
+                    host_failure, "_prepare_reserved_host",
+                    side_effect=exception.MasakariException):
+                flow.run()
+
+        # both workflows share the evacuation progress of the flow.
+        self.assertEqual("fake-host-1",
+                         self.fake_client.servers.get("1").host)
+        mock_get_all.assert_called_once_with(self.ctxt,
+                                             uuidsentinel.notification)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_evacuate_instances_task_evacuation_started_at(
+            self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+        self.fake_client.servers.create(id=uuidsentinel.instance_1,
+                                        host=self.instance_host,
+                                        ha_enabled=True)
+        # nova accepted to evacuate the instance in a previous attempt.
+        evacuation = evacuation_obj.Evacuation(
+            context=self.ctxt, notification_uuid=uuidsentinel.notification,
+            instance_uuid=uuidsentinel.instance_1, status='evacuating')
+        evacuation.create()
+
+        task = host_failure.EvacuateInstancesTask(self.novaclient)
+        later = timeutils.utcnow() + datetime.timedelta(hours=1)
+        with mock.patch.object(timeutils, 'utcnow', return_value=later):
+            result = task.execute(
+                self.ctxt, self.instance_host,
+                self.fake_client.servers.list(),
+                notification_uuid=uuidsentinel.notification)
+
+        # the instance may have been moved since the previous attempt.
+        self.assertEqual(
+            utils.isotime(timeutils.normalize_time(evacuation.created_at)),
+            result['evacuation_started_at'])
+
     @mock.patch('masakari.compute.nova.novaclient')
     def test_host_failure_flow_no_ha_enabled_instances(self, _mock_novaclient):
         _mock_novaclient.return_value = self.fake_client
@@ -224,13 +1001,14 @@ class HostFailureTestCase(test.TestCase):
         instance_list = self._evacuate_instances(
             instance_list)
 
-        def fake_get_server(context, host):
+        def fake_get_servers_by_uuids(context, uuids, changes_since=None):
             # assume that while evacuating instance goes into error state
             fake_server = copy.deepcopy(server)
             setattr(fake_server, 'OS-EXT-STS:vm_state', "error")
-            return fake_server
+            return [fake_server]
 
-        with mock.patch.object(self.novaclient, "get_server", fake_get_server):
+        with mock.patch.object(self.novaclient, "get_servers_by_uuids",
+                               fake_get_servers_by_uuids):
             # execute ConfirmEvacuationTask
             task = host_failure.ConfirmEvacuationTask(self.novaclient)
             self.assertRaises(
@@ -238,6 +1016,76 @@ class HostFailureTestCase(test.TestCase):
                 self.ctxt, instance_list['instance_list'],
                 self.instance_host)
 
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_confirm_evacuation_task_polls_once_per_interval(
+            self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+
+        # create ha_enabled test data
+        for server_id in ("1", "2", "3"):
+            self.fake_client.servers.create(id=server_id,
+                                            host=self.instance_host,
+                                            ha_enabled=True)
+        instance_list = {
+            "instance_list": self.fake_client.servers.list()
+        }
+
+        # execute EvacuateInstancesTask
+        instance_list = self._evacuate_instances(instance_list)
+
+        # execute ConfirmEvacuationTask
+        task = host_failure.ConfirmEvacuationTask(self.novaclient)
+        with mock.patch.object(
+                self.novaclient, "get_servers_by_uuids",
+                wraps=self.novaclient.get_servers_by_uuids
+        ) as mock_get_servers, mock.patch.object(
+                self.novaclient, "get_server") as mock_get_server:
+            task.execute(self.ctxt, instance_list['instance_list'],
+                         self.instance_host,
+                         evacuation_started_at=instance_list[
+                             'evacuation_started_at'])
+
+        # all the instances left the failed host, they are all confirmed
+        # in the first interval.
+        self.assertEqual(1, mock_get_servers.call_count)
+        self.assertEqual(["1", "2", "3"],
+                         sorted(mock_get_servers.call_args[0][1]))
+        self.assertEqual(
+            instance_list['evacuation_started_at'],
+            mock_get_servers.call_args[1]['changes_since'])
+        self.assertFalse(mock_get_server.called)
+        self._verify_instance_evacuated()
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_confirm_evacuation_task_instance_not_moved(
+            self, _mock_novaclient):
+        _mock_novaclient.return_value = self.fake_client
+
+        # create ha_enabled test data
+        self.fake_client.servers.create(id="1", host=self.instance_host,
+                                        ha_enabled=True)
+        self.fake_client.servers.create(id="2", host=self.instance_host,
+                                        ha_enabled=True)
+        instance_list = self.fake_client.servers.list()
+
+        # evacuate only one of the instances
+        self.fake_client.servers.evacuate("1")
+
+        task = host_failure.ConfirmEvacuationTask(self.novaclient)
+        with mock.patch.object(
+                self.novaclient, "get_servers_by_uuids",
+                wraps=self.novaclient.get_servers_by_uuids
+        ) as mock_get_servers:
+            ex = self.assertRaises(
+                exception.HostRecoveryFailureException, task.execute,
+                self.ctxt, instance_list, self.instance_host)
+
+        self.assertIn("['2']", ex.message)
+        # only the instance which left the failed host is fetched by uuid,
+        # and it isn't polled anymore once evacuated.
+        mock_get_servers.assert_called_once_with(
+            self.ctxt, ["1"], changes_since=None)
+
     @mock.patch('masakari.compute.nova.novaclient')
     def test_host_failure_flow_resized_instance(self, _mock_novaclient):
         _mock_novaclient.return_value = self.fake_client
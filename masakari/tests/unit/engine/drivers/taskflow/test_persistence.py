@@ -0,0 +1,211 @@
+# Copyright 2016 NTT DATA
+# All Rights Reserved.
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit Tests for persistence of recovery workflows
+"""
+
+import os
+
+import fixtures
+import mock
+from taskflow.patterns import linear_flow
+
+from masakari.compute import nova
+from masakari import context
+from masakari.engine.drivers.taskflow import base
+from masakari.engine.drivers.taskflow import host_failure
+from masakari.engine.drivers.taskflow import persistence
+from masakari import exception
+from masakari.objects import evacuation as evacuation_obj
+from masakari.objects import host as host_obj
+from masakari import test
+from masakari.tests.unit import fakes
+from masakari.tests import uuidsentinel
+
+
+class _Interrupted(BaseException):
+    """Raised by tasks to simulate masakari-engine being stopped."""
+
+
+class _PrepareTask(base.MasakariTask):
+    default_provides = set(["instance_list"])
+
+    def __init__(self, calls):
+        super(_PrepareTask, self).__init__(requires=["host_name"])
+        self.calls = calls
+
+    def execute(self, context, host_name):
+        self.calls.append('prepare')
+        fake_client = fakes.FakeNovaClient()
+        return {
+            "instance_list": [fake_client.servers.create(id="1",
+                                                         host=host_name)],
+        }
+
+
+class _RecoverTask(base.MasakariTask):
+    def __init__(self, calls, interrupt=False):
+        super(_RecoverTask, self).__init__(requires=["instance_list"])
+        self.calls = calls
+        self.interrupt = interrupt
+
+    def execute(self, context, instance_list):
+        self.calls.append(('recover', [instance.id for instance in
+                                       instance_list]))
+        if self.interrupt:
+            raise _Interrupted()
+
+
+class PersistenceTestCase(test.TestCase):
+
+    def setUp(self):
+        super(PersistenceTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+        tmp_dir = self.useFixture(fixtures.TempDir()).path
+        self.override_config(
+            'connection',
+            'sqlite:///%s' % os.path.join(tmp_dir, 'taskflow.sqlite'),
+            'taskflow')
+        self.addCleanup(persistence._reset_backend)
+        self.process_what = {
+            'context': self.ctxt,
+            'host_name': 'fake-host',
+            'notification_uuid': uuidsentinel.fake_notification,
+        }
+        self.calls = []
+
+    def _load(self, interrupt=False):
+        flow = linear_flow.Flow('fake_flow')
+        flow.add(_PrepareTask(self.calls),
+                 _RecoverTask(self.calls, interrupt=interrupt))
+        return persistence.load_taskflow_into_engine(
+            'fake', flow, dict(self.process_what))
+
+    def test_primitive_round_trip(self):
+        fake_client = fakes.FakeNovaClient()
+        server = fake_client.servers.create(id="1", host="fake-host",
+                                            ha_enabled=True)
+        host = fakes.create_fake_host(name="reserved-host", reserved=True)
+
+        primitive = persistence._to_primitive(
+            {'instance_list': [server], 'hosts': [[host]]})
+        result = persistence._from_primitive(primitive, self.ctxt)
+
+        self.assertEqual('1', result['instance_list'][0].id)
+        self.assertEqual('active', getattr(result['instance_list'][0],
+                                           'OS-EXT-STS:vm_state'))
+        self.assertEqual({'HA_Enabled': True},
+                         result['instance_list'][0].metadata)
+        self.assertIsInstance(result['hosts'][0][0], host_obj.Host)
+        self.assertEqual('reserved-host', result['hosts'][0][0].name)
+        self.assertEqual(self.ctxt, result['hosts'][0][0]._context)
+
+    @mock.patch('taskflow.engines.load')
+    def test_load_without_connection(self, mock_load):
+        self.override_config('connection', None, 'taskflow')
+        flow = linear_flow.Flow('fake_flow')
+
+        persistence.load_taskflow_into_engine('fake', flow, self.process_what)
+
+        mock_load.assert_called_once_with(flow, store=self.process_what)
+
+    def test_resume_interrupted_flow(self):
+        self.assertRaises(_Interrupted, self._load(interrupt=True).run)
+
+        self._load().run()
+
+        # the succeeded task is not executed again after the restart.
+        self.assertEqual(['prepare', ('recover', ['1']), ('recover', ['1'])],
+                         self.calls)
+
+    def test_finished_flow_not_resumed(self):
+        self._load().run()
+        self._load().run()
+
+        self.assertEqual(['prepare', ('recover', ['1'])] * 2, self.calls)
+
+    def test_discard_flows_when_done(self):
+        self.assertRaises(_Interrupted, self._load(interrupt=True).run)
+
+        with persistence.discard_flows_when_done(
+                uuidsentinel.fake_notification):
+            pass
+        self._load().run()
+
+        self.assertEqual(['prepare', ('recover', ['1'])] * 2, self.calls)
+
+    def test_discard_flows_kept_when_interrupted(self):
+        def _process():
+            with persistence.discard_flows_when_done(
+                    uuidsentinel.fake_notification):
+                self._load(interrupt=True).run()
+
+        self.assertRaises(_Interrupted, _process)
+        self._load().run()
+
+        self.assertEqual(['prepare', ('recover', ['1']), ('recover', ['1'])],
+                         self.calls)
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_reserved_host_flow_persisted(self, _mock_novaclient):
+        fake_client = fakes.FakeNovaClient()
+        _mock_novaclient.return_value = fake_client
+        self.override_config("wait_period_after_service_update", 0)
+        self.override_config("evacuate_all_instances", True, "host_failure")
+        fake_client.servers.create(id="1", host="fake-host")
+        fake_client.services.create("1", host="fake-host",
+                                    binary="nova-compute")
+        fake_client.services.create("2", host="reserved-host",
+                                    binary="nova-compute",
+                                    status="disabled")
+        reserved_host = fakes.create_fake_host(name="reserved-host",
+                                               reserved=True)
+        self.process_what['reserved_host_list'] = [reserved_host]
+
+        flow_engine = host_failure.get_rh_flow(nova.API(), self.process_what)
+        with mock.patch.object(host_obj.Host, "save") as mock_save:
+            flow_engine.run()
+
+        mock_save.assert_called_once_with()
+        self.assertEqual("reserved-host", fake_client.servers.get("1").host)
+        evacuations = evacuation_obj.EvacuationList.get_all_by_notification(
+            self.ctxt, uuidsentinel.fake_notification)
+        self.assertEqual(['evacuated'], [e.status for e in evacuations])
+
+    @mock.patch('masakari.compute.nova.novaclient')
+    def test_reserved_host_flow_persisted_all_hosts_failed(
+            self, _mock_novaclient):
+        fake_client = fakes.FakeNovaClient()
+        _mock_novaclient.return_value = fake_client
+        self.override_config("wait_period_after_service_update", 0)
+        self.override_config("evacuate_all_instances", True, "host_failure")
+        fake_client.servers.create(id="1", host="fake-host")
+        fake_client.services.create("1", host="fake-host",
+                                    binary="nova-compute")
+        self.process_what['reserved_host_list'] = [
+            fakes.create_fake_host(name="reserved-host-%d" % i,
+                                   reserved=True) for i in range(2)]
+
+        flow_engine = host_failure.get_rh_flow(nova.API(), self.process_what)
+        with mock.patch.object(host_failure, "_prepare_reserved_host",
+                               side_effect=exception.MasakariException
+                               ) as mock_prepare:
+            self.assertRaises(exception.MasakariException, flow_engine.run)
+
+        # every reserved host is tried once before the flow is reverted.
+        self.assertEqual(
+            ["reserved-host-0", "reserved-host-1"],
+            [c[0][3].name for c in mock_prepare.call_args_list])
@@ -0,0 +1,107 @@
+# Copyright 2016 NTT DATA
+# All Rights Reserved.
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit Tests for placement of evacuated instances on reserved hosts
+"""
+
+from masakari.engine.drivers.taskflow import placement
+from masakari import test
+
+Resources = placement.Resources
+
+
+class PlacementTestCase(test.NoDBTestCase):
+
+    def test_first_fit_decreasing(self):
+        demands = [('small', Resources(1, 512, 1)),
+                   ('large', Resources(4, 4096, 40)),
+                   ('medium', Resources(2, 2048, 20))]
+        capacities = [('host-1', Resources(4, 4096, 40)),
+                      ('host-2', Resources(4, 4096, 40))]
+
+        assignment, unplaced = placement.first_fit_decreasing(demands,
+                                                              capacities)
+
+        # largest instance is placed first and fills up host-1.
+        self.assertEqual({'large': 'host-1', 'medium': 'host-2',
+                          'small': 'host-2'}, assignment)
+        self.assertEqual([], unplaced)
+
+    def test_first_fit_decreasing_unplaced(self):
+        demands = [('small', Resources(1, 512, 1)),
+                   ('huge', Resources(8, 8192, 80))]
+        capacities = [('host-1', Resources(4, 4096, 40))]
+
+        assignment, unplaced = placement.first_fit_decreasing(demands,
+                                                              capacities)
+
+        self.assertEqual({'small': 'host-1'}, assignment)
+        self.assertEqual(['huge'], unplaced)
+
+    def test_first_fit_decreasing_no_hosts(self):
+        demands = [('small', Resources(1, 512, 1))]
+
+        assignment, unplaced = placement.first_fit_decreasing(demands, [])
+
+        self.assertEqual({}, assignment)
+        self.assertEqual(['small'], unplaced)
+
+    def test_order_hosts(self):
+        demands = [('1', Resources(2, 2048, 20)),
+                   ('2', Resources(2, 2048, 20))]
+        capacities = [('too-small', Resources(2, 2048, 20)),
+                      ('large', Resources(16, 32768, 400)),
+                      ('best-fit', Resources(4, 4096, 40)),
+                      ('empty', Resources(0, 0, 0))]
+
+        self.assertEqual(['best-fit', 'large', 'too-small', 'empty'],
+                         placement.order_hosts(demands, capacities))
+
+    def test_spread(self):
+        demands = [('1', Resources(1, 1024, 10)),
+                   ('2', Resources(4, 4096, 40)),
+                   ('3', Resources(1, 1024, 10)),
+                   ('4', Resources(2, 2048, 20))]
+        capacities = [('host-1', Resources(8, 8192, 80)),
+                      ('host-2', Resources(8, 8192, 80))]
+
+        assignment = placement.spread(demands, capacities)
+
+        # the largest instance takes as much as the three others.
+        self.assertEqual({'2': 'host-1', '4': 'host-2', '1': 'host-2',
+                          '3': 'host-2'}, assignment)
+
+    def test_spread_unknown_capacity(self):
+        demands = [('1', Resources(1, 1024, 10)),
+                   ('2', Resources(1, 1024, 10)),
+                   ('3', Resources(1, 1024, 10))]
+        capacities = [('host-1', Resources(8, 8192, 80)),
+                      ('host-2', None)]
+
+        assignment = placement.spread(demands, capacities)
+
+        self.assertEqual({'1': 'host-1', '2': 'host-2', '3': 'host-1'},
+                         assignment)
+
+    def test_spread_instance_too_large(self):
+        demands = [('1', Resources(16, 1024, 10)),
+                   ('2', Resources(1, 1024, 10))]
+        capacities = [('host-1', Resources(8, 8192, 80)),
+                      ('host-2', Resources(4, 8192, 80))]
+
+        assignment = placement.spread(demands, capacities)
+
+        self.assertEqual({'1': 'host-1', '2': 'host-1'}, assignment)
@@ -0,0 +1,77 @@
+# Copyright 2016 NTT DATA
+# All Rights Reserved.
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit Tests for polling helper of recovery tasks
+"""
+
+import mock
+
+from masakari.engine.drivers.taskflow import polling
+from masakari import test
+
+
+class PollingTestCase(test.TestCase):
+
+    def setUp(self):
+        super(PollingTestCase, self).setUp()
+        polling.reset_poll_stats()
+        self.addCleanup(polling.reset_poll_stats)
+
+    @mock.patch('eventlet.sleep')
+    def test_wait_until_condition_met(self, mock_sleep):
+        condition = mock.Mock(side_effect=[False, False, True])
+
+        self.assertTrue(polling.wait_until('fake', condition, 10))
+
+        self.assertEqual(3, condition.call_count)
+        self.assertEqual([mock.call(1), mock.call(1)],
+                         mock_sleep.call_args_list)
+        self.assertEqual({'fake': {'waits': 1, 'polls': 3, 'timeouts': 0}},
+                         polling.get_poll_stats())
+
+    @mock.patch('eventlet.sleep')
+    def test_wait_until_exponential_backoff(self, mock_sleep):
+        self.override_config('verify_backoff_factor', 2.0)
+        self.override_config('verify_max_interval', 5)
+        condition = mock.Mock(side_effect=[False] * 5 + [True])
+
+        self.assertTrue(polling.wait_until('fake', condition, 60))
+
+        self.assertEqual([1, 2, 4, 5, 5],
+                         [c[0][0] for c in mock_sleep.call_args_list])
+
+    @mock.patch('eventlet.sleep')
+    def test_wait_until_jitter_within_bounds(self, mock_sleep):
+        self.override_config('verify_interval', 2)
+        self.override_config('verify_max_interval', 4)
+        self.override_config('verify_backoff_factor', 2.0)
+        self.override_config('verify_jitter', 0.5)
+        condition = mock.Mock(side_effect=[False] * 20 + [True])
+
+        self.assertTrue(polling.wait_until('fake', condition, 60))
+
+        for call in mock_sleep.call_args_list:
+            self.assertTrue(2 <= call[0][0] <= 4)
+
+    def test_wait_until_timeout(self):
+        condition = mock.Mock(return_value=False)
+
+        self.assertFalse(polling.wait_until('fake', condition, 0.1))
+
+        stats = polling.get_poll_stats()['fake']
+        self.assertEqual(1, stats['waits'])
+        self.assertEqual(1, stats['timeouts'])
+        self.assertEqual(condition.call_count, stats['polls'])
@@ -0,0 +1,96 @@
+# Copyright 2016 NTT DATA
+# All Rights Reserved.
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Unit Tests for the recovery benchmark and its fake nova
+"""
+
+from masakari import context
+from masakari.engine.drivers.taskflow import base
+from masakari import exception
+from masakari import test
+from masakari.tests.benchmark import fake_nova
+from masakari.tests.benchmark import recovery
+
+
+class FakeNovaAPITestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(FakeNovaAPITestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+        self.novaclient = fake_nova.FakeNovaAPI(seed=1)
+        self.novaclient.add_host('fake-host', 2)
+        self.novaclient.add_host('fake-target')
+
+    def test_evacuate_instance(self):
+        instance_id = self.novaclient.get_instance_ids('fake-host')[0]
+
+        self.novaclient.evacuate_instance(self.ctxt, instance_id)
+
+        self.assertEqual('fake-target', self.novaclient.get_server(
+            self.ctxt, instance_id).host)
+        self.assertEqual(1, len(self.novaclient.get_servers(self.ctxt,
+                                                            'fake-host')))
+        self.assertEqual({'evacuate_instance': 1, 'get_server': 1,
+                          'get_servers': 1}, self.novaclient.call_counts)
+
+    def test_evacuation_time(self):
+        self.novaclient.evacuation_time = 60
+        instance_id = self.novaclient.get_instance_ids('fake-host')[0]
+
+        self.novaclient.evacuate_instance(self.ctxt, instance_id,
+                                          target='fake-target')
+
+        self.assertEqual('fake-host', self.novaclient.get_server(
+            self.ctxt, instance_id).host)
+
+    def test_failure_rate(self):
+        self.novaclient.failure_rates = {'stop_server': 1.0}
+        instance_id = self.novaclient.get_instance_ids('fake-host')[0]
+
+        self.assertRaises(exception.MasakariException,
+                          self.novaclient.stop_server, self.ctxt,
+                          instance_id)
+        self.novaclient.start_server(self.ctxt, instance_id)
+
+
+class RecoveryBenchmarkTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(RecoveryBenchmarkTestCase, self).setUp()
+        self.override_config('service_update_wait_mode', 'poll',
+                             'host_failure')
+        self.addCleanup(base.reset_timing_stats)
+
+    def test_run_scenarios(self):
+        for scenario in recovery.SCENARIOS:
+            result = recovery.run_scenario(scenario, 3)
+
+            self.assertIsNone(result['error'])
+            self.assertEqual(scenario, result['scenario'])
+            self.assertEqual(3, result['instance_count'])
+            self.assertGreater(result['peak_memory'], 0)
+            if scenario.startswith('host_failure'):
+                self.assertEqual(3, result['nova_calls']['evacuate_instance'])
+            elif scenario == 'instance_failure':
+                self.assertEqual(3, result['nova_calls']['stop_server'])
+                self.assertEqual(3, result['nova_calls']['start_server'])
+
+    def test_run_scenario_with_failing_nova(self):
+        result = recovery.run_scenario(
+            'process_failure', 1,
+            failure_rates={'enable_disable_service': 1.0})
+
+        self.assertIn('MasakariException', result['error'])
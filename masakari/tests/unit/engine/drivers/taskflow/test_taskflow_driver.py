@@ -14,6 +14,8 @@
 #    under the License.
 
 import mock
+from taskflow import exceptions as taskflow_exception
+from taskflow.types import failure
 
 from masakari import context
 from masakari.engine.drivers.taskflow import base
@@ -39,128 +41,124 @@ class TaskflowDriverTestCase(test.TestCase):
         super(TaskflowDriverTestCase, self).setUp()
         self.taskflow_driver = driver.TaskFlowDriver()
         self.ctxt = context.get_admin_context()
+        # the fake flows don't notify the listeners.
+        patcher = mock.patch.object(base, 'TimingListener')
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     @mock.patch.object(base, 'DynamicLogListener')
+    @mock.patch.object(host_failure, 'get_priority_flow')
     @mock.patch.object(host_failure, 'get_auto_flow')
     @mock.patch.object(host_failure, 'get_rh_flow')
-    def test_auto_priority_recovery_flow_auto_success(
-        self, mock_rh_flow, mock_auto_flow, mock_listener):
-        mock_auto_flow.return_value = FakeFlow
+    def _test_priority_recovery_flow(
+            self, recovery_method, mock_rh_flow, mock_auto_flow,
+            mock_priority_flow, mock_listener):
+        mock_priority_flow.return_value = FakeFlow
         FakeFlow.run = mock.Mock(return_value=None)
         self.taskflow_driver.execute_host_failure(
-            self.ctxt, 'fake_host',
-            fields.FailoverSegmentRecoveryMethod.AUTO_PRIORITY,
+            self.ctxt, 'fake_host', recovery_method,
             uuidsentinel.fake_notification, reserved_host_list=[
                 'host-1', 'host-2'])
 
-        # Ensures that 'auto' flow executes successfully
-        self.assertTrue(mock_auto_flow.called)
-        # Ensures that 'reserved_host' flow will not execute
+        # Ensures that both workflows are executed by a single flow
+        process_what = mock_priority_flow.call_args[0][1]
+        self.assertEqual(['host-1', 'host-2'],
+                         process_what['reserved_host_list'])
+        self.assertEqual(recovery_method,
+                         mock_priority_flow.call_args[0][2])
+        self.assertFalse(mock_auto_flow.called)
         self.assertFalse(mock_rh_flow.called)
 
+    def test_auto_priority_recovery_flow(self):
+        self._test_priority_recovery_flow(
+            fields.FailoverSegmentRecoveryMethod.AUTO_PRIORITY)
+
+    def test_rh_priority_recovery_flow(self):
+        self._test_priority_recovery_flow(
+            fields.FailoverSegmentRecoveryMethod.RH_PRIORITY)
+
     @mock.patch.object(base, 'DynamicLogListener')
-    @mock.patch.object(host_failure, 'get_auto_flow')
-    @mock.patch.object(host_failure, 'get_rh_flow')
-    def test_auto_priority_recovery_flow_rh_success(
-        self, mock_rh_flow, mock_auto_flow, mock_listener):
-        mock_auto_flow.return_value = FakeFlow
+    @mock.patch.object(host_failure, 'get_priority_flow')
+    def test_complete_priority_recovery_flow_failure(
+        self, mock_priority_flow, mock_listener):
+
+        mock_priority_flow.return_value = FakeFlow
         FakeFlow.run = mock.Mock(
             side_effect=exception.HostRecoveryFailureException)
-        self.taskflow_driver.execute_host_failure(
-            self.ctxt, 'fake_host',
-            fields.FailoverSegmentRecoveryMethod.AUTO_PRIORITY,
-            uuidsentinel.fake_notification, reserved_host_list=[
-                'host-1', 'host-2'])
-
-        # Ensures that 'auto' flow fails to recover instances
-        self.assertTrue(mock_auto_flow.called)
-        # Ensures that 'reserved_host' flow executes as 'auto' flow fails
-        self.assertTrue(mock_rh_flow.called)
 
-    @mock.patch.object(base, 'DynamicLogListener')
-    @mock.patch.object(host_failure, 'get_auto_flow')
-    @mock.patch.object(host_failure, 'get_rh_flow')
-    def test_rh_priority_recovery_flow_rh_success(
-        self, mock_rh_flow, mock_auto_flow, mock_listener):
-        mock_rh_flow.return_value = FakeFlow
-        FakeFlow.run = mock.Mock(return_value=None)
-        self.taskflow_driver.execute_host_failure(
-            self.ctxt, 'fake_host',
+        # Ensures that both 'reserved_host' and 'auto' workflows fail to
+        # evacuate instances
+        self.assertRaises(
+            exception.HostRecoveryFailureException,
+            self.taskflow_driver.execute_host_failure, self.ctxt, 'fake_host',
             fields.FailoverSegmentRecoveryMethod.RH_PRIORITY,
-            uuidsentinel.fake_notification, reserved_host_list=[
-                'host-1', 'host-2'])
-
-        # Ensures that 'reserved_host' flow executes successfully
-        self.assertTrue(mock_rh_flow.called)
-        # Ensures that 'auto' flow will not execute
-        self.assertFalse(mock_auto_flow.called)
+            uuidsentinel.fake_notification,
+            reserved_host_list=['host-1', 'host-2'])
 
     @mock.patch.object(base, 'DynamicLogListener')
-    @mock.patch.object(host_failure, 'get_auto_flow')
-    @mock.patch.object(host_failure, 'get_rh_flow')
-    def test_rh_priority_recovery_flow_auto_success(
-        self, mock_rh_flow, mock_auto_flow, mock_listener):
-        mock_rh_flow.return_value = FakeFlow
+    @mock.patch.object(host_failure, 'get_priority_flow')
+    def test_priority_recovery_flow_reserved_host_locked(
+        self, mock_priority_flow, mock_listener):
+
+        mock_priority_flow.return_value = FakeFlow
         FakeFlow.run = mock.Mock(
-            side_effect=exception.HostRecoveryFailureException)
-        self.taskflow_driver.execute_host_failure(
-            self.ctxt, 'fake_host',
-            fields.FailoverSegmentRecoveryMethod.RH_PRIORITY,
-            uuidsentinel.fake_notification, reserved_host_list=[
-                'host-1', 'host-2'])
+            side_effect=exception.LockAlreadyAcquired(
+                message='fake-message'))
 
-        # Ensures that 'reserved_host' flow fails to recover instances
-        self.assertTrue(mock_rh_flow.called)
-        # Ensures that 'auto' flow executes as 'reserved_host' flow fails
-        self.assertTrue(mock_auto_flow.called)
+        self.assertRaises(
+            exception.HostRecoveryFailureException,
+            self.taskflow_driver.execute_host_failure, self.ctxt, 'fake_host',
+            fields.FailoverSegmentRecoveryMethod.AUTO_PRIORITY,
+            uuidsentinel.fake_notification,
+            reserved_host_list=['host-1', 'host-2'])
 
     @mock.patch.object(base, 'DynamicLogListener')
-    @mock.patch.object(host_failure, 'get_auto_flow')
-    @mock.patch.object(host_failure, 'get_rh_flow')
-    def test_complete_auto_priority_recovery_flow_failure(
-        self, mock_rh_flow, mock_auto_flow, mock_listener):
+    @mock.patch.object(host_failure, 'get_priority_flow')
+    def test_priority_recovery_flow_both_workflows_failed(
+        self, mock_priority_flow, mock_listener):
 
-        mock_auto_flow.return_value = FakeFlow
-        mock_rh_flow.return_value = FakeFlow
+        mock_priority_flow.return_value = FakeFlow
         FakeFlow.run = mock.Mock(
-            side_effect=exception.HostRecoveryFailureException)
+            side_effect=taskflow_exception.WrappedFailure([
+                failure.Failure.from_exception(
+                    exception.HostRecoveryFailureException('fake-auto')),
+                failure.Failure.from_exception(
+                    exception.ReservedHostsUnavailable('fake-rh'))]))
 
-        # Ensures that both 'auto' and 'reserved_host' flow fails to
-        # evacuate instances
-        self.assertRaises(
+        ex = self.assertRaises(
             exception.HostRecoveryFailureException,
             self.taskflow_driver.execute_host_failure, self.ctxt, 'fake_host',
             fields.FailoverSegmentRecoveryMethod.AUTO_PRIORITY,
             uuidsentinel.fake_notification,
             reserved_host_list=['host-1', 'host-2'])
+        self.assertEqual('fake-auto; fake-rh', ex.message)
 
     @mock.patch.object(base, 'DynamicLogListener')
-    @mock.patch.object(host_failure, 'get_auto_flow')
-    @mock.patch.object(host_failure, 'get_rh_flow')
-    def test_complete_rh_priority_recovery_flow_failure(
-        self, mock_rh_flow, mock_auto_flow, mock_listener):
+    @mock.patch.object(host_failure, 'get_priority_flow')
+    def test_priority_recovery_flow_both_workflows_skipped(
+        self, mock_priority_flow, mock_listener):
 
-        mock_rh_flow.return_value = FakeFlow
-        mock_auto_flow.return_value = FakeFlow
+        mock_priority_flow.return_value = FakeFlow
         FakeFlow.run = mock.Mock(
-            side_effect=exception.HostRecoveryFailureException)
+            side_effect=taskflow_exception.WrappedFailure([
+                failure.Failure.from_exception(
+                    exception.SkipHostRecoveryException('fake-auto')),
+                failure.Failure.from_exception(
+                    exception.SkipHostRecoveryException('fake-rh'))]))
 
-        # Ensures that both 'reserved_host' and 'auto' flow fails to
-        # evacuate instances
         self.assertRaises(
-            exception.HostRecoveryFailureException,
+            exception.SkipHostRecoveryException,
             self.taskflow_driver.execute_host_failure, self.ctxt, 'fake_host',
-            fields.FailoverSegmentRecoveryMethod.RH_PRIORITY,
+            fields.FailoverSegmentRecoveryMethod.AUTO_PRIORITY,
             uuidsentinel.fake_notification,
             reserved_host_list=['host-1', 'host-2'])
 
     @mock.patch.object(base, 'DynamicLogListener')
-    @mock.patch.object(host_failure, 'get_auto_flow')
-    @mock.patch.object(host_failure, 'get_rh_flow')
-    def test_rh_priority_recovery_flow_skip_recovery(
-        self, mock_rh_flow, mock_auto_flow, mock_listener):
+    @mock.patch.object(host_failure, 'get_priority_flow')
+    def test_priority_recovery_flow_skip_recovery(
+        self, mock_priority_flow, mock_listener):
 
-        mock_rh_flow.return_value = FakeFlow
+        mock_priority_flow.return_value = FakeFlow
         FakeFlow.run = mock.Mock(
             side_effect=exception.SkipHostRecoveryException)
 
@@ -171,39 +169,36 @@ class TaskflowDriverTestCase(test.TestCase):
             uuidsentinel.fake_notification,
             reserved_host_list=['host-1', 'host-2'])
 
-        # Ensures that 'reserved_host' flow executes but skip the host
-        # recovery
-        self.assertTrue(mock_rh_flow.called)
-        # Ensures that 'auto' flow will not execute
-        self.assertFalse(mock_auto_flow.called)
-
     @mock.patch.object(base, 'DynamicLogListener')
+    @mock.patch.object(host_failure, 'get_priority_flow')
     @mock.patch.object(host_failure, 'get_auto_flow')
     @mock.patch.object(host_failure, 'get_rh_flow')
-    def test_auto_priority_recovery_flow_skip_recovery(
-        self, mock_rh_flow, mock_auto_flow, mock_listener):
-
+    def test_auto_priority_recovery_flow_reserved_hosts_not_available(
+        self, mock_rh_flow, mock_auto_flow, mock_priority_flow,
+            mock_listener):
         mock_auto_flow.return_value = FakeFlow
         FakeFlow.run = mock.Mock(
-            side_effect=exception.SkipHostRecoveryException)
+            side_effect=exception.HostRecoveryFailureException)
 
         self.assertRaises(
-            exception.SkipHostRecoveryException,
+            exception.ReservedHostsUnavailable,
             self.taskflow_driver.execute_host_failure, self.ctxt, 'fake_host',
             fields.FailoverSegmentRecoveryMethod.AUTO_PRIORITY,
-            uuidsentinel.fake_notification,
-            reserved_host_list=['host-1', 'host-2'])
+            uuidsentinel.fake_notification)
 
-        # Ensures that 'auto' flow executes but skip the host recovery
+        # Ensures that only 'auto' flow executes as there are no
+        # reserved_hosts to fall back to
         self.assertTrue(mock_auto_flow.called)
-        # Ensures that 'reserved_host' flow will not execute
         self.assertFalse(mock_rh_flow.called)
+        self.assertFalse(mock_priority_flow.called)
 
     @mock.patch.object(base, 'DynamicLogListener')
+    @mock.patch.object(host_failure, 'get_priority_flow')
     @mock.patch.object(host_failure, 'get_auto_flow')
     @mock.patch.object(host_failure, 'get_rh_flow')
     def test_rh_priority_recovery_flow_reserved_hosts_not_available(
-        self, mock_rh_flow, mock_auto_flow, mock_listener):
+        self, mock_rh_flow, mock_auto_flow, mock_priority_flow,
+            mock_listener):
 
         self.taskflow_driver.execute_host_failure(
             self.ctxt, 'fake_host',
@@ -211,7 +206,8 @@ class TaskflowDriverTestCase(test.TestCase):
             uuidsentinel.fake_notification)
 
         # Ensures that if there are no reserved_hosts for recovery
-        # 'reserved_host' flow will not execute
+        # 'reserved_host' workflow will not execute
         self.assertFalse(mock_rh_flow.called)
-        # Ensures that 'auto' flow executes as 'reserved_host' flow fails
+        self.assertFalse(mock_priority_flow.called)
+        # Ensures that 'auto' flow executes instead
         self.assertTrue(mock_auto_flow.called)
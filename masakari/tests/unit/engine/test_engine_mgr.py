@@ -13,18 +13,26 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+
+import eventlet
 import mock
+from oslo_service import loopingcall
 from oslo_utils import importutils
 from oslo_utils import timeutils
 
 import masakari.conf
 from masakari import context
+from masakari.engine import manager
+from masakari.engine import scheduler
 from masakari import exception
+from masakari import locks
 from masakari.objects import host as host_obj
 from masakari.objects import notification as notification_obj
 from masakari import test
 from masakari.tests.unit import fakes
 from masakari.tests import uuidsentinel
+from masakari import utils
 
 CONF = masakari.conf.CONF
 
@@ -36,6 +44,16 @@ class EngineManagerUnitTestCase(test.NoDBTestCase):
         super(EngineManagerUnitTestCase, self).setUp()
         self.engine = importutils.import_object(CONF.engine_manager)
         self.context = context.RequestContext()
+        # claiming notifications is covered by the db api tests.
+        for method in ('claim', 'release'):
+            patcher = mock.patch.object(notification_obj.Notification,
+                                        method)
+            setattr(self, 'mock_%s' % method, patcher.start())
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(notification_obj.NotificationList,
+                                    'count', return_value=0)
+        self.mock_count = patcher.start()
+        self.addCleanup(patcher.stop)
 
     def _fake_notification_workflow(self, exc=None):
         if exc:
@@ -100,6 +118,96 @@ class EngineManagerUnitTestCase(test.NoDBTestCase):
             self.context, notification.payload.get('instance_uuid'),
             notification.notification_uuid)
 
+    @mock.patch.object(utils, "synchronized", wraps=utils.synchronized)
+    @mock.patch("masakari.engine.drivers.taskflow."
+                "TaskFlowDriver.execute_instance_failure")
+    @mock.patch.object(notification_obj.Notification, "save")
+    def test_process_notification_type_vm_locks_instance(
+            self, mock_save, mock_instance_failure, mock_synchronized):
+        notification = self._get_vm_type_notification()
+        self.engine.process_notification(self.context,
+                                         notification=notification)
+        # the notification is claimed under the lock of its host.
+        self.assertEqual(
+            [mock.call(uuidsentinel.fake_host, blocking=True),
+             mock.call('instance-%s' % uuidsentinel.fake_ins,
+                       blocking=True)],
+            mock_synchronized.call_args_list)
+
+    @mock.patch("masakari.engine.drivers.taskflow."
+                "TaskFlowDriver.execute_instance_failure")
+    @mock.patch.object(notification_obj.Notification, "save")
+    def test_process_notification_type_vm_waits_for_host_recovery(
+            self, mock_save, mock_instance_failure):
+        notification = self._get_vm_type_notification()
+        # the host is being recovered.
+        host_lock = locks.get_lock('masakari-%s' % uuidsentinel.fake_host)
+        host_lock.acquire()
+
+        thread = eventlet.spawn(self.engine.process_notification,
+                                self.context, notification=notification)
+        eventlet.sleep(0)
+        self.assertFalse(self.mock_claim.called)
+        self.assertFalse(mock_instance_failure.called)
+
+        host_lock.release()
+        thread.wait()
+        self.assertTrue(self.mock_claim.called)
+        mock_instance_failure.assert_called_once_with(
+            self.context, uuidsentinel.fake_ins,
+            notification.notification_uuid)
+
+    @mock.patch.object(eventlet, "sleep")
+    @mock.patch.object(notification_obj.Notification, "save")
+    def test_process_notification_type_host_waits_for_instance_recoveries(
+            self, mock_save, mock_sleep):
+        notification = self._get_compute_host_type_notification()
+        # an instance failure of the host is being processed.
+        self.mock_count.side_effect = [1, 0]
+
+        with mock.patch.object(
+                self.engine, "_handle_notification_type_host",
+                return_value="finished") as mock_handle_host:
+            self.engine.process_notification(self.context,
+                                             notification=notification)
+
+        mock_sleep.assert_called_once_with(CONF.locks.poll_interval)
+        mock_handle_host.assert_called_once_with(self.context, notification)
+        filters = self.mock_count.call_args[1]['filters']
+        self.assertEqual(uuidsentinel.fake_host, filters['source_host_uuid'])
+        self.assertEqual('VM', filters['type'])
+        self.assertEqual('running', filters['status'])
+        self.assertIn('lease-expires-after', filters)
+
+    @mock.patch.object(utils, "synchronized", wraps=utils.synchronized)
+    @mock.patch.object(host_obj.Host, "get_by_uuid")
+    @mock.patch.object(host_obj.Host, "save")
+    @mock.patch("masakari.engine.drivers.taskflow."
+                "TaskFlowDriver.execute_process_failure")
+    @mock.patch.object(notification_obj.Notification, "save")
+    def test_process_notification_type_process_locks_host(
+            self, mock_save, mock_process_failure, mock_host_save,
+            mock_host_obj, mock_synchronized):
+        notification = self._get_process_type_notification()
+        mock_host_obj.return_value = fakes.create_fake_host()
+        self.engine.process_notification(self.context,
+                                         notification=notification)
+        mock_synchronized.assert_called_once_with(uuidsentinel.fake_host,
+                                                  blocking=True)
+
+    @mock.patch.object(host_obj.Host, "get_by_uuid")
+    @mock.patch.object(scheduler.NotificationScheduler, "submit")
+    def test_process_notification_queued_by_scheduler(self, mock_submit,
+                                                      mock_host_obj):
+        self.override_config('enabled', True, 'notification_scheduler')
+        mock_host_obj.return_value = fakes.create_fake_host()
+        notification = self._get_vm_type_notification()
+        self.engine.process_notification(self.context,
+                                         notification=notification)
+        mock_submit.assert_called_once_with(
+            notification, uuidsentinel.fake_segment,
+            self.engine._process_notification, self.context, notification)
+
     @mock.patch.object(notification_obj.Notification, "save")
     def test_process_notification_type_vm_error_event_unmatched(
             self, mock_save):
@@ -418,3 +526,323 @@ class EngineManagerUnitTestCase(test.NoDBTestCase):
                                          notification=notification)
         self.assertEqual("ignored", notification.status)
         self.assertFalse(mock_stop_server.called)
+
+    def _get_unfinished_notifications(self, count, status="error"):
+        return [fakes.create_fake_notification(
+            type="VM", id=index, payload={
+                'event': 'LIFECYCLE', 'instance_uuid': uuidsentinel.fake_ins,
+                'vir_domain_event': 'STOPPED_FAILED'
+            },
+            source_host_uuid=uuidsentinel.fake_host,
+            generated_time=NOW, status=status,
+            notification_uuid='notification-%d' % index)
+            for index in range(1, count + 1)]
+
+    @mock.patch.object(notification_obj.NotificationList, "get_all")
+    def test_process_unfinished_notifications_in_batches(
+            self, mock_get_all):
+        self.override_config('process_unfinished_notifications_batch_size',
+                             2)
+        notifications = self._get_unfinished_notifications(3)
+
+        # no running notification with an expired lease
+        mock_get_all.side_effect = [[], notifications[:2], notifications[2:],
+                                    []]
+        self.mock_count.side_effect = [0, 3]
+
+        def fake_process_notification(context, notification, error_status):
+            if notification.id == 2:
+                notification.status = error_status
+            else:
+                notification.status = "finished"
+
+        with mock.patch.object(self.engine, "_process_notification",
+                               side_effect=fake_process_notification):
+            self.engine._process_unfinished_notifications(self.context)
+
+        self.assertEqual([None, None, 2, 3],
+                         [call[1]['marker']
+                          for call in mock_get_all.call_args_list])
+        for call in mock_get_all.call_args_list:
+            self.assertEqual(2, call[1]['limit'])
+        self.assertEqual(["finished", "failed", "finished"],
+                         [notification.status
+                          for notification in notifications])
+
+        stats = self.engine.get_unfinished_notification_stats()
+        self.assertEqual(3, stats['backlog'])
+        self.assertEqual(3, stats['dispatched'])
+        self.assertEqual(1, stats['failed'])
+        self.assertFalse(stats['budget_exhausted'])
+        # the backlog is counted with the filters the pages are loaded with.
+        self.assertEqual(
+            [call[1]['filters'] for call in mock_get_all.call_args_list[:2]],
+            [call[1]['filters'] for call in self.mock_count.call_args_list])
+
+    @mock.patch.object(host_obj.Host, "get_by_uuid")
+    @mock.patch.object(notification_obj.NotificationList, "get_all")
+    def test_process_unfinished_notifications_queued_by_scheduler(
+            self, mock_get_all, mock_host_obj):
+        self.override_config('enabled', True, 'notification_scheduler')
+        self.override_config('type_concurrency', {'VM': 1},
+                             'notification_scheduler')
+        self.override_config('process_unfinished_notifications_workers', 2)
+        mock_host_obj.return_value = fakes.create_fake_host()
+        notifications = self._get_unfinished_notifications(2)
+        mock_get_all.side_effect = [[], notifications, []]
+        self.mock_count.side_effect = [0, 2]
+        running = []
+        max_running = []
+
+        def fake_process_notification(context, notification, error_status):
+            running.append(notification)
+            max_running.append(len(running))
+            eventlet.sleep(0)
+            running.remove(notification)
+            notification.status = "finished"
+
+        with mock.patch.object(self.engine, "_process_notification",
+                               side_effect=fake_process_notification):
+            self.engine._process_unfinished_notifications(self.context)
+
+        # the retries are bound by the limits of the scheduler.
+        self.assertEqual(1, max(max_running))
+        self.assertEqual(["finished", "finished"],
+                         [notification.status
+                          for notification in notifications])
+        self.assertEqual(
+            2, self.engine.scheduler.stats()['VM']['dispatched'])
+
+    @mock.patch.object(notification_obj.NotificationList, "get_all")
+    def test_process_unfinished_notifications_skips_recent_new(
+            self, mock_get_all):
+        notifications = self._get_unfinished_notifications(1, status="new")
+        notifications[0].generated_time = timeutils.utcnow()
+        mock_get_all.side_effect = [[], notifications, []]
+        self.mock_count.side_effect = [0, 1]
+
+        with mock.patch.object(self.engine,
+                               "_process_notification") as mock_process:
+            self.engine._process_unfinished_notifications(self.context)
+
+        self.assertFalse(mock_process.called)
+        stats = self.engine.get_unfinished_notification_stats()
+        self.assertEqual(1, stats['backlog'])
+        self.assertEqual(0, stats['dispatched'])
+
+    @mock.patch.object(notification_obj.NotificationList, "get_all")
+    def test_process_unfinished_notifications_concurrency(
+            self, mock_get_all):
+        self.override_config('process_unfinished_notifications_workers', 2)
+        notifications = self._get_unfinished_notifications(4)
+        mock_get_all.side_effect = [notifications, [], [], []]
+        running = []
+        max_running = []
+
+        def fake_process_notification(context, notification, error_status):
+            running.append(notification)
+            max_running.append(len(running))
+            eventlet.sleep(0)
+            running.remove(notification)
+            notification.status = "finished"
+
+        with mock.patch.object(self.engine, "_process_notification",
+                               side_effect=fake_process_notification):
+            self.engine._process_unfinished_notifications(self.context)
+
+        self.assertEqual(2, max(max_running))
+        self.assertEqual(4, len(max_running))
+
+    @mock.patch.object(notification_obj.NotificationList, "get_all")
+    def test_process_unfinished_notifications_time_budget(
+            self, mock_get_all):
+        self.override_config('process_unfinished_notifications_time_budget',
+                             1)
+        notifications = self._get_unfinished_notifications(3)
+        mock_get_all.side_effect = [notifications, []]
+
+        with mock.patch.object(timeutils.StopWatch, "expired",
+                               side_effect=[False, True]):
+            with mock.patch.object(self.engine,
+                                   "_process_notification") as mock_process:
+                self.engine._process_unfinished_notifications(self.context)
+
+        mock_process.assert_called_once_with(
+            self.context, notifications[0], error_status="failed")
+        # no further page is loaded once the time budget is exhausted.
+        self.assertEqual(1, mock_get_all.call_count)
+        stats = self.engine.get_unfinished_notification_stats()
+        self.assertTrue(stats['budget_exhausted'])
+        self.assertEqual(1, stats['dispatched'])
+
+    @mock.patch.object(notification_obj.NotificationList, "get_all")
+    def test_process_unfinished_notifications_bounded_wait(
+            self, mock_get_all):
+        self.override_config('process_unfinished_notifications_time_budget',
+                             60)
+        notifications = self._get_unfinished_notifications(1)
+        mock_get_all.side_effect = [[], notifications, []]
+        done = eventlet.event.Event()
+
+        def fake_process_notification(context, notification, error_status):
+            done.wait()
+
+        with mock.patch.object(self.engine, "_process_notification",
+                               side_effect=fake_process_notification), \
+                mock.patch.object(timeutils.StopWatch, "leftover",
+                                  return_value=0.01):
+            self.engine._process_unfinished_notifications(self.context)
+
+        # the periodic task doesn't wait for the notification still being
+        # processed once the time budget is exhausted.
+        stats = self.engine.get_unfinished_notification_stats()
+        self.assertTrue(stats['budget_exhausted'])
+        self.assertEqual(1, stats['dispatched'])
+        done.send()
+
+    @mock.patch.object(notification_obj.NotificationList, "get_all",
+                       return_value=[])
+    def test_process_unfinished_notifications_logs_queue_stats(
+            self, mock_get_all):
+        self.override_config('enabled', True, 'notification_scheduler')
+        stats = {'VM': {'queued': 2, 'running': 1, 'dispatched': 3,
+                        'wait_time_avg': 0.5, 'wait_time_max': 1.0}}
+
+        with mock.patch.object(self.engine.scheduler, "stats",
+                               return_value=stats), \
+                mock.patch.object(manager.LOG, "info") as mock_log:
+            self.engine._process_unfinished_notifications(self.context)
+
+        mock_log.assert_called_once_with(mock.ANY, dict(stats['VM'],
+                                                        type='VM'))
+
+    @mock.patch.object(notification_obj.NotificationList, "get_all",
+                       return_value=[])
+    def test_process_unfinished_notifications_logs_lock_stats(
+            self, mock_get_all):
+        stats = {'acquired': 2, 'failed': 1, 'wait_time_total': 1.5,
+                 'wait_time_max': 1.0, 'hold_time_total': 3.0,
+                 'hold_time_max': 2.0}
+
+        with mock.patch.object(locks, "get_lock_stats",
+                               return_value={'fake-lock': stats}), \
+                mock.patch.object(manager.LOG, "debug") as mock_log:
+            self.engine._process_unfinished_notifications(self.context)
+
+        mock_log.assert_called_once_with(mock.ANY, dict(stats,
+                                                        name='fake-lock'))
+
+    @mock.patch.object(notification_obj.NotificationList, "get_all")
+    def test_process_unfinished_notifications_expired_lease(
+            self, mock_get_all):
+        notifications = self._get_unfinished_notifications(1,
+                                                           status="running")
+        mock_get_all.side_effect = [notifications, [], []]
+
+        with mock.patch.object(self.engine,
+                               "_process_notification") as mock_process:
+            self.engine._process_unfinished_notifications(self.context)
+
+        mock_process.assert_called_once_with(
+            self.context, notifications[0], error_status="failed")
+        filters = mock_get_all.call_args_list[0][1]['filters']
+        self.assertEqual("running", filters['status'])
+        self.assertIn('lease-expires-before', filters)
+
+    @mock.patch("masakari.engine.drivers.taskflow."
+                "TaskFlowDriver.execute_instance_failure")
+    def test_process_notification_claimed_by_another_engine(
+            self, mock_instance_failure):
+        self.mock_claim.side_effect = exception.NotificationAlreadyClaimed(
+            notification_uuid=uuidsentinel.fake_notification)
+        notification = self._get_vm_type_notification()
+
+        self.engine.process_notification(self.context,
+                                         notification=notification)
+
+        self.assertFalse(mock_instance_failure.called)
+        self.assertFalse(self.mock_release.called)
+        self.assertEqual("new", notification.status)
+
+    @mock.patch("masakari.engine.drivers.taskflow."
+                "TaskFlowDriver.execute_instance_failure")
+    def test_process_notification_claim_and_release(
+            self, mock_instance_failure):
+        notification = self._get_vm_type_notification()
+
+        self.engine.process_notification(self.context,
+                                         notification=notification)
+
+        self.mock_claim.assert_called_once_with(
+            CONF.host, CONF.notification_lease_duration)
+        self.mock_release.assert_called_once_with(CONF.host)
+        self.assertEqual("finished", notification.status)
+
+    def test_renew_notification_lease_lost(self):
+        notification = self._get_vm_type_notification()
+        lease_lost = threading.Event()
+
+        with mock.patch.object(
+                notification, "renew_lease",
+                side_effect=exception.NotificationAlreadyClaimed(
+                    notification_uuid=uuidsentinel.fake_notification)):
+            self.assertRaises(loopingcall.LoopingCallDone,
+                              self.engine._renew_notification_lease,
+                              notification, lease_lost)
+        self.assertTrue(lease_lost.is_set())
+
+    @mock.patch.object(loopingcall, "FixedIntervalLoopingCall")
+    def test_process_notification_lease_lost(self, mock_heartbeat):
+        notification = self._get_vm_type_notification()
+
+        def fake_handle_notification(context, notification):
+            # the lease can't be renewed while the notification is processed
+            renew_lease_args = mock_heartbeat.call_args[0]
+            with mock.patch.object(
+                    notification, "renew_lease",
+                    side_effect=exception.NotificationAlreadyClaimed(
+                        notification_uuid=uuidsentinel.fake_notification)):
+                self.assertRaises(loopingcall.LoopingCallDone,
+                                  renew_lease_args[0], *renew_lease_args[1:])
+            return "finished"
+
+        with mock.patch.object(self.engine,
+                               "_handle_notification_type_instance",
+                               side_effect=fake_handle_notification):
+            self.engine.process_notification(self.context,
+                                             notification=notification)
+
+        mock_heartbeat.return_value.stop.assert_called_once_with()
+        self.assertFalse(self.mock_release.called)
+        self.assertEqual("new", notification.status)
+
+    @mock.patch.object(utils, "spawn_n")
+    @mock.patch.object(notification_obj.NotificationList, "get_all")
+    @mock.patch.object(notification_obj.NotificationList, "expire_leases")
+    def test_init_host_resumes_running_notifications(
+            self, mock_expire_leases, mock_get_all, mock_spawn_n):
+        mock_expire_leases.return_value = 1
+        notifications = self._get_unfinished_notifications(
+            2, status="running")
+        mock_get_all.side_effect = [notifications, []]
+
+        self.engine.init_host()
+
+        mock_expire_leases.assert_called_once_with(mock.ANY, CONF.host)
+        filters = mock_get_all.call_args_list[0][1]['filters']
+        self.assertEqual("running", filters['status'])
+        self.assertIn('lease-expires-before', filters)
+        self.assertEqual(
+            [mock.call(self.engine.process_notification, mock.ANY,
+                       notification) for notification in notifications],
+            mock_spawn_n.call_args_list)
+
+    @mock.patch.object(utils, "spawn_n")
+    @mock.patch.object(notification_obj.NotificationList, "expire_leases",
+                       side_effect=exception.MasakariException)
+    def test_init_host_resume_failure(self, mock_expire_leases,
+                                      mock_spawn_n):
+        # the engine starts anyway, the periodic task resumes them later.
+        self.engine.init_host()
+
+        self.assertFalse(mock_spawn_n.called)
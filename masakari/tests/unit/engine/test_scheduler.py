@@ -0,0 +1,139 @@
+# Copyright 2016 NTT DATA
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+import masakari.conf
+from masakari.engine import scheduler
+from masakari.objects import notification as notification_obj
+from masakari import test
+from masakari.tests import uuidsentinel
+
+CONF = masakari.conf.CONF
+
+
+class NotificationSchedulerTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(NotificationSchedulerTestCase, self).setUp()
+        self.scheduler = scheduler.NotificationScheduler()
+        self.processed = []
+        # green threads are collected and started explicitly by the tests.
+        self.spawned = []
+        patcher = mock.patch('masakari.utils.spawn_n',
+                             side_effect=self._fake_spawn_n)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _fake_spawn_n(self, func, *args, **kwargs):
+        self.spawned.append((func, args, kwargs))
+
+    def _run_next(self):
+        func, args, kwargs = self.spawned.pop(0)
+        func(*args, **kwargs)
+
+    def _submit(self, notification_type, name,
+                segment_uuid=uuidsentinel.fake_segment):
+        notification = notification_obj.Notification(
+            type=notification_type, notification_uuid=name)
+        self.scheduler.submit(notification, segment_uuid,
+                              self.processed.append, name)
+
+    def test_submit_dispatches_immediately(self):
+        self._submit('VM', 'vm-1')
+
+        self.assertEqual(1, len(self.spawned))
+        self._run_next()
+        self.assertEqual(['vm-1'], self.processed)
+
+    def test_type_concurrency_and_priority(self):
+        self.override_config('type_concurrency',
+                             {'COMPUTE_HOST': 1, 'VM': 1},
+                             'notification_scheduler')
+        self._submit('VM', 'vm-1')
+        self._submit('VM', 'vm-2')
+        self._submit('COMPUTE_HOST', 'host-1')
+        self._submit('VM', 'vm-3')
+        self._submit('COMPUTE_HOST', 'host-2')
+
+        # first notification of every type is running
+        self.assertEqual(2, len(self.spawned))
+        stats = self.scheduler.stats()
+        self.assertEqual(2, stats['VM']['queued'])
+        self.assertEqual(1, stats['VM']['running'])
+        self.assertEqual(1, stats['COMPUTE_HOST']['queued'])
+
+        while self.spawned:
+            self._run_next()
+
+        # FIFO order is kept within a type.
+        self.assertEqual(['vm-1', 'vm-2', 'vm-3'],
+                         [name for name in self.processed
+                          if name.startswith('vm')])
+        self.assertEqual(['host-1', 'host-2'],
+                         [name for name in self.processed
+                          if name.startswith('host')])
+        self.assertEqual(5, len(self.processed))
+
+    def test_higher_priority_dispatched_first(self):
+        self.override_config('segment_concurrency', 1,
+                             'notification_scheduler')
+        self._submit('VM', 'vm-1')
+        self._submit('VM', 'vm-2')
+        self._submit('PROCESS', 'process-1')
+        self._submit('COMPUTE_HOST', 'host-1')
+
+        while self.spawned:
+            self._run_next()
+
+        self.assertEqual(['vm-1', 'host-1', 'process-1', 'vm-2'],
+                         self.processed)
+
+    def test_segment_concurrency(self):
+        self.override_config('segment_concurrency', 1,
+                             'notification_scheduler')
+        self._submit('VM', 'vm-1', segment_uuid=uuidsentinel.segment_1)
+        self._submit('VM', 'vm-2', segment_uuid=uuidsentinel.segment_1)
+        self._submit('VM', 'vm-3', segment_uuid=uuidsentinel.segment_2)
+
+        # vm-2 waits for vm-1 of the same segment, vm-3 is not blocked.
+        self.assertEqual(2, len(self.spawned))
+        self.assertEqual(1, self.scheduler.stats()['VM']['queued'])
+
+        while self.spawned:
+            self._run_next()
+
+        self.assertEqual(['vm-1', 'vm-3', 'vm-2'], self.processed)
+
+    def test_failed_notification_releases_slot(self):
+        self.override_config('type_concurrency', {'VM': 1},
+                             'notification_scheduler')
+        notification = notification_obj.Notification(
+            type='VM', notification_uuid=uuidsentinel.fake_notification)
+        self.scheduler.submit(notification, None,
+                              mock.Mock(side_effect=Exception))
+        self._submit('VM', 'vm-2')
+
+        while self.spawned:
+            self._run_next()
+
+        self.assertEqual(['vm-2'], self.processed)
+        stats = self.scheduler.stats()['VM']
+        self.assertEqual(0, stats['running'])
+        self.assertEqual(2, stats['dispatched'])
+
+    def test_invalid_type_concurrency(self):
+        self.assertRaises(ValueError, CONF.set_override, 'type_concurrency',
+                          'VM:many', 'notification_scheduler')
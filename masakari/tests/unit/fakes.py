@@ -12,6 +12,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
+
 from oslo_utils import timeutils
 from oslo_utils import uuidutils
 
@@ -24,23 +26,30 @@ NOW = timeutils.utcnow().replace(microsecond=0)
 class FakeNovaClient(object):
     class Server(object):
         def __init__(self, id=None, uuid=None, host=None, vm_state=None,
-                     ha_enabled=None):
+                     ha_enabled=None, flavor_id='1', task_state=None):
             self.id = id
             self.uuid = uuid or uuidutils.generate_uuid()
             self.host = host
+            self.flavor = {'id': flavor_id}
             setattr(self, 'OS-EXT-SRV-ATTR:hypervisor_hostname', host)
             setattr(self, 'OS-EXT-STS:vm_state', vm_state)
+            setattr(self, 'OS-EXT-STS:task_state', task_state)
             self.metadata = {"HA_Enabled": ha_enabled}
 
+        def to_dict(self):
+            return copy.deepcopy(self.__dict__)
+
     class ServerManager(object):
         def __init__(self):
             self._servers = []
 
         def create(self, id, uuid=None, host=None, vm_state='active',
-                   ha_enabled=False):
+                   ha_enabled=False, flavor_id='1', task_state=None):
             server = FakeNovaClient.Server(id=id, uuid=uuid, host=host,
                                            vm_state=vm_state,
-                                           ha_enabled=ha_enabled)
+                                           ha_enabled=ha_enabled,
+                                           flavor_id=flavor_id,
+                                           task_state=task_state)
             self._servers.append(server)
             return server
 
@@ -54,8 +63,12 @@ class FakeNovaClient(object):
             matching = list(self._servers)
             if search_opts:
                 for opt, val in search_opts.items():
-                    if 'all_tenants' in search_opts:
+                    # every server is considered as changed recently.
+                    if opt in ('all_tenants', 'changes-since'):
                         continue
+                    # the uuid of a nova server is its id.
+                    if opt == 'uuid':
+                        opt = 'id'
                     matching = [m for m in matching
                                 if getattr(m, opt, None) == val]
             return matching
@@ -69,6 +82,7 @@ class FakeNovaClient(object):
                 host = 'fake-host-1'
             server = self.get(uuid)
             # pretending that instance is evacuated successfully on given host
+            server.host = host
             setattr(server, 'OS-EXT-SRV-ATTR:hypervisor_hostname', host)
             setattr(server, 'OS-EXT-STS:vm_state', 'active')
 
@@ -104,6 +118,7 @@ class FakeNovaClient(object):
             aggregate = self.get(aggregate_id)
             if host_name not in aggregate.hosts:
                 aggregate.hosts.append(host_name)
+            return aggregate
 
         def get(self, aggregate_id):
             for aggregate in self.aggregates:
@@ -111,26 +126,33 @@ class FakeNovaClient(object):
                     return aggregate
 
     class Service(object):
-        def __init__(self, id=None, host=None, binary=None, status='enabled'):
+        def __init__(self, id=None, host=None, binary=None, status='enabled',
+                     state='up'):
             self.id = id
             self.host = host
             self.binary = binary
             self.status = status
+            self.state = state
 
     class Services(object):
         def __init__(self):
             self._services = []
 
         def create(self, id, host=None, binary=None,
-                   status=None):
+                   status=None, state='up'):
             self._services.append(FakeNovaClient.Service(id=id, host=host,
                                                          binary=binary,
-                                                         status=status))
+                                                         status=status,
+                                                         state=state))
 
         def disable(self, host_name, binary):
             service = self.list(host=host_name, binary=binary)[0]
             service.status = 'disabled'
 
+        def enable(self, host_name, binary):
+            service = self.list(host=host_name, binary=binary)[0]
+            service.status = 'enabled'
+
         def list(self, host=None, binary=None):
             services = []
             for service in self._services:
@@ -138,10 +160,60 @@ class FakeNovaClient(object):
                     services.append(service)
             return services
 
+    class Flavor(object):
+        def __init__(self, id=None, vcpus=1, ram=512, disk=1):
+            self.id = id
+            self.vcpus = vcpus
+            self.ram = ram
+            self.disk = disk
+
+    class FlavorManager(object):
+        def __init__(self):
+            self._flavors = []
+
+        def create(self, id, vcpus=1, ram=512, disk=1):
+            flavor = FakeNovaClient.Flavor(id=id, vcpus=vcpus, ram=ram,
+                                           disk=disk)
+            self._flavors.append(flavor)
+            return flavor
+
+        def get(self, id):
+            for flavor in self._flavors:
+                if flavor.id == id:
+                    return flavor
+
+    class Hypervisor(object):
+        def __init__(self, id=None, host=None, vcpus=0, vcpus_used=0,
+                     free_ram_mb=0, free_disk_gb=0):
+            self.id = id
+            self.hypervisor_hostname = host
+            self.service = {'host': host}
+            self.vcpus = vcpus
+            self.vcpus_used = vcpus_used
+            self.free_ram_mb = free_ram_mb
+            self.free_disk_gb = free_disk_gb
+
+    class HypervisorManager(object):
+        def __init__(self):
+            self._hypervisors = []
+
+        def create(self, id, host=None, vcpus=0, vcpus_used=0,
+                   free_ram_mb=0, free_disk_gb=0):
+            hypervisor = FakeNovaClient.Hypervisor(
+                id=id, host=host, vcpus=vcpus, vcpus_used=vcpus_used,
+                free_ram_mb=free_ram_mb, free_disk_gb=free_disk_gb)
+            self._hypervisors.append(hypervisor)
+            return hypervisor
+
+        def list(self, detailed=True):
+            return self._hypervisors
+
     def __init__(self):
         self.servers = FakeNovaClient.ServerManager()
         self.services = FakeNovaClient.Services()
         self.aggregates = FakeNovaClient.AggregatesManager()
+        self.flavors = FakeNovaClient.FlavorManager()
+        self.hypervisors = FakeNovaClient.HypervisorManager()
 
 
 def create_fake_notification(type="VM", id=1, payload=None,
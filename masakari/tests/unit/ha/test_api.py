@@ -15,7 +15,7 @@
 
 """Tests for the failover segment api."""
 
-import copy
+import datetime
 import mock
 from oslo_utils import timeutils
 
@@ -30,6 +30,7 @@ from masakari import test
 from masakari.tests.unit.api.openstack import fakes
 from masakari.tests.unit import fakes as fakes_data
 from masakari.tests import uuidsentinel
+from masakari import utils
 
 NOW = timeutils.utcnow().replace(microsecond=0)
 
@@ -435,23 +436,13 @@ class NotificationAPITestCase(test.NoDBTestCase):
         self.assertTrue(obj_base.obj_equal_prims(expected, actual),
                         "The notification objects were not equal")
 
-    @mock.patch.object(notification_obj.NotificationList, 'get_all')
+    @mock.patch.object(notification_obj.Notification, 'is_duplicate',
+                       return_value=False)
     @mock.patch.object(notification_obj, 'Notification')
     @mock.patch.object(notification_obj.Notification, 'create')
     @mock.patch.object(host_obj.Host, 'get_by_name')
     def test_create(self, mock_host_obj, mock_create, mock_notification_obj,
-                    mock_get_all):
-        fake_notification = fakes_data.create_fake_notification(
-            type="COMPUTE_HOST", id=2, payload={
-                'event': 'STARTED', 'host_status': 'NORMAL',
-                'cluster_status': 'ONLINE'
-            },
-            source_host_uuid=uuidsentinel.fake_host, generated_time=NOW,
-            status="running",
-            notification_uuid=uuidsentinel.fake_notification_2
-        )
-        fake_notification_list = [self.notification, fake_notification]
-        mock_get_all.return_value = fake_notification_list
+                    mock_is_duplicate):
         notification_data = {"hostname": "fake_host",
                              "payload": {"event": "STARTED",
                                          "host_status": "NORMAL",
@@ -498,22 +489,27 @@ class NotificationAPITestCase(test.NoDBTestCase):
                           self.notification_api.create_notification,
                           self.context, notification_data)
 
-    @mock.patch.object(notification_obj.NotificationList, 'get_all')
-    def test_create_is_duplicate_true(self, mock_get_all):
-        mock_get_all.return_value = [self.notification, ]
+    @mock.patch('masakari.db.notification_duplicate_exists')
+    def test_create_is_duplicate_true(self, mock_exists):
+        self.notification._context = self.context
+        mock_exists.return_value = True
 
         self.assertTrue(self.notification_api._is_duplicate_notification(
             self.context, self.notification))
 
-    @mock.patch.object(notification_obj.NotificationList, 'get_all')
-    def test_create_is_duplicate_false(self, mock_get_all):
-        mock_get_all.return_value = [self.notification, ]
-        FAKE_NOTIFICATION = copy.deepcopy(self.notification)
-        FAKE_NOTIFICATION.payload = {'event': 'STOPPED',
-                                     'host_status': 'UNKNOWN',
-                                     'cluster_status': 'OFFLINE'}
+        mock_exists.assert_called_once_with(
+            self.context, uuidsentinel.fake_host, 'VM',
+            utils.notification_payload_hash(self.notification.payload),
+            self.notification.generated_time -
+            datetime.timedelta(seconds=180))
+
+    @mock.patch('masakari.db.notification_duplicate_exists')
+    def test_create_is_duplicate_false(self, mock_exists):
+        self.notification._context = self.context
+        mock_exists.return_value = False
+
         self.assertFalse(self.notification_api._is_duplicate_notification(
-            self.context, FAKE_NOTIFICATION))
+            self.context, self.notification))
 
     @mock.patch.object(notification_obj.Notification, 'get_by_uuid')
     def test_get_notification(self, mock_get_notification):
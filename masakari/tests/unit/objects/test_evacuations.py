@@ -0,0 +1,104 @@
+#    Copyright 2016 NTT DATA
+#    All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import copy
+
+import mock
+from oslo_utils import timeutils
+
+from masakari import db
+from masakari import exception
+from masakari.objects import evacuation
+from masakari.tests.unit.objects import test_objects
+from masakari.tests import uuidsentinel
+
+NOW = timeutils.utcnow().replace(microsecond=0)
+
+fake_evacuation = {
+    'created_at': NOW,
+    'updated_at': None,
+    'deleted_at': None,
+    'deleted': False,
+    'id': 123,
+    'notification_uuid': uuidsentinel.fake_notification,
+    'instance_uuid': uuidsentinel.fake_instance,
+    'status': 'evacuating',
+    }
+
+
+class TestEvacuationObject(test_objects._LocalTest):
+
+    def _evacuation_create_attributes(self):
+        evacuation_obj = evacuation.Evacuation(context=self.context)
+        evacuation_obj.notification_uuid = uuidsentinel.fake_notification
+        evacuation_obj.instance_uuid = uuidsentinel.fake_instance
+        evacuation_obj.status = 'evacuating'
+
+        return evacuation_obj
+
+    @mock.patch.object(db, 'evacuation_create')
+    def test_create(self, mock_db_create):
+        mock_db_create.return_value = fake_evacuation
+        evacuation_obj = self._evacuation_create_attributes()
+        evacuation_obj.create()
+
+        self.compare_obj(evacuation_obj, fake_evacuation)
+        mock_db_create.assert_called_once_with(self.context, {
+            'notification_uuid': uuidsentinel.fake_notification,
+            'instance_uuid': uuidsentinel.fake_instance,
+            'status': 'evacuating'})
+
+    @mock.patch.object(db, 'evacuation_create')
+    def test_recreate_fails(self, mock_db_create):
+        mock_db_create.return_value = fake_evacuation
+        evacuation_obj = self._evacuation_create_attributes()
+        evacuation_obj.create()
+
+        self.assertRaises(exception.ObjectActionError, evacuation_obj.create)
+        self.assertEqual(1, mock_db_create.call_count)
+
+    @mock.patch.object(db, 'evacuation_update')
+    @mock.patch.object(db, 'evacuation_create')
+    def test_save(self, mock_db_create, mock_db_update):
+        mock_db_create.return_value = fake_evacuation
+        updated_evacuation = copy.deepcopy(fake_evacuation)
+        updated_evacuation['status'] = 'evacuated'
+        mock_db_update.return_value = updated_evacuation
+
+        evacuation_obj = self._evacuation_create_attributes()
+        evacuation_obj.create()
+        evacuation_obj.status = 'evacuated'
+        evacuation_obj.save()
+
+        self.compare_obj(evacuation_obj, updated_evacuation)
+        mock_db_update.assert_called_once_with(
+            self.context, uuidsentinel.fake_notification,
+            uuidsentinel.fake_instance, {'status': 'evacuated'})
+
+    @mock.patch.object(db, 'evacuations_get_all_by_notification')
+    def test_get_all_by_notification(self, mock_api_get):
+        fake_evacuation2 = copy.deepcopy(fake_evacuation)
+        fake_evacuation2['id'] = 124
+        fake_evacuation2['instance_uuid'] = uuidsentinel.fake_instance2
+        mock_api_get.return_value = [fake_evacuation, fake_evacuation2]
+
+        evacuation_result = (evacuation.EvacuationList.
+                             get_all_by_notification(
+                                 self.context,
+                                 uuidsentinel.fake_notification))
+
+        self.assertEqual(2, len(evacuation_result))
+        mock_api_get.assert_called_once_with(
+            self.context, uuidsentinel.fake_notification)
@@ -24,8 +24,10 @@ from masakari import exception
 from masakari.objects import notification
 from masakari.tests.unit.objects import test_objects
 from masakari.tests import uuidsentinel
+from masakari import utils
 
 NOW = timeutils.utcnow().replace(microsecond=0)
+FAKE_PAYLOAD_HASH = utils.notification_payload_hash({'fake_key': 'fake_value'})
 
 
 def _fake_db_notification(**kwargs):
@@ -118,7 +120,8 @@ class TestNotificationObject(test_objects._LocalTest):
             'source_host_uuid': uuidsentinel.fake_host,
             'notification_uuid': uuidsentinel.fake_notification,
             'generated_time': NOW, 'status': 'new',
-            'type': 'COMPUTE_HOST', 'payload': '{"fake_key": "fake_value"}'})
+            'type': 'COMPUTE_HOST', 'payload': '{"fake_key": "fake_value"}',
+            'payload_hash': FAKE_PAYLOAD_HASH})
 
     @mock.patch.object(db, 'notification_create')
     def test_recreate_fails(self, mock_notification_create):
@@ -132,7 +135,8 @@ class TestNotificationObject(test_objects._LocalTest):
             'source_host_uuid': uuidsentinel.fake_host,
             'notification_uuid': uuidsentinel.fake_notification,
             'generated_time': NOW, 'status': 'new',
-            'type': 'COMPUTE_HOST', 'payload': '{"fake_key": "fake_value"}'})
+            'type': 'COMPUTE_HOST', 'payload': '{"fake_key": "fake_value"}',
+            'payload_hash': FAKE_PAYLOAD_HASH})
 
     @mock.patch.object(db, 'notification_create')
     @mock.patch.object(uuidutils, 'generate_uuid')
@@ -150,7 +154,8 @@ class TestNotificationObject(test_objects._LocalTest):
             'source_host_uuid': uuidsentinel.fake_host,
             'notification_uuid': uuidsentinel.fake_notification,
             'generated_time': NOW, 'status': 'new',
-            'type': 'COMPUTE_HOST', 'payload': '{"fake_key": "fake_value"}'})
+            'type': 'COMPUTE_HOST', 'payload': '{"fake_key": "fake_value"}',
+            'payload_hash': FAKE_PAYLOAD_HASH})
         self.assertTrue(mock_generate_uuid.called)
 
     @mock.patch.object(db, 'notification_delete')
@@ -227,3 +232,62 @@ class TestNotificationObject(test_objects._LocalTest):
                                   'payload': {'fake_key': u'fake_value'},
                                   'type': 'COMPUTE_HOST'}
                                  ))
+
+    @mock.patch.object(db, 'notification_duplicate_exists')
+    def test_is_duplicate(self, mock_duplicate_exists):
+        mock_duplicate_exists.return_value = True
+
+        notification_obj = self._notification_create_attributes()
+
+        self.assertTrue(notification_obj.is_duplicate(NOW))
+        mock_duplicate_exists.assert_called_once_with(
+            self.context, uuidsentinel.fake_host, 'COMPUTE_HOST',
+            FAKE_PAYLOAD_HASH, NOW)
+
+    @mock.patch.object(db, 'notification_claim')
+    def test_claim(self, mock_notification_claim):
+        mock_notification_claim.return_value = _fake_db_notification(
+            status='running')
+
+        notification_obj = self._notification_create_attributes()
+        notification_obj.claim('fake-engine', 60)
+
+        self.assertEqual('running', notification_obj.status)
+        mock_notification_claim.assert_called_once_with(
+            self.context, uuidsentinel.fake_notification, 'fake-engine', 60)
+
+    @mock.patch.object(db, 'notification_release')
+    def test_release(self, mock_notification_release):
+        mock_notification_release.return_value = _fake_db_notification(
+            status='finished')
+
+        notification_obj = self._notification_create_attributes()
+        notification_obj.obj_reset_changes()
+        notification_obj.status = 'finished'
+        notification_obj.release('fake-engine')
+
+        self.assertEqual('finished', notification_obj.status)
+        mock_notification_release.assert_called_once_with(
+            self.context, uuidsentinel.fake_notification, 'fake-engine',
+            {'status': 'finished'})
+
+
+class TestNotificationListObject(test_objects._LocalTest):
+
+    @mock.patch.object(db, 'notifications_expire_leases')
+    def test_expire_leases(self, mock_expire_leases):
+        mock_expire_leases.return_value = 2
+
+        self.assertEqual(2, notification.NotificationList.expire_leases(
+            self.context, 'fake-engine'))
+        mock_expire_leases.assert_called_once_with(self.context,
+                                                   'fake-engine')
+
+    @mock.patch.object(db, 'notifications_count_by_filters')
+    def test_count(self, mock_count):
+        mock_count.return_value = 3
+        filters = {'status': ['new', 'error']}
+
+        self.assertEqual(3, notification.NotificationList.count(
+            self.context, filters=filters))
+        mock_count.assert_called_once_with(self.context, filters=filters)
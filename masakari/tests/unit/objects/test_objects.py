@@ -652,12 +652,14 @@ class TestRegistry(test.NoDBTestCase):
 # they come with a corresponding version bump in the affected
 # objects
 object_data = {
+    'Evacuation': '1.0-78f6150065777a3c90ae0f04c56ff824',
+    'EvacuationList': '1.0-8eb1dabcb91bd20a153a3cc04197e62a',
     'FailoverSegment': '1.0-5e8b8bc8840b35439b5f2b621482d15d',
     'FailoverSegmentList': '1.0-dfc5c6f5704d24dcaa37b0bbb03cbe60',
     'Host': '1.0-803264cd1563db37d0bf7cff48e34c1d',
     'HostList': '1.0-25ebe1b17fbd9f114fae8b6a10d198c0',
-    'Notification': '1.0-eedfa3c203c100897021bd23f0ddf68c',
-    'NotificationList': '1.0-25ebe1b17fbd9f114fae8b6a10d198c0',
+    'Notification': '1.2-5900071ff661e8d55ab2c00b612bbfa7',
+    'NotificationList': '1.2-c6e1a2d9c3055d9472deb35ee896956b',
     'MyObj': '1.6-ee7b607402fbfb3390a92ab7199e0d88',
     'MyOwnedObject': '1.0-fec853730bd02d54cc32771dd67f08a0'
 }
@@ -0,0 +1,104 @@
+#    Copyright 2017 NTT DATA
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import fixtures
+import mock
+from oslo_service import loopingcall
+
+import masakari.conf
+from masakari import locks
+from masakari import test
+from masakari import utils
+
+CONF = masakari.conf.CONF
+
+
+class LocksTestCase(test.TestCase):
+
+    def setUp(self):
+        super(LocksTestCase, self).setUp()
+        locks.reset_lock_stats()
+        self.addCleanup(locks.reset_lock_stats)
+
+    def _test_lock_held(self, backend):
+        self.override_config('backend', backend, 'locks')
+        lock = locks.get_lock('fake-lock')
+        other_lock = locks.get_lock('fake-lock')
+
+        self.assertTrue(lock.acquire())
+        self.assertFalse(other_lock.acquire(blocking=False))
+        self.assertFalse(lock.lost)
+        lock.release()
+        self.assertTrue(other_lock.acquire(blocking=False))
+        other_lock.release()
+
+        stats = locks.get_lock_stats()['fake-lock']
+        self.assertEqual(2, stats['acquired'])
+        self.assertEqual(1, stats['failed'])
+
+    def test_local_backend(self):
+        self._test_lock_held('local')
+
+    def test_file_backend(self):
+        lock_path = self.useFixture(fixtures.TempDir()).path
+        self.override_config('lock_path', lock_path, 'oslo_concurrency')
+        self._test_lock_held('file')
+
+    def test_db_backend(self):
+        self._test_lock_held('db')
+
+    @mock.patch('eventlet.sleep')
+    def test_db_backend_waits_for_lock(self, mock_sleep):
+        self.override_config('backend', 'db', 'locks')
+        lock = locks.get_lock('fake-lock')
+        lock.acquire()
+        # the lock is released while the other engine waits for it.
+        mock_sleep.side_effect = lambda interval: lock.release()
+
+        other_lock = locks.get_lock('fake-lock')
+        self.assertTrue(other_lock.acquire())
+        other_lock.release()
+
+        mock_sleep.assert_called_once_with(CONF.locks.poll_interval)
+
+    @mock.patch('masakari.db.lock_renew', return_value=False)
+    def test_db_backend_lease_lost(self, mock_renew):
+        self.override_config('backend', 'db', 'locks')
+        lock = locks.get_lock('fake-lock')
+        lock.acquire()
+
+        # the lease expired while the lock was held, which its holder sees
+        # before releasing it.
+        self.assertRaises(loopingcall.LoopingCallDone,
+                          lock._lock._renew)
+        self.assertTrue(lock.lost)
+        lock.release()
+
+        stats = locks.get_lock_stats()['fake-lock']
+        self.assertEqual(1, stats['acquired'])
+        other_lock = locks.get_lock('fake-lock')
+        self.assertTrue(other_lock.acquire(blocking=False))
+        other_lock.release()
+
+    def test_synchronized_records_stats(self):
+        @utils.synchronized('fake-resource')
+        def fake_function():
+            pass
+
+        fake_function()
+
+        stats = locks.get_lock_stats()['masakari-fake-resource']
+        self.assertEqual(1, stats['acquired'])
+        self.assertEqual(0, stats['failed'])
+        self.assertGreaterEqual(stats['hold_time_max'], 0.0)
@@ -95,6 +95,7 @@ class ServiceTestCase(test.NoDBTestCase):
         FakeManager(host=self.host).AndReturn(self.manager_mock)
 
         self.manager_mock.service_name = self.topic
+        self.manager_mock.init_host()
 
         _service.Service.stop()
 
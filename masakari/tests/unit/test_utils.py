@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
 import importlib
 
 import eventlet
@@ -274,3 +275,21 @@ class ValidateIntegerTestCase(test.NoDBTestCase):
                           utils.validate_integer,
                           six.unichr(129), "UnicodeError",
                           max_value=1000)
+
+
+class PaginationCursorTestCase(test.NoDBTestCase):
+    def test_encode_decode(self):
+        values = {'id': 7, 'name': 'fake',
+                  'created_at': datetime.datetime(2017, 1, 2, 3, 4, 5, 6)}
+
+        cursor = utils.encode_pagination_cursor(values)
+
+        self.assertIsInstance(cursor, six.text_type)
+        self.assertEqual({'id': 7, 'name': 'fake',
+                          'created_at': '2017-01-02T03:04:05.000006'},
+                         utils.decode_pagination_cursor(cursor))
+
+    def test_decode_invalid(self):
+        for cursor in ('not-base64!', 'WzFd', u'é'):
+            self.assertRaises(exception.InvalidInput,
+                              utils.decode_pagination_cursor, cursor)
@@ -15,8 +15,12 @@
 
 """Utilities and helper functions."""
 
+import base64
+import binascii
 import contextlib
+import datetime
 import functools
+import hashlib
 import inspect
 import pyclbr
 import shutil
@@ -24,9 +28,9 @@ import sys
 import tempfile
 
 import eventlet
-from oslo_concurrency import lockutils
 from oslo_context import context as common_context
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
 from oslo_utils import importutils
 from oslo_utils import timeutils
 import six
@@ -34,6 +38,7 @@ import six
 import masakari.conf
 from masakari import exception
 from masakari.i18n import _
+from masakari import locks
 from masakari import safe_utils
 
 
@@ -160,6 +165,52 @@ def strtime(at):
     return at.strftime("%Y-%m-%dT%H:%M:%S.%f")
 
 
+def encode_pagination_cursor(values):
+    """Encodes the sort key values of the last row of a page.
+
+    :param values: Dict of the sort key values, datetimes are encoded with
+        strtime().
+    :returns: Opaque cursor, safe to use in URLs, from which the next page
+        starts.
+    """
+    values = dict((key, strtime(value)
+                   if isinstance(value, datetime.datetime) else value)
+                  for key, value in values.items())
+    return base64.urlsafe_b64encode(
+        jsonutils.dump_as_bytes(values, sort_keys=True)).decode('ascii')
+
+
+def decode_pagination_cursor(cursor):
+    """Decodes a cursor encoded by encode_pagination_cursor().
+
+    :returns: Dict of the sort key values, datetimes are left encoded.
+    :raises: InvalidInput if the cursor is malformed.
+    """
+    try:
+        values = jsonutils.loads(base64.urlsafe_b64decode(
+            six.text_type(cursor).encode('ascii')))
+    except (TypeError, ValueError, UnicodeError, binascii.Error):
+        values = None
+
+    if not isinstance(values, dict):
+        raise exception.InvalidInput(
+            reason=_("Invalid pagination marker %s.") % cursor)
+    return values
+
+
+def notification_payload_hash(payload):
+    """Fingerprint of a notification payload.
+
+    Payloads which are equal have the same fingerprint whatever the order
+    of their keys.
+
+    :returns: Hex digest of the SHA-256 hash of the canonical JSON payload
+    """
+    canonical = jsonutils.dumps(payload, sort_keys=True,
+                                separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
 class ExceptionHelper(object):
     """Class to wrap another and translate the ClientExceptions raised by its
     function calls to the actual ones.
@@ -272,13 +323,12 @@ def synchronized(name, semaphores=None, blocking=False):
         @six.wraps(f)
         def inner(*args, **kwargs):
             lock_name = 'masakari-%s' % name
-            int_lock = lockutils.internal_lock(lock_name,
-                                               semaphores=semaphores)
+            lock = locks.get_lock(lock_name, semaphores=semaphores)
             LOG.debug("Acquiring lock: %(lock_name)s on resource: "
                       "%(resource)s", {'lock_name': lock_name,
                                        'resource': f.__name__})
 
-            if not int_lock.acquire(blocking=blocking):
+            if not lock.acquire(blocking=blocking):
                 raise exception.LockAlreadyAcquired(resource=name)
             try:
                 return f(*args, **kwargs)
@@ -286,6 +336,6 @@ def synchronized(name, semaphores=None, blocking=False):
                 LOG.debug("Releasing lock: %(lock_name)s on resource: "
                           "%(resource)s", {'lock_name': lock_name,
                                            'resource': f.__name__})
-                int_lock.release()
+                lock.release()
         return inner
     return wrap